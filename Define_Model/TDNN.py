@@ -19,7 +19,6 @@ import math
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.autograd import Variable
 
 from Define_Model.Pooling import AttentionStatisticPooling
 
@@ -39,55 +38,61 @@ class TimeDelayLayer_v1(nn.Module):
         self.kernel_width, context = self.get_kernel_width(context, full_context)
         self.register_buffer('context',torch.LongTensor(context))
         self.full_context = full_context
+        # offsets as python ints, and the dilation of evenly spaced context for F.conv1d
+        self.context_offsets = list(context)
+        self.dilation = self.get_dilation(self.context_offsets)
         stdv = 1./math.sqrt(input_dim)
         self.kernel = nn.Parameter(torch.Tensor(output_dim, input_dim, self.kernel_width).normal_(0,stdv))
         self.bias = nn.Parameter(torch.Tensor(output_dim).normal_(0,stdv))
         # self.cuda_flag = False
 
+    def __setstate__(self, state):
+        # layers pickled before context_offsets and dilation
+        super(TimeDelayLayer_v1, self).__setstate__(state)
+        if 'context_offsets' not in self.__dict__:
+            self.context_offsets = self.context.tolist()
+            self.dilation = self.get_dilation(self.context_offsets)
+
     def forward(self, x):
         """
         x is one batch of data
-        x.size(): [batch_size, sequence_length, input_dim]
+        x.size(): [batch_size, input_dim, sequence_length]
         sequence length is the length of the input spectral data (number of frames) or if already passed through the convolutional network, it's the number of learned features
         output size: [batch_size, output_dim, len(valid_steps)]
         """
-        # Check if parameters are cuda type and change context
-        # if type(self.bias.data) == torch.cuda.FloatTensor and self.cuda_flag == False:
-        #     self.context = self.context.cuda()
-        #     self.cuda_flag = True
         conv_out = self.special_convolution(x, self.kernel, self.context, self.bias)
         return conv_out
 
     def special_convolution(self, x, kernel, context, bias):
         """
-        This function performs the weight multiplication given an arbitrary context. Cannot directly use convolution because in case of only particular frames of context, one needs to select only those frames and perform a convolution across all batch items and all output dimensions of the kernel.
+        This function performs the weight multiplication given an arbitrary context over all valid steps at once.
+        Evenly spaced context is a dilated convolution of the frames covered by the valid steps. Otherwise the
+        context frames of all steps are gathered by one index_select and multiplied with the kernel in one matmul.
         """
-        # pdb.set_trace()
         x = x.squeeze(1)
         input_size = x.size()
 
         assert len(input_size) == 3, 'Input tensor dimensionality is incorrect. Should be a 3D tensor'
         [batch_size, input_dim, input_sequence_length] = input_size
-        #x = x.transpose(1,2).contiguous() # [batch_size, input_dim, input_length]
 
-        # Allocate memory for output
-        valid_steps = self.get_valid_steps(self.context, input_sequence_length)
-        #xs = torch.Tensor(self.bias.data.new(batch_size, kernel.size()[0], len(valid_steps)))
-        xs = torch.zeros((batch_size, kernel.size()[0], len(valid_steps)))
+        valid_steps = self.get_valid_steps(self.context_offsets, input_sequence_length)
+        if len(valid_steps) <= 0:
+            return x.new_zeros((batch_size, kernel.size()[0], 0))
 
-        if torch.cuda.is_available():
-            xs = Variable(xs.cuda())
-        # Perform the convolution with relevant input frames
-        # pdb.set_trace()
-        for c, i in enumerate(valid_steps):
-            features = torch.index_select(x, 2, Variable(context+i))
-            # torch.index_selec:
-            # Returns a new tensor which indexes the input tensor along dimension dim using the entries in index which is a LongTensor.
-            # The returned tensor has the same number of dimensions as the original tensor (input). The dim th dimension has the same
-            # size as the length of index; other dimensions have the same size as in the original tensor.
-            xs[:,:,c] = F.conv1d(features, kernel, bias=bias)[:,:,0]
+        if self.dilation is not None:
+            first = valid_steps[0] + self.context_offsets[0]
+            last = valid_steps[-1] + self.context_offsets[-1]
+            return F.conv1d(x[:, :, first:last + 1], kernel, bias=bias, dilation=self.dilation)
 
-        return xs
+        # [len(valid_steps), kernel_width] indices of the context frames of each step
+        steps = torch.arange(valid_steps.start, valid_steps.stop, device=x.device)
+        index = (steps.unsqueeze(1) + context.unsqueeze(0)).view(-1)
+        features = torch.index_select(x, 2, index).view(batch_size, input_dim, len(valid_steps), self.kernel_width)
+
+        # [batch, steps, input_dim * kernel_width] x [input_dim * kernel_width, output_dim]
+        features = features.permute(0, 2, 1, 3).reshape(batch_size, len(valid_steps), -1)
+        xs = torch.matmul(features, kernel.reshape(kernel.size()[0], -1).t()) + bias
+        return xs.transpose(1, 2)
 
     @staticmethod
     def check_valid_context(context): #检查context是否合理
@@ -100,6 +105,18 @@ class TimeDelayLayer_v1(nn.Module):
             context = range(context[0],context[-1]+1) #确定一个context的范围
         return len(context), context
 
+    @staticmethod
+    def get_dilation(context):
+        """
+        :return: step of evenly spaced context, None for irregular context
+        """
+        if len(context) == 1:
+            return 1
+        steps = set([context[i + 1] - context[i] for i in range(len(context) - 1)])
+        if len(steps) == 1 and steps.pop() > 0:
+            return context[1] - context[0]
+        return None
+
     @staticmethod
     def get_valid_steps(context, input_sequence_length):
         """
@@ -194,6 +211,99 @@ class TimeDelayLayer_v2(nn.Module):
         return x
 
 
+class TimeDelayLayer_v3(nn.Module):
+
+    def __init__(self, input_dim=23, output_dim=512, context_size=5, stride=1, dilation=1,
+                 batch_norm=True, dropout_p=0.0, activation='relu'):
+        '''
+        TimeDelayLayer_v2 as a dilated Conv1d on channels-first input. The frames of a context are
+        read by the convolution, so the (ctx * input_dim) copies of the unfolded input are not made,
+        and batch normalisation is applied without transposes.
+
+        The Linear weight of TimeDelayLayer_v2 is (output_dim, context_size * input_dim) with the
+        frames of the context major, and it is loaded as the (output_dim, input_dim, context_size)
+        weight of the convolution, so checkpoints of TimeDelayLayer_v2 can be loaded directly.
+        '''
+        super(TimeDelayLayer_v3, self).__init__()
+        self.context_size = context_size
+        self.stride = stride
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.dilation = dilation
+        self.dropout_p = dropout_p
+        self.batch_norm = batch_norm
+
+        self.kernel = nn.Conv1d(input_dim, output_dim, kernel_size=context_size, stride=stride, dilation=dilation)
+        if activation == 'relu':
+            self.nonlinearity = nn.ReLU()
+        elif activation == 'leakyrelu':
+            self.nonlinearity = nn.LeakyReLU()
+
+        if self.batch_norm:
+            self.bn = nn.BatchNorm1d(output_dim)
+            self.bn.weight.data.fill_(1)
+            self.bn.bias.data.zero_()
+        if self.dropout_p:
+            self.drop = nn.Dropout(p=self.dropout_p)
+
+    def set_dropout(self, dropout_p):
+        self.dropout_p = dropout_p
+        self.drop.p = self.dropout_p
+
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        key = prefix + 'kernel.weight'
+        if key in state_dict and state_dict[key].dim() == 2:
+            state_dict[key] = linear_to_conv_weight(state_dict[key], self.context_size)
+
+        super(TimeDelayLayer_v3, self)._load_from_state_dict(state_dict, prefix, local_metadata, strict,
+                                                             missing_keys, unexpected_keys, error_msgs)
+
+    def forward(self, x):
+        '''
+        input: size (batch, input_features, seq_len)
+        outpu: size (batch, output_features, new_seq_len)
+        '''
+        d = x.shape[1]
+        assert (d == self.input_dim), 'Input dimension was wrong. Expected ({}), got ({}) in ({})'.format(
+            self.input_dim, d, str(x.shape))
+
+        x = self.kernel(x)
+        x = self.nonlinearity(x)
+
+        if self.batch_norm:
+            x = self.bn(x)
+
+        if self.dropout_p:
+            x = self.drop(x)
+
+        return x
+
+
+def linear_to_conv_weight(weight, context_size):
+    """
+    :param weight: (output_dim, context_size * input_dim) Linear weight of TimeDelayLayer_v2
+    :return: (output_dim, input_dim, context_size) Conv1d weight of TimeDelayLayer_v3
+    """
+    output_dim = weight.shape[0]
+    return weight.view(output_dim, context_size, -1).permute(0, 2, 1).contiguous()
+
+
+def convert_tdnn_v2_state_dict(state_dict, model):
+    """
+    Convert the Linear weights of the TimeDelayLayer_v2 layers in a state dict of TDNN_v2, ETDNN or
+    ASTDNN to the Conv1d weights of the TimeDelayLayer_v3 layers of model.
+    :return: new state dict, other parameters are shared with state_dict
+    """
+    state_dict = state_dict.copy()
+    for name, m in model.named_modules():
+        key = name + '.kernel.weight'
+        if isinstance(m, TimeDelayLayer_v3) and key in state_dict and state_dict[key].dim() == 2:
+            state_dict[key] = linear_to_conv_weight(state_dict[key], m.context_size)
+
+    return state_dict
+
+
 class TDNN_v1(nn.Module):
     def __init__(self, context, input_dim, output_dim, node_num, full_context):
         super(TDNN_v1, self).__init__()
@@ -254,11 +364,11 @@ class TDNN_v2(nn.Module):
         self.input_dim = input_dim
         self.alpha = alpha
 
-        self.frame1 = TimeDelayLayer_v2(input_dim=self.input_dim, output_dim=512, context_size=5, dilation=1)
-        self.frame2 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=2)
-        self.frame3 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=3)
-        self.frame4 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=1, dilation=1)
-        self.frame5 = TimeDelayLayer_v2(input_dim=512, output_dim=1500, context_size=1, dilation=1)
+        self.frame1 = TimeDelayLayer_v3(input_dim=self.input_dim, output_dim=512, context_size=5, dilation=1)
+        self.frame2 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=2)
+        self.frame3 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=3)
+        self.frame4 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=1, dilation=1)
+        self.frame5 = TimeDelayLayer_v3(input_dim=512, output_dim=1500, context_size=1, dilation=1)
 
         self.segment6 = nn.Sequential(
             nn.Linear(3000, 512),
@@ -279,9 +389,11 @@ class TDNN_v2(nn.Module):
             if isinstance(m, nn.BatchNorm1d):  # weight设置为1，bias为0
                 m.weight.data.fill_(1)
                 m.bias.data.zero_()
-            elif isinstance(m, TimeDelayLayer_v2):
+            elif isinstance(m, TimeDelayLayer_v3):
                 # nn.init.normal(m.kernel.weight, mean=0., std=1.)
-                nn.init.kaiming_normal_(m.kernel.weight, mode='fan_out', nonlinearity='relu')
+                # fan_out of the (output_dim, ctx * input_dim) weight, as the Linear kernel of TimeDelayLayer_v2
+                nn.init.kaiming_normal_(m.kernel.weight.view(m.output_dim, -1), mode='fan_out',
+                                        nonlinearity='relu')
 
     def l2_norm(self, input, alpha=1.0):
         input_size = input.size()
@@ -296,8 +408,8 @@ class TDNN_v2(nn.Module):
         return output * alpha
 
     def statistic_pooling(self, x):
-        mean_x = x.mean(dim=1)
-        std_x = x.var(dim=1, unbiased=False).add_(1e-12).sqrt()
+        mean_x = x.mean(dim=2)
+        std_x = x.var(dim=2, unbiased=False).add_(1e-12).sqrt()
         mean_std = torch.cat((mean_x, std_x), 1)
         return mean_std
 
@@ -307,7 +419,8 @@ class TDNN_v2(nn.Module):
 
     def forward(self, x):
         # pdb.set_trace()
-        x = x.squeeze(1).float()
+        # (batch, feat_dim, seq_len) through all frame layers
+        x = x.squeeze(1).float().transpose(1, 2)
         x = self.frame1(x)
         x = self.frame2(x)
         x = self.frame3(x)
@@ -338,15 +451,15 @@ class ASTDNN(nn.Module):
         self.dropout_p = dropout_p
         self.input_dim = input_dim
 
-        self.frame1 = TimeDelayLayer_v2(input_dim=self.input_dim, output_dim=512, context_size=5, dilation=1,
+        self.frame1 = TimeDelayLayer_v3(input_dim=self.input_dim, output_dim=512, context_size=5, dilation=1,
                                         dropout_p=dropout_p)
-        self.frame2 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=2,
+        self.frame2 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=2,
                                         dropout_p=dropout_p)
-        self.frame3 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=3,
+        self.frame3 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=3,
                                         dropout_p=dropout_p)
-        self.frame4 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=1, dilation=1,
+        self.frame4 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=1, dilation=1,
                                         dropout_p=dropout_p)
-        self.frame5 = TimeDelayLayer_v2(input_dim=512, output_dim=1500, context_size=1, dilation=1,
+        self.frame5 = TimeDelayLayer_v3(input_dim=512, output_dim=1500, context_size=1, dilation=1,
                                         dropout_p=dropout_p)
 
         self.attention_statistic = AttentionStatisticPooling(input_dim=1500, hidden_dim=64)
@@ -372,8 +485,10 @@ class ASTDNN(nn.Module):
             if isinstance(m, nn.BatchNorm1d):  # weight设置为1，bias为0
                 m.weight.data.fill_(1)
                 m.bias.data.zero_()
-            elif isinstance(m, TimeDelayLayer_v2):
-                nn.init.kaiming_normal_(m.kernel.weight, mode='fan_out', nonlinearity='relu')
+            elif isinstance(m, TimeDelayLayer_v3):
+                # fan_out of the (output_dim, ctx * input_dim) weight, as the Linear kernel of TimeDelayLayer_v2
+                nn.init.kaiming_normal_(m.kernel.weight.view(m.output_dim, -1), mode='fan_out',
+                                        nonlinearity='relu')
 
     def set_global_dropout(self, dropout_p):
         self.dropout_p = dropout_p
@@ -387,7 +502,8 @@ class ASTDNN(nn.Module):
 
     def forward(self, x):
         # pdb.set_trace()
-        x = x.squeeze(1).float()
+        # (batch, feat_dim, seq_len) through all frame layers
+        x = x.squeeze(1).float().transpose(1, 2)
         x = self.frame1(x)
         x = self.frame2(x)
         x = self.frame3(x)
@@ -395,7 +511,7 @@ class ASTDNN(nn.Module):
         x = self.frame5(x)
 
         # print(x.shape)
-        x = self.attention_statistic(x)
+        x = self.attention_statistic(x.transpose(1, 2))
         embedding_a = self.segment6(x)
 
         if self.dropout_p:
@@ -418,23 +534,23 @@ class ETDNN(nn.Module):
         self.input_dim = input_dim
         self.dropout_p = dropout_p
 
-        self.frame1 = TimeDelayLayer_v2(input_dim=input_dim, output_dim=512, context_size=5, dilation=1,
+        self.frame1 = TimeDelayLayer_v3(input_dim=input_dim, output_dim=512, context_size=5, dilation=1,
                                         activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.affine2 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=1, dilation=1,
+        self.affine2 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=1, dilation=1,
                                          activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.frame3 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=2,
+        self.frame3 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=2,
                                         activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.affine4 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=1, dilation=1,
+        self.affine4 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=1, dilation=1,
                                          activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.frame5 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=3,
+        self.frame5 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=3,
                                         activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.affine6 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=1, dilation=1,
+        self.affine6 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=1, dilation=1,
                                          activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.frame7 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=3, dilation=4,
+        self.frame7 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=3, dilation=4,
                                         activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.frame8 = TimeDelayLayer_v2(input_dim=512, output_dim=512, context_size=1, dilation=1,
+        self.frame8 = TimeDelayLayer_v3(input_dim=512, output_dim=512, context_size=1, dilation=1,
                                         activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
-        self.frame9 = TimeDelayLayer_v2(input_dim=512, output_dim=1500, context_size=1, dilation=1,
+        self.frame9 = TimeDelayLayer_v3(input_dim=512, output_dim=1500, context_size=1, dilation=1,
                                         activation='leakyrelu', batch_norm=batch_norm, dropout_p=dropout_p)
 
         # self.segment11 = nn.Linear(3000, embedding_size)
@@ -450,13 +566,15 @@ class ETDNN(nn.Module):
             if isinstance(m, nn.BatchNorm1d):  # weight设置为1，bias为0
                 m.weight.data.fill_(1)
                 m.bias.data.zero_()
-            elif isinstance(m, TimeDelayLayer_v2):
-                nn.init.kaiming_normal_(m.kernel.weight, mode='fan_out', nonlinearity='leaky_relu')
+            elif isinstance(m, TimeDelayLayer_v3):
+                # fan_out of the (output_dim, ctx * input_dim) weight, as the Linear kernel of TimeDelayLayer_v2
+                nn.init.kaiming_normal_(m.kernel.weight.view(m.output_dim, -1), mode='fan_out',
+                                        nonlinearity='leaky_relu')
 
     def statistic_pooling(self, x):
-        mean_x = x.mean(dim=1)
-        # std_x = x.std(dim=1)
-        std_x = x.var(dim=1, unbiased=False).add_(1e-12).sqrt()
+        mean_x = x.mean(dim=2)
+        # std_x = x.std(dim=2)
+        std_x = x.var(dim=2, unbiased=False).add_(1e-12).sqrt()
         mean_std = torch.cat((mean_x, std_x), 1)
         return mean_std
 
@@ -464,7 +582,7 @@ class ETDNN(nn.Module):
         self.dropout_p = dropout_p
 
         for m in self.modules():
-            if isinstance(m, TimeDelayLayer_v2):
+            if isinstance(m, TimeDelayLayer_v3):
                 m.set_dropout(dropout_p)
 
     def forward(self, x):
@@ -472,6 +590,8 @@ class ETDNN(nn.Module):
         if x.shape[1] == 1:
             x = x.squeeze(1).float()
 
+        # (batch, feat_dim, seq_len) through all frame layers
+        x = x.transpose(1, 2)
         x = self.frame1(x)
         x = self.affine2(x)
         x = self.frame3(x)
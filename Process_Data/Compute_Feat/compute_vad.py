@@ -29,7 +29,9 @@ import Process_Data.constants as c
 #                     help='number of epochs to train (default: 10)')
 # opts = parser.parse_args()
 
-def ComputeVadEnergy(feats, output_voiced):
+def ComputeVadEnergy(feats, output_voiced, energy_threshold=c.VAD_ENERGY_THRESHOLD,
+                     energy_mean_scale=c.VAD_ENERGY_MEAN_SCALE, proportion_threshold=c.VAD_PROPORTION_THRESHOLD,
+                     frames_context=c.VAD_FRAMES_CONTEXT):
     T = len(feats)
     # output_voiced->Resize(T);
 
@@ -38,46 +40,70 @@ def ComputeVadEnergy(feats, output_voiced):
         return
 
     # column zero is log - energy.
-    log_energy = feats[:, 0]
+    voiced = compute_vad_energy(feats[:, 0], energy_threshold=energy_threshold, energy_mean_scale=energy_mean_scale,
+                                proportion_threshold=proportion_threshold, frames_context=frames_context)
+    output_voiced.extend(voiced.tolist())
 
-    # CopyColFromMat(feats, 0); // column zero is log-energy.
-    # energy_threshold = opts.vad_energy_threshold
-    energy_threshold = c.VAD_ENERGY_THRESHOLD
-
-    # if (opts.vad_energy_mean_scale != 0.0):
-    #     assert (opts.vad_energy_mean_scale > 0.0)
-    #     energy_threshold += opts.vad_energy_mean_scale * np.sum(log_energy) / T
-    if (c.VAD_ENERGY_MEAN_SCALE != 0.0):
-        assert(c.VAD_ENERGY_MEAN_SCALE > 0.0)
-        energy_threshold += c.VAD_ENERGY_MEAN_SCALE * np.sum(log_energy) / T
-
-    # assert (opts.vad_frames_context >= 0);
-    # assert (opts.vad_proportion_threshold > 0.0 and opts.vad_proportion_threshold < 1.0)
-    assert (c.VAD_FRAMES_CONTEXT >= 0)
-    assert (c.VAD_PROPORTION_THRESHOLD > 0.0 and c.VAD_PROPORTION_THRESHOLD < 1.0)
-
-    for t in range(0, T):
-
-        # log_energy_data = log_energy[:][0]
-        num_count = 0
-        den_count = 0
-        # context = opts.vad_frames_context
-        context = c.VAD_FRAMES_CONTEXT
-
-        for t2 in range(t - context-1, t + context):
-            if (t2 >= 0 and t2 < T):
-                den_count+=1
-
-                if (log_energy[t2] > energy_threshold):
-                    num_count+=1
+    # return output_voiced
 
-        # if (num_count >= den_count * opts.vad_proportion_threshold):
-        if (num_count >= den_count * c.VAD_PROPORTION_THRESHOLD):
-          output_voiced.append(1.0)
-        else:
-          output_voiced.append(0.0)
 
-    # return output_voiced
+def compute_vad_energy(log_energy, energy_threshold=c.VAD_ENERGY_THRESHOLD, energy_mean_scale=c.VAD_ENERGY_MEAN_SCALE,
+                       proportion_threshold=c.VAD_PROPORTION_THRESHOLD, frames_context=c.VAD_FRAMES_CONTEXT):
+    """
+    Energy VAD of one utterance.
+    :param log_energy: (T,) log energies, the column zero of fbank or mfcc
+    :return: (T,) float array, 1.0 for voiced frames
+    """
+    return batch_vad_energy([log_energy], energy_threshold=energy_threshold, energy_mean_scale=energy_mean_scale,
+                            proportion_threshold=proportion_threshold, frames_context=frames_context)[0]
+
+
+def batch_vad_energy(log_energies, energy_threshold=c.VAD_ENERGY_THRESHOLD,
+                     energy_mean_scale=c.VAD_ENERGY_MEAN_SCALE, proportion_threshold=c.VAD_PROPORTION_THRESHOLD,
+                     frames_context=c.VAD_FRAMES_CONTEXT):
+    """
+    Energy VAD of a batch of utterances. Frames above the threshold are counted in the window
+    [t - context - 1, t + context - 1] with cumulative sums over the padded batch, instead of a
+    loop over frames and context.
+    :param log_energies: list of (T,) log energies
+    :return: list of (T,) float arrays, 1.0 for voiced frames
+    """
+    assert (frames_context >= 0)
+    assert (proportion_threshold > 0.0 and proportion_threshold < 1.0)
+
+    lengths = np.array([len(e) for e in log_energies], dtype=np.int64)
+    if len(lengths) == 0:
+        return []
+
+    max_len = int(lengths.max())
+    valid = np.arange(max_len).reshape(1, -1) < lengths.reshape(-1, 1)
+    energy = np.zeros((len(lengths), max_len))
+    energy[valid] = np.concatenate([np.asarray(e, dtype=np.float64) for e in log_energies])
+
+    thresholds = np.full(len(lengths), energy_threshold, dtype=np.float64)
+    if (energy_mean_scale != 0.0):
+        assert (energy_mean_scale > 0.0)
+        thresholds += energy_mean_scale * energy.sum(axis=1) / np.maximum(lengths, 1)
+
+    above = (energy > thresholds.reshape(-1, 1)) & valid
+    counts = np.zeros((len(lengths), max_len + 1), dtype=np.int64)
+    np.cumsum(above, axis=1, out=counts[:, 1:])
+
+    t = np.arange(max_len).reshape(1, -1)
+    lo = np.maximum(t - frames_context - 1, 0)
+    hi = np.minimum(t + frames_context, lengths.reshape(-1, 1))
+    num_count = np.take_along_axis(counts, np.broadcast_to(hi, above.shape), axis=1) - counts[:, lo[0]]
+    den_count = hi - lo
+
+    voiced = (num_count >= den_count * proportion_threshold).astype(np.float64)
+    return [voiced[i, :l] for i, l in enumerate(lengths)]
+
+
+def drop_unvoiced(feats, voiced):
+    """
+    :return: the voiced frames of feats
+    """
+    return feats[np.asarray(voiced) == 1]
 
 
 # fbank = np.load('Data/dataset/enroll/id10270/5r0dWxy17C8/00001.npy')
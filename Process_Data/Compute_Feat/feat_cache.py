@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: feat_cache.py
+@Time: 2026/10/19 5:20 PM
+@Overview: Content-addressed cache of extracted features. Entries are keyed by the identity of
+the audio (realpath, size and mtime of the wav, or the command of a pipe with the files in it)
+and by a canonical hash of the feature config, and stored as npz files under
+cache_dir/<config hash>/. Hits are copied into the new ark/scp instead of being recomputed, and
+least recently used entries are evicted when the cache exceeds its disk budget.
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def config_hash(config):
+    """
+    :param config: dict of the options that change the features
+    :return: hex digest of the canonical json of config
+    """
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def file_identity(path):
+    stat = os.stat(path)
+    return '%s:%d:%d' % (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def audio_key(pair):
+    """
+    :param pair: split line of wav.scp
+    :return: hex digest of the audio identity, None if a wav file is missing
+    """
+    if len(pair) > 2:
+        # pipe: the command with the identity of the files it reads
+        parts = [' '.join(pair[1:])]
+        parts.extend([file_identity(p) for p in pair[1:] if os.path.isfile(p)])
+    elif os.path.isfile(pair[1]):
+        parts = [file_identity(pair[1])]
+    else:
+        return None
+
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class FeatCache(object):
+    """
+    Cache of (feature, duration) for one feature config. max_bytes bounds the size of the whole
+    cache_dir, shared by all configs.
+    """
+
+    def __init__(self, cache_dir, config, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.config_dir = os.path.join(cache_dir, config_hash(config))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(self.config_dir):
+            os.makedirs(self.config_dir, exist_ok=True)
+            with open(os.path.join(self.config_dir, 'config.json'), 'w') as f:
+                json.dump(config, f, sort_keys=True, indent=2)
+
+    def entry_path(self, key):
+        return os.path.join(self.config_dir, key[:2], key + '.npz')
+
+    def get(self, key):
+        """
+        :return: feature and duration, None for misses
+        """
+        if key is None:
+            self.misses += 1
+            return None
+
+        path = self.entry_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                feat, duration = npz['feat'], float(npz['duration'])
+            # recently used entries are evicted last
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return feat, duration
+
+    def put(self, key, feat, duration):
+        if key is None:
+            return
+
+        path = self.entry_path(key)
+        entry_dir = os.path.dirname(path)
+        if not os.path.exists(entry_dir):
+            os.makedirs(entry_dir, exist_ok=True)
+
+        # written aside and renamed, other jobs never read partial entries
+        tmp_path = path + '.%d.tmp' % os.getpid()
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, feat=np.asarray(feat, dtype=np.float32), duration=np.array(duration))
+            os.replace(tmp_path, path)
+        except (IOError, OSError):
+            print('Can not write feature cache to %s.' % path)
+
+    def evict(self):
+        return evict_cache(self.cache_dir, self.max_bytes)
+
+
+def evict_cache(cache_dir, max_bytes):
+    """
+    Remove the least recently used entries until cache_dir is within max_bytes.
+    :return: number and bytes of the removed entries
+    """
+    if max_bytes is None or not os.path.exists(cache_dir):
+        return 0, 0
+
+    entries = []
+    total = 0
+    for root, dirs, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    removed = 0
+    removed_bytes = 0
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        removed_bytes += size
+
+    return removed, removed_bytes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evict the feature cache to a disk budget')
+    parser.add_argument('cache_dir', type=str)
+    parser.add_argument('--cache-size', type=float, required=True, help='disk budget in GB')
+    args = parser.parse_args()
+
+    removed, removed_bytes = evict_cache(args.cache_dir, int(args.cache_size * 1024 ** 3))
+    print('Removed %d entries with %.2f MB from %s.' % (removed, removed_bytes / 1024. ** 2, args.cache_dir))
@@ -13,17 +13,26 @@
 from __future__ import print_function
 
 import argparse
+import collections
+import hashlib
+import json
 import os
 import shutil
 import sys
 import time
-from multiprocessing import Pool, Manager
+from multiprocessing import Pool, cpu_count
 
 import kaldi_io
 import numpy as np
+import torch
+from scipy.special import logsumexp
 
 from Process_Data.audio_augment.common import RunCommand
-from Process_Data.audio_processing import Make_Fbank, Make_Spect, Make_MFCC
+from Process_Data.Compute_Feat.compute_vad import batch_vad_energy, drop_unvoiced
+from Process_Data.Compute_Feat.feat_cache import FeatCache, audio_key, evict_cache
+from Process_Data.audio_processing import Make_Fbank, Make_Spect, Make_MFCC, load_wav, normalize_frames
+from Process_Data.kaldi_ark import write_compressed_mat
+from Process_Data.xfcc.batch_feat import batch_fbank, batch_spect, batch_mfcc
 
 parser = argparse.ArgumentParser(description='Computing Filter banks!')
 parser.add_argument('--nj', type=int, default=16, metavar='E',
@@ -67,137 +76,327 @@ parser.add_argument('--nfft', type=int, required=True,
 parser.add_argument('--normalize', action='store_true', default=False,
                     help='using Cosine similarity')
 parser.add_argument('--compress', action='store_true', default=False,
-                    help='using Cosine similarity')
+                    help='write kaldi compressed matrices as copy-feats --compress=true')
+parser.add_argument('--compress-method', type=str, default='auto',
+                    choices=['auto', 'speech_feature', 'two_byte_auto', 'one_byte_auto'],
+                    help='compression method of kaldi (default: auto)')
+parser.add_argument('--backend', type=str, default='numpy', choices=['numpy', 'torch'],
+                    help='numpy for one file at a time, torch for batches of waveforms (default: numpy)')
+parser.add_argument('--batch-size', type=int, default=8,
+                    help='waveforms in each batch of the torch backend (default: 8)')
+parser.add_argument('--chunk-size', type=int, default=1000,
+                    help='utterances in each chunk, the unit of work and of resuming (default: 1000)')
+parser.add_argument('--cache-dir', type=str, default='',
+                    help='features cache shared by runs, keyed by the audio and the feature options')
+parser.add_argument('--cache-size', type=float, default=0,
+                    help='disk budget of the cache in GB, 0 for no eviction (default: 0)')
 
 parser.add_argument('--conf', type=str, default='condf/spect.conf', metavar='E',
                     help='number of epochs to train (default: 10)')
+parser.add_argument('--vad', action='store_true', default=False,
+                    help='drop non-speech frames with energy vad before writing, then normalize the voiced frames')
+parser.add_argument('--vad-energy-threshold', type=float, default=5.5, metavar='E',
+                    help='constant term of the energy threshold (default: 5.5)')
+parser.add_argument('--vad-energy-mean-scale', type=float, default=0.5, metavar='E',
+                    help='scale of the mean log energy added to the threshold (default: 0.5)')
 parser.add_argument('--vad-proportion-threshold', type=float, default=0.12, metavar='E',
-                    help='number of epochs to train (default: 10)')
+                    help='proportion of frames above the threshold in the context of voiced frames (default: 0.12)')
 parser.add_argument('--vad-frames-context', type=int, default=2, metavar='E',
-                    help='number of epochs to train (default: 10)')
+                    help='frames of context on each side (default: 2)')
 args = parser.parse_args()
 
-def MakeFeatsProcess(lock, out_dir, ark_dir, ark_prefix, proid, t_queue, e_queue):
-    #  wav_scp = os.path.join(data_path, 'wav.scp')
-    feat_scp = os.path.join(out_dir, 'feat.%d.temp.scp' % proid)
+WRITE_BUFFER = 4 * 1024 * 1024
+
+
+class FeatWriter(object):
+    """
+    Write the features of one chunk into an ark (or npy files) with feat.scp, utt2dur and
+    utt2num_frames in out_dir. The ark is buffered, and the scripts are written in the order of
+    wav.scp when the chunk is closed.
+    """
+
+    def __init__(self, out_dir, ark_dir, ark_prefix, proid, order=None):
+        self.out_dir = out_dir
+        self.proid = proid
+        self.order = order
+        self.lines = collections.OrderedDict()
+
+        self.feat_dir = os.path.join(ark_dir, ark_prefix)
+        if not os.path.exists(self.feat_dir):
+            os.makedirs(self.feat_dir)
+
+        if args.feat_format == 'kaldi':
+            if args.compress:
+                # compressed arks are written in place of the output of copy-feats --compress=true
+                self.feat_ark = os.path.join(self.feat_dir, 'feat.%d.ark' % proid)
+            else:
+                self.feat_ark = os.path.join(out_dir, '%s_feat.%d.ark' % (ark_prefix, proid))
+            self.feat_ark_f = open(self.feat_ark, 'wb', buffering=WRITE_BUFFER)
+
+    def write(self, key, feat, duration):
+        feat = feat.astype(np.float32)
+        if args.feat_format == 'kaldi' and args.compress:
+            offset = write_compressed_mat(self.feat_ark_f, feat, method=args.compress_method)
+            feat_path = self.feat_ark + ':' + str(offset)
+        elif args.feat_format == 'kaldi':
+            kaldi_io.write_mat(self.feat_ark_f, feat, key='')
+            feat_path = self.feat_ark + ':' + str(self.feat_ark_f.tell() - len(feat.tobytes()) - 15)
+        elif args.feat_format == 'npy':
+            feat_path = os.path.join(self.feat_dir, '%s.npy' % key)
+            np.save(feat_path, feat)
+
+        self.lines[key] = (key + ' ' + feat_path + '\n', '%s %.6f\n' % (key, duration),
+                           '%s %d\n' % (key, len(feat)))
+
+    def close(self):
+        if args.feat_format == 'kaldi':
+            self.feat_ark_f.close()
+
+        keys = list(self.lines.keys())
+        if self.order is not None:
+            keys = [k for k in self.order if k in self.lines]
+
+        for i, name in enumerate(['feat.%d.scp', 'utt2dur.%d', 'utt2num_frames.%d']):
+            with open(os.path.join(self.out_dir, name % self.proid), 'w') as f:
+                f.write(''.join([self.lines[k][i] for k in keys]))
+
+
+def wav_source(pair):
+    """
+    :return: path of the wav, or stdout bytes of the pipe in the line of wav.scp
+    """
+    if len(pair) > 2:
+        command = ' '.join(pair[1:])
+        if command.endswith('|'):
+            command = command.rstrip('|')
+        spid, stdout, error = RunCommand(command)
+        # os.waitpid(spid, 0)
+        return stdout
+
+    return pair[1]
+
+
+def make_feat(pair):
+    """
+    Numpy backend for one line of wav.scp, output of pipes is decoded in memory.
+    :return: feature and duration
+    """
+    filename = wav_source(pair)
+    normalize = args.normalize and not args.vad
+
+    if args.feat_type == 'fbank':
+        feat, duration = Make_Fbank(filename=filename, filtertype=args.filter_type, use_energy=True,
+                                    nfft=args.nfft, windowsize=args.windowsize, lowfreq=args.lowfreq,
+                                    nfilt=args.filters, duration=True, normalize=normalize,
+                                    multi_weight=args.multi_weight)
+    elif args.feat_type == 'spectrogram':
+        feat, duration = Make_Spect(wav_path=filename, windowsize=args.windowsize,
+                                    lowfreq=args.lowfreq,
+                                    stride=args.stride, duration=True, nfft=args.nfft,
+                                    normalize=normalize)
+    elif args.feat_type == 'mfcc':
+        feat, duration = Make_MFCC(filename=filename, numcep=args.numcep, nfilt=args.filters,
+                                   lowfreq=args.lowfreq,
+                                   normalize=normalize, duration=True, use_energy=True)
+
+    return feat, duration
+
+
+def read_wav(pair):
+    """
+    Read the waveform of a wav.scp line, int16 for fbank and mfcc, float32 for spectrogram.
+    """
+    dtype = 'float32' if args.feat_type == 'spectrogram' else 'int16'
+    return load_wav(wav_source(pair), dtype=dtype)
+
+
+def make_batch_feats(wavs, samplerate):
+    normalize = args.normalize and not args.vad
+    if args.feat_type == 'fbank':
+        return batch_fbank(wavs, samplerate=samplerate, winlen=args.windowsize, nfilt=args.filters, nfft=args.nfft,
+                           lowfreq=args.lowfreq, filtertype=args.filter_type, multi_weight=args.multi_weight,
+                           use_energy=True, normalize=normalize)
+    elif args.feat_type == 'spectrogram':
+        return batch_spect(wavs, samplerate=samplerate, windowsize=args.windowsize, stride=args.stride,
+                           nfft=args.nfft, normalize=normalize)
+    elif args.feat_type == 'mfcc':
+        return batch_mfcc(wavs, samplerate=samplerate, numcep=args.numcep, nfilt=args.filters, lowfreq=args.lowfreq,
+                          normalize=normalize, use_energy=True)
+
+
+def select_voiced(feats):
+    """
+    Drop the non-speech frames with energy vad, and normalize the voiced frames if --normalize.
+    Column zero of fbank and mfcc is the log energy. For spectrogram the log energy is summed
+    from the bins and shifted to the int16 scale of the other features.
+    :return: list of voiced features, None for utterances without voiced frames
+    """
+    if args.feat_type == 'spectrogram':
+        log_energies = [logsumexp(f, axis=1) + 2 * np.log(32768.) for f in feats]
+    else:
+        log_energies = [f[:, 0] for f in feats]
+
+    voiced = batch_vad_energy(log_energies, energy_threshold=args.vad_energy_threshold,
+                              energy_mean_scale=args.vad_energy_mean_scale,
+                              proportion_threshold=args.vad_proportion_threshold,
+                              frames_context=args.vad_frames_context)
+    outs = []
+    for feat, v in zip(feats, voiced):
+        feat = drop_unvoiced(feat, v)
+        if len(feat) == 0:
+            outs.append(None)
+        elif args.normalize:
+            outs.append(normalize_frames(feat))
+        else:
+            outs.append(feat)
+
+    return outs
+
+
+def write_feat(writer, cache, cache_keys, key, feat, duration):
+    writer.write(key, feat, duration)
+    if cache is not None:
+        cache.put(cache_keys[key], feat, duration)
+
+
+def write_batch_feats(writer, pairs, cache=None, cache_keys=None):
+    """
+    Torch backend: features of the waveforms are computed together, grouped by sample rate.
+    :return: keys of the failed utterances
+    """
+    errors = []
+    batches = {}
+    for pair in pairs:
+        try:
+            wav, samplerate = read_wav(pair)
+            batches.setdefault(samplerate, []).append((pair[0], wav))
+        except Exception as e:
+            print(e)
+            errors.append(pair[0])
+
+    for samplerate, key_wavs in batches.items():
+        try:
+            feats = make_batch_feats([wav for _, wav in key_wavs], samplerate)
+            if args.vad:
+                feats = select_voiced(feats)
+            for (key, wav), feat in zip(key_wavs, feats):
+                if feat is None:
+                    print('No voiced frames in %s.' % key)
+                    errors.append(key)
+                    continue
+                write_feat(writer, cache, cache_keys, key, feat, len(wav) / samplerate)
+        except Exception as e:
+            print(e)
+            errors.extend([key for key, _ in key_wavs])
+
+    return errors
+
+
+def init_worker(nj):
+    if args.backend == 'torch':
+        # threads of torch are shared by the jobs
+        torch.set_num_threads(max(1, cpu_count() // nj))
+
+
+def MakeFeatsChunk(task):
+    """
+    Make the features of one chunk of wav.scp with its own writer in split_dir.
+    :param task: (split_dir, ark_dir, ark_prefix, chunk id, lines of wav.scp)
+    :return: chunk id, number of utterances, keys of the failed utterances and cache hits
+    """
+    split_dir, ark_dir, ark_prefix, chunk_id, lines = task
+    pairs = [l.split() for l in lines]
+    writer = FeatWriter(split_dir, ark_dir, ark_prefix, chunk_id, order=[pair[0] for pair in pairs])
+    num_utt = len(pairs)
+
+    cache = None
+    cache_keys = None
+    if args.cache_dir != '':
+        # hits are copied from the cache, only the misses are computed
+        cache = FeatCache(args.cache_dir, feat_config())
+        cache_keys = {}
+        misses = []
+        for pair in pairs:
+            cache_keys[pair[0]] = audio_key(pair)
+            hit = cache.get(cache_keys[pair[0]])
+            if hit is None:
+                misses.append(pair)
+            else:
+                writer.write(pair[0], hit[0], hit[1])
+        pairs = misses
+
+    errors = []
+    if args.backend == 'torch':
+        for i in range(0, len(pairs), args.batch_size):
+            errors.extend(write_batch_feats(writer, pairs[i:i + args.batch_size], cache, cache_keys))
+    else:
+        for pair in pairs:
+            try:
+                feat, duration = make_feat(pair)
+                if args.vad:
+                    feat = select_voiced([feat])[0]
+                    if feat is None:
+                        print('No voiced frames in %s.' % pair[0])
+                        errors.append(pair[0])
+                        continue
+                write_feat(writer, cache, cache_keys, pair[0], feat, duration)
+            except Exception as e:
+                print(e)
+                errors.append(pair[0])
 
-    utt2dur = os.path.join(out_dir, 'utt2dur.%d' % proid)
-    utt2num_frames = os.path.join(out_dir, 'utt2num_frames.%d' % proid)
+    writer.close()
+    with open(os.path.join(split_dir, 'errors.%d' % chunk_id), 'w') as f:
+        for key in errors:
+            f.write(key + '\n')
 
-    feat_scp_f = open(feat_scp, 'w')
-    utt2dur_f = open(utt2dur, 'w')
+    return chunk_id, num_utt, errors, 0 if cache is None else cache.hits
 
-    if args.feat_format == 'kaldi':
-        feat_ark = os.path.join(out_dir, '%s_feat.%d.ark' % (ark_prefix, proid))
-        feat_ark_f = open(feat_ark, 'wb')
 
-    utt2num_frames_f = open(utt2num_frames, 'w')
-    feat_dir = os.path.join(ark_dir, ark_prefix)
-    if not os.path.exists(feat_dir):
-        os.makedirs(feat_dir)
+# options changing the features
+FEAT_OPTIONS = ['feat_type', 'filter_type', 'filters', 'multi_weight', 'numcep', 'windowsize', 'stride', 'lowfreq',
+                'nfft', 'normalize', 'vad', 'vad_energy_threshold', 'vad_energy_mean_scale',
+                'vad_proportion_threshold', 'vad_frames_context']
 
-    temp_dir = out_dir + '/temp'
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
 
-    while True:
-        lock.acquire()  # 加上锁
-        if not t_queue.empty():
-            comm = task_queue.get()
-            lock.release()  # 释放锁
-            pair = comm.split()
-            key = pair[0]
-            try:
-                if len(pair) > 2:
-                    command = ' '.join(pair[1:])
-                    if command.endswith('|'):
-                        command = command.rstrip('|')
-                    spid, stdout, error = RunCommand(command)
-                    # os.waitpid(spid, 0)
-
-                    temp_wav = temp_dir + '/%s.%s' % (key, args.data_format)
-                    with open(temp_wav, 'wb') as wav_f:
-                        wav_f.write(stdout)
-                    if args.feat_type == 'fbank':
-                        feat, duration = Make_Fbank(filename=temp_wav, filtertype=args.filter_type, use_energy=True,
-                                                    lowfreq=args.lowfreq,
-                                                    nfft=args.nfft, nfilt=args.filters, normalize=args.normalize,
-                                                    duration=True, windowsize=args.windowsize,
-                                                    multi_weight=args.multi_weight)
-                    elif args.feat_type == 'spectrogram':
-                        feat, duration = Make_Spect(wav_path=temp_wav, windowsize=args.windowsize,
-                                                    lowfreq=args.lowfreq,
-                                                    stride=args.stride, duration=True, nfft=args.nfft,
-                                                    normalize=args.normalize)
-                    elif args.feat_type == 'mfcc':
-                        feat, duration = Make_MFCC(filename=temp_wav, numcep=args.numcep, nfilt=args.filters,
-                                                   lowfreq=args.lowfreq,
-                                                   normalize=args.normalize, duration=True, use_energy=True)
-
-                    os.remove(temp_wav)
-
-                else:
-                    if args.feat_type == 'fbank':
-                        feat, duration = Make_Fbank(filename=pair[1], filtertype=args.filter_type, use_energy=True,
-                                                    nfft=args.nfft, windowsize=args.windowsize, lowfreq=args.lowfreq,
-                                                    nfilt=args.filters, duration=True, normalize=args.normalize,
-                                                    multi_weight=args.multi_weight)
-                    elif args.feat_type == 'spectrogram':
-                        feat, duration = Make_Spect(wav_path=pair[1], windowsize=args.windowsize,
-                                                    lowfreq=args.lowfreq,
-                                                    stride=args.stride, duration=True, nfft=args.nfft,
-                                                    normalize=args.normalize)
-                    elif args.feat_type == 'mfcc':
-                        feat, duration = Make_MFCC(filename=pair[1], numcep=args.numcep, nfilt=args.filters,
-                                                   lowfreq=args.lowfreq,
-                                                   normalize=args.normalize, duration=True, use_energy=True)
-                    # feat = np.load(pair[1]).astype(np.float32)
-
-                feat = feat.astype(np.float32)
-                if args.feat_format == 'kaldi':
-                    kaldi_io.write_mat(feat_ark_f, feat, key='')
-                    offsets = feat_ark + ':' + str(feat_ark_f.tell() - len(feat.tobytes()) - 15)
-                    # print(offsets)
-                    feat_scp_f.write(key + ' ' + offsets + '\n')
-                elif args.feat_format == 'npy':
-                    npy_path = os.path.join(feat_dir, '%s.npy' % key)
-                    np.save(npy_path, feat)
-                    feat_scp_f.write(key + ' ' + npy_path + '\n')
-
-                utt2dur_f.write('%s %.6f\n' % (key, duration))
-                utt2num_frames_f.write('%s %d\n' % (key, len(feat)))
-            except Exception as e:
-                print(e)
-                e_queue.put(key)
+def feat_config():
+    return dict([(name, getattr(args, name)) for name in FEAT_OPTIONS])
+
+
+def manifest_config(wav_scp):
+    # chunks of a manifest can be reused only with the same wav.scp, features and chunking
+    config = feat_config()
+    config['num_utt'] = len(wav_scp)
+    config['wav_scp'] = hashlib.sha1(''.join(wav_scp).encode('utf-8')).hexdigest()
+    for name in ['chunk_size', 'feat_format', 'compress', 'compress_method']:
+        config[name] = getattr(args, name)
+    return json.dumps(config, sort_keys=True)
+
+
+def read_manifest(manifest, config):
+    """
+    :return: ids of the finished chunks in the manifest written with the same config
+    """
+    done = set()
+    if os.path.exists(manifest):
+        with open(manifest, 'r') as f:
+            lines = f.readlines()
+        if len(lines) > 0 and lines[0].strip() == config:
+            for line in lines[1:]:
+                if line.strip().isdigit():
+                    done.add(int(line))
+    return done
+
+
+def concat_chunk_files(split_dir, pattern, num_chunks, out_path):
+    num_lines = 0
+    with open(out_path, 'w') as out_f:
+        for i in range(num_chunks):
+            with open(os.path.join(split_dir, pattern % i), 'r') as f:
+                for txt in f:
+                    out_f.write(txt)
+                    num_lines += 1
+    return num_lines
 
-            # if t_queue.qsize() % 100 == 0:
-            print('\rProcess [%6s] There are [%6s] utterances' \
-                  ' left, with [%6s] errors.' % (str(os.getpid()), str(t_queue.qsize()), str(e_queue.qsize())),
-                  end='')
-        else:
-            lock.release()  # 释放锁
-            # print('\n>> Process {}:  queue empty!'.format(os.getpid()))
-            break
-
-    feat_scp_f.close()
-    utt2dur_f.close()
-    if args.feat_format == 'kaldi':
-        feat_ark_f.close()
-    utt2num_frames_f.close()
-
-    new_feat_scp = os.path.join(out_dir, 'feat.%d.scp' % proid)
-    if args.feat_format == 'kaldi' and args.compress:
-        new_feat_ark = os.path.join(feat_dir, 'feat.%d.ark' % proid)
-        compress_command = "copy-feats --compress=true scp:{} ark,scp:{},{}".format(feat_scp, new_feat_ark,
-                                                                                    new_feat_scp)
-
-        pid, stdout, stderr = RunCommand(compress_command)
-        # print(stdout)
-        if os.path.exists(new_feat_scp) and os.path.exists(new_feat_ark):
-            os.remove(feat_ark)
-    else:
-        shutil.copy(feat_scp, new_feat_scp)
-        # pass
 
 if __name__ == "__main__":
 
@@ -221,80 +420,77 @@ if __name__ == "__main__":
                 os.system('cp %s %s' % (orig_f, targ_f))
 
     with open(wav_scp_f, 'r') as f:
-        wav_scp = f.readlines()
+        wav_scp = [l for l in f.readlines() if len(l.split()) > 1]
         assert len(wav_scp) > 0
 
     num_utt = len(wav_scp)
     start_time = time.time()
 
-    manager = Manager()
-    lock = manager.Lock()
-    task_queue = manager.Queue()
-    error_queue = manager.Queue()
-
-    for u in wav_scp:
-        task_queue.put(u)
-    print('Plan to make feats for %d utterances in %s with %d jobs.\n' % (task_queue.qsize(), str(time.asctime()), nj))
-
-    pool = Pool(processes=nj)  # 创建nj个进程
-    for i in range(0, nj):
-        write_dir = os.path.join(out_dir, 'Split%d/%d' % (nj, i))
-        if not os.path.exists(write_dir):
-            os.makedirs(write_dir)
-
-        ark_dir = os.path.join(args.out_dir, args.feat_type)
-        if not os.path.exists(ark_dir):
-            os.makedirs(ark_dir)
-
-        pool.apply_async(MakeFeatsProcess, args=(lock, write_dir, ark_dir, args.out_set,
-                                                 i, task_queue, error_queue))
+    # chunks are the units of work and of resuming
+    Split_dir = os.path.join(out_dir, 'Split_chunk%d' % args.chunk_size)
+    if not os.path.exists(Split_dir):
+        os.makedirs(Split_dir)
+    ark_dir = os.path.join(args.out_dir, args.feat_type)
+    if not os.path.exists(ark_dir):
+        os.makedirs(ark_dir)
+
+    num_chunks = int(np.ceil(num_utt / args.chunk_size))
+    manifest = os.path.join(Split_dir, 'manifest')
+    config = manifest_config(wav_scp)
+    done = read_manifest(manifest, config)
+    if len(done) == 0:
+        with open(manifest, 'w') as f:
+            f.write(config + '\n')
+
+    tasks = [(Split_dir, ark_dir, args.out_set, i, wav_scp[i * args.chunk_size:(i + 1) * args.chunk_size])
+             for i in range(num_chunks) if i not in done]
+    print('Plan to make feats for %d utterances in %d chunks (%d finished before) in %s with %d jobs.\n' % (
+        num_utt, num_chunks, len(done), str(time.asctime()), nj))
+
+    num_errors = 0
+    num_hits = 0
+    num_finished = sum([min(args.chunk_size, num_utt - i * args.chunk_size) for i in done])
+    last_report = 0.
+    pool = Pool(processes=nj, initializer=init_worker, initargs=(nj,))  # 创建nj个进程
+    with open(manifest, 'a') as manifest_f:
+        for chunk_id, num_chunk_utt, errors, hits in pool.imap_unordered(MakeFeatsChunk, tasks):
+            manifest_f.write('%d\n' % chunk_id)
+            manifest_f.flush()
+            os.fsync(manifest_f.fileno())
+
+            num_finished += num_chunk_utt
+            num_errors += len(errors)
+            num_hits += hits
+            if time.time() - last_report > 10 or num_finished == num_utt:
+                last_report = time.time()
+                print('\r[%s] Finished [%8d/%8d] utterances, with [%6d] errors.' % (
+                    time.strftime('%H:%M:%S'), num_finished, num_utt, num_errors), end='')
 
     pool.close()  # 关闭进程池，表示不能在往进程池中添加进程
     pool.join()  # 等待进程池中的所有进程执行完毕，必须在close()之后调用
 
-    if error_queue.qsize() > 0:
+    errors = []
+    for i in range(num_chunks):
+        with open(os.path.join(Split_dir, 'errors.%d' % i), 'r') as f:
+            errors.extend([l.strip() for l in f if len(l.strip()) > 0])
+    if len(errors) > 0:
         print('\n>> Saving Completed with errors in: ')
-        while not error_queue.empty():
-            print(error_queue.get() + ' ', end='')
-        print('')
+        print(' '.join(errors))
     else:
         print('\n>> Saving Completed without errors.!')
 
-    Split_dir = os.path.join(out_dir, 'Split%d' % nj)
     print('  >> Splited Data root is %s. Concat all scripts together.' % str(Split_dir))
-
-    all_scp_path = [os.path.join(Split_dir, '%d/feat.%d.scp' % (i, i)) for i in range(nj)]
-    feat_scp = os.path.join(out_dir, 'feats.scp')
-    numofutt = 0
-    with open(feat_scp, 'w') as feat_scp_f:
-        for item in all_scp_path:
-            for txt in open(item, 'r').readlines():
-                feat_scp_f.write(txt)
-                numofutt += 1
-    if numofutt != num_utt:
-        print('Errors in %s ?' % feat_scp)
-
-    numofutt = 0
-    all_scp_path = [os.path.join(Split_dir, '%d/utt2dur.%d' % (i, i)) for i in range(nj)]
-    utt2dur = os.path.join(out_dir, 'utt2dur')
-    with open(utt2dur, 'w') as utt2dur_f:
-        for item in all_scp_path:
-            for txt in open(str(item), 'r').readlines():
-                utt2dur_f.write(txt)
-                numofutt += 1
-    if numofutt != num_utt:
-        print('Errors in %s ?' % utt2dur)
-
-    numofutt = 0
-    all_scp_path = [os.path.join(Split_dir, '%d/utt2num_frames.%d' % (i, i)) for i in range(nj)]
-    utt2num_frames = os.path.join(out_dir, 'utt2num_frames')
-    with open(utt2num_frames, 'w') as utt2num_frames_f:
-        for item in all_scp_path:
-            for txt in open(str(item), 'r').readlines():
-                utt2num_frames_f.write(txt)
-                numofutt += 1
-    if numofutt != num_utt:
-        print('Errors in %s ?' % utt2num_frames)
+    for pattern, name in [('feat.%d.scp', 'feats.scp'), ('utt2dur.%d', 'utt2dur'),
+                          ('utt2num_frames.%d', 'utt2num_frames')]:
+        numofutt = concat_chunk_files(Split_dir, pattern, num_chunks, os.path.join(out_dir, name))
+        if numofutt != num_utt:
+            print('Errors in %s ?' % os.path.join(out_dir, name))
+
+    if args.cache_dir != '':
+        print('  >> %d utterances copied from cache %s.' % (num_hits, args.cache_dir))
+        if args.cache_size > 0:
+            removed, removed_bytes = evict_cache(args.cache_dir, int(args.cache_size * 1024 ** 3))
+            print('  >> Evicted %d entries with %.2f MB from cache.' % (removed, removed_bytes / 1024. ** 2))
 
     print('Delete tmp files in: %s' % Split_dir)
     if args.compress:
@@ -22,6 +22,8 @@ from kaldi_io import read_mat
 from tqdm import tqdm
 
 import Process_Data.constants as c
+from Process_Data.data_index import UttIndex, decode_names, encode_names, filter_csr
+from Process_Data.feat_arena import FeatArena
 
 
 def check_exist(path):
@@ -109,9 +111,10 @@ class KaldiTrainDataset(data.Dataset):
         spk_to_idx = {speakers[i]: i for i in range(len(speakers))}
         idx_to_spk = {i: speakers[i] for i in range(len(speakers))}
 
+        # features are views of one shared memory arena, not copied by the forked workers
+        arena = FeatArena(feat_scp)
         uid2feat = {}  # 'Eric_McCormack-Y-qKARMSO7k-0001.wav': feature[frame_length, feat_dim]
-        pbar = tqdm(enumerate(kaldi_io.read_mat_scp(feat_scp)))
-        for idx, (utt_id, feat) in pbar:
+        for utt_id, feat in arena.items():
             uid2feat[utt_id] = feat
 
         print('\tThere are {} utterances in Train Dataset.'.format(len(uid2feat)))
@@ -316,9 +319,10 @@ class TrainDataset(data.Dataset):
         spk_to_idx = {speakers[i]: i for i in range(len(speakers))}
         idx_to_spk = {i: speakers[i] for i in range(len(speakers))}
 
+        # features are views of one shared memory arena, not copied by the forked workers
+        arena = FeatArena(feat_scp)
         uid2feat = {}  # 'Eric_McCormack-Y-qKARMSO7k-0001.wav': feature[frame_length, feat_dim]
-        pbar = tqdm(enumerate(kaldi_io.read_mat_scp(feat_scp)))
-        for idx, (utt_id, feat) in pbar:
+        for utt_id, feat in arena.items():
             uid2feat[utt_id] = feat
 
         print('==>There are {} utterances in Train Dataset.'.format(len(uid2feat)))
@@ -417,9 +421,10 @@ class KaldiTupleDataset(data.Dataset):
         idx_to_spk = {i: speakers[i] for i in range(len(speakers))}
 
 
+        # features are views of one shared memory arena, not copied by the forked workers
+        arena = FeatArena(feat_scp)
         uid2feat = {}  # 'Eric_McCormack-Y-qKARMSO7k-0001.wav': feature[frame_length, feat_dim]
-        pbar = tqdm(enumerate(kaldi_io.read_mat_scp(feat_scp)))
-        for idx, (utt_id, feat) in pbar:
+        for utt_id, feat in arena.items():
             uid2feat[utt_id] = feat
 
         print('\tThere are {} utterances in Train Dataset.'.format(len(uid2feat)))
@@ -574,35 +579,50 @@ class ScriptVerifyDataset(data.Dataset):
         if not os.path.exists(trials):
             raise FileExistsError(trials)
 
-        uid2feat = {}
+        # xvectors.scp is not a data dir with feats.scp, so its uids are interned here instead of
+        # in UttIndex. The uid -> id dict is only kept while the trials are parsed.
+        uids = []
+        vec_paths = []
+        uid_to_idx = {}
         with open(feat_scp, 'r') as f:
             for line in f.readlines():
                 uid, feat_offset = line.split()
-                uid2feat[uid] = feat_offset
+                if uid not in uid_to_idx:
+                    uid_to_idx[uid] = len(uids)
+                    uids.append(uid)
+                    vec_paths.append(feat_offset)
 
-        print('\n==> There are {} utterances in Verification trials.'.format(len(uid2feat)))
+        print('\n==> There are {} utterances in Verification trials.'.format(len(uids)))
 
-        trials_pair = []
-        positive_pairs = 0
+        trial_a = []
+        trial_b = []
+        trial_label = []
         with open(trials, 'r') as t:
-            all_pairs = t.readlines()
-            for line in all_pairs:
+            for line in t.readlines():
                 pair = line.split()
-                if pair[2] == 'nontarget' or pair[2] == '0':
-                    pair_true = False
-                else:
-                    pair_true = True
-                    positive_pairs += 1
-
-                trials_pair.append((pair[0], pair[1], pair_true))
-
-        trials_pair = np.array(trials_pair)
-        trials_pair = trials_pair[trials_pair[:, 2].argsort()[::-1]]
+                if len(pair) < 3:
+                    continue
+                trial_a.append(uid_to_idx.get(pair[0], -1))
+                trial_b.append(uid_to_idx.get(pair[1], -1))
+                trial_label.append(not (pair[2] == 'nontarget' or pair[2] == '0'))
+
+        # (vector a, vector b, 0/1) with positive pairs first
+        trial_a = np.array(trial_a, dtype=np.int32)
+        trial_b = np.array(trial_b, dtype=np.int32)
+        trial_label = np.array(trial_label, dtype=bool)
+        keep = (trial_a >= 0) & (trial_b >= 0)
+        order = np.argsort(~trial_label[keep], kind='stable')
+        trials_pair = np.stack([trial_a[keep][order], trial_b[keep][order],
+                                trial_label[keep][order].astype(np.int32)], axis=1)
+        positive_pairs = int(np.sum(trials_pair[:, 2]))
+        if np.sum(~keep) > 0:
+            print('    Remove {} pairs whose vectors are not in xvectors.scp.'.format(int(np.sum(~keep))))
 
         print('    There are {} pairs in trials with {} positive pairs'.format(len(trials_pair),
                                                                                positive_pairs))
 
-        self.uid2feat = uid2feat
+        self.uids = encode_names(uids)
+        self.vec_paths = encode_names(vec_paths)
         self.trials_pair = trials_pair
         self.numofpositive = positive_pairs
 
@@ -610,22 +630,18 @@ class ScriptVerifyDataset(data.Dataset):
         self.return_uid = return_uid
 
     def __getitem__(self, index):
-        uid_a, uid_b, label = self.trials_pair[index]
+        vec_a, vec_b, label = self.trials_pair[index].tolist()
 
-        feat_a = self.uid2feat[uid_a]
-        feat_b = self.uid2feat[uid_b]
+        feat_a = self.vec_paths[vec_a].decode('utf-8')
+        feat_b = self.vec_paths[vec_b].decode('utf-8')
         data_a = self.loader(feat_a)
         data_b = self.loader(feat_b)
-
-        if label == 'True' or label == True:
-            label = True
-        else:
-            label = False
+        label = label == 1
 
         if self.return_uid:
             # pdb.set_trace()
             # print(uid_a, uid_b)
-            return data_a, data_b, label, uid_a, uid_b
+            return data_a, data_b, label, self.uids[vec_a].decode('utf-8'), self.uids[vec_b].decode('utf-8')
 
         return data_a, data_b, label
 
@@ -658,10 +674,7 @@ class ScriptVerifyDataset(data.Dataset):
             self.trials_pair = np.concatenate((positive_pairs, nagative_pairs), axis=0)
 
         assert len(self.trials_pair) == num
-        num_positive = 0
-        for x, y, z in self.trials_pair:
-            if z == 'True':
-                num_positive += 1
+        num_positive = int(np.sum(self.trials_pair[:, 2]))
 
         assert len(self.trials_pair) == num, '%d != %d' % (len(self.trials_pair), num)
         assert self.numofpositive == num_positive, '%d != %d' % (self.numofpositive, num_positive)
@@ -678,7 +691,6 @@ class ScriptTrainDataset(data.Dataset):
 
         feat_scp = dir + '/feats.scp'
         spk2utt = dir + '/spk2utt'
-        utt2spk = dir + '/utt2spk'
         utt2num_frames = dir + '/utt2num_frames'
         utt2dom = dir + '/utt2dom'
 
@@ -686,78 +698,37 @@ class ScriptTrainDataset(data.Dataset):
             raise FileExistsError(feat_scp)
         if not os.path.exists(spk2utt):
             raise FileExistsError(spk2utt)
+        if not os.path.exists(utt2num_frames):
+            raise FileExistsError(utt2num_frames)
 
-        invalid_uid = []
-        with open(utt2num_frames, 'r') as f:
-            for l in f.readlines():
-                uid, num_frames = l.split()
-                if int(num_frames) < 50:
-                    invalid_uid.append(uid)
+        # parsed once and cached in dir/data_index.npz
+        index = UttIndex.from_dir(dir)
+        # utterances shorter than 50 frames are removed
+        valid_utt = ~((index.num_frames >= 0) & (index.num_frames < 50))
+        invalid_uid = int(np.sum(~valid_utt))
+        spk_ptr, spk_utts = filter_csr(index.spk_ptr, index.spk_utts, valid_utt)
 
-        dataset = {}
-        with open(spk2utt, 'r') as u:
-            all_cls = u.readlines()
-            for line in all_cls:
-                spk_utt = line.split()
-                spk_name = spk_utt[0]
-                if spk_name not in dataset.keys():
-                    dataset[spk_name] = [x for x in spk_utt[1:] if x not in invalid_uid]
-
-        utt2spk_dict = {}
-        with open(utt2spk, 'r') as u:
-            all_cls = u.readlines()
-            for line in all_cls:
-                utt_spk = line.split()
-                uid = utt_spk[0]
-                if uid in invalid_uid:
-                    continue
-                if uid not in utt2spk_dict.keys():
-                    utt2spk_dict[uid] = utt_spk[-1]
+        speakers = decode_names(index.speakers)
+        print('==> There are {} speakers in Dataset.'.format(len(speakers)))
+        spk_to_idx = {speakers[i]: i for i in range(len(speakers))}
 
+        print('    There are {} utterances in Train Dataset, where {} utterances are removed.'.format(len(spk_utts),
+                                                                                                      invalid_uid))
         self.dom_to_idx = None
-        self.utt2dom_dict = None
         dom_to_idx = None
         if self.domain:
             if not os.path.exists(utt2dom):
                 raise FileExistsError(utt2dom)
 
-            utt2dom_dict = {}
-            with open(utt2dom, 'r') as u:
-                all_cls = u.readlines()
-                for line in all_cls:
-                    utt_dom = line.split()
-                    uid = utt_dom[0]
-                    if uid in invalid_uid:
-                        continue
-                    if uid not in utt2dom_dict.keys():
-                        utt2dom_dict[uid] = utt_dom[-1]
-
-            all_domains = [utt2dom_dict[u] for u in utt2dom_dict.keys()]
-            domains = list(set(all_domains))
-            domains.sort()
-            dom_to_idx = {domains[i]: i for i in range(len(domains))}
+            # domain ids of the index -> ids of the domains left in the dataset, -1 -> -1
+            domains = decode_names(index.domains)
+            dom_ids = np.unique(index.utt_dom[spk_utts])
+            dom_ids = dom_ids[dom_ids >= 0]
+            dom_to_idx = {domains[d]: i for i, d in enumerate(dom_ids.tolist())}
+            self.utt2dom_idx = np.full(len(domains) + 1, -1, dtype=np.int32)
+            self.utt2dom_idx[dom_ids] = np.arange(len(dom_ids))
             self.dom_to_idx = dom_to_idx
-            self.utt2dom_dict = utt2dom_dict
-
-        # pdb.set_trace()
-
-        speakers = [spk for spk in dataset.keys()]
-        speakers.sort()
-        print('==> There are {} speakers in Dataset.'.format(len(speakers)))
-        spk_to_idx = {speakers[i]: i for i in range(len(speakers))}
-
-        idx_to_spk = {i: speakers[i] for i in range(len(speakers))}
-
-        uid2feat = {}  # 'Eric_McCormack-Y-qKARMSO7k-0001.wav': feature[frame_length, feat_dim]
-        with open(feat_scp, 'r') as f:
-            for line in f.readlines():
-                uid, feat_offset = line.split()
-                if uid in invalid_uid:
-                    continue
-                uid2feat[uid] = feat_offset
 
-        print('    There are {} utterances in Train Dataset, where {} utterances are removed.'.format(len(uid2feat),
-                                                                                                      len(invalid_uid)))
         self.valid_set = None
         self.valid_uid2feat = None
         self.valid_utt2spk_dict = None
@@ -768,83 +739,117 @@ class ScriptTrainDataset(data.Dataset):
             valid_uid2feat = {}
             valid_utt2spk_dict = {}
             valid_utt2dom_dict = {}
+            train_utt = np.ones(len(index), dtype=bool)
 
-            for spk in speakers:
-                if spk not in valid_set.keys():
-                    valid_set[spk] = []
-                    for i in range(num_valid):
-                        if len(dataset[spk]) <= 1:
-                            break
-                        j = np.random.randint(len(dataset[spk]))
-                        utt = dataset[spk].pop(j)
-                        valid_set[spk].append(utt)
-
-                        valid_uid2feat[valid_set[spk][-1]] = uid2feat.pop(valid_set[spk][-1])
-                        valid_utt2spk_dict[utt] = utt2spk_dict[utt]
-                        if self.domain:
-                            valid_utt2dom_dict[utt] = utt2dom_dict[utt]
+            for s, spk in enumerate(speakers):
+                valid_set[spk] = []
+                utts = spk_utts[spk_ptr[s]:spk_ptr[s + 1]].tolist()
+                for i in range(num_valid):
+                    if len(utts) <= 1:
+                        break
+                    j = np.random.randint(len(utts))
+                    utt_idx = utts.pop(j)
+                    train_utt[utt_idx] = False
 
+                    utt = index.uid(utt_idx)
+                    valid_set[spk].append(utt)
+                    valid_uid2feat[utt] = index.feat_path(utt_idx)
+                    valid_utt2spk_dict[utt] = spk
+                    if self.domain:
+                        if index.utt_dom[utt_idx] < 0:
+                            # not in utt2dom
+                            raise KeyError(utt)
+                        valid_utt2dom_dict[utt] = domains[index.utt_dom[utt_idx]]
+
+            spk_ptr, spk_utts = filter_csr(spk_ptr, spk_utts, train_utt)
             print('    Spliting {} utterances for Validation.'.format(len(valid_uid2feat)))
             self.valid_set = valid_set
             self.valid_uid2feat = valid_uid2feat
             self.valid_utt2spk_dict = valid_utt2spk_dict
             self.valid_utt2dom_dict = valid_utt2dom_dict
 
-
+        # utterances of speaker s: spk_utts[spk_ptr[s]:spk_ptr[s+1]]
+        self.index = index
+        self.spk_ptr = spk_ptr
+        self.spk_utts = spk_utts
         self.speakers = speakers
-        self.dataset = dataset
-        self.uid2feat = uid2feat
         self.spk_to_idx = spk_to_idx
-        self.idx_to_spk = idx_to_spk
         self.num_spks = len(speakers)
         self.num_doms = len(self.dom_to_idx) if dom_to_idx != None else 0
 
         self.loader = loader
-        self.feat_dim = loader(uid2feat[dataset[speakers[0]][0]]).shape[1]
+        self.feat_dim = loader(index.feat_path(spk_utts[0])).shape[1]
         self.transform = transform
         self.samples_per_speaker = samples_per_speaker
 
         if self.return_uid or self.domain:
-            self.utt_dataset = []
-            for i in range(self.samples_per_speaker * self.num_spks):
+            # utterance index and label of each sample
+            utt_dataset = np.zeros((self.samples_per_speaker * self.num_spks, 2), dtype=np.int32)
+            for i in range(len(utt_dataset)):
                 sid = i % self.num_spks
-                spk = self.idx_to_spk[sid]
-                utts = self.dataset[spk]
-                uid = utts[random.randrange(0, len(utts))]
-                self.utt_dataset.append([uid, sid])
-
+                num_utts = int(spk_ptr[sid + 1] - spk_ptr[sid])
+                utt_dataset[i] = (spk_utts[spk_ptr[sid] + random.randrange(0, num_utts)], sid)
+            self.utt_dataset = utt_dataset
 
     def __getitem__(self, sid):
         # start_time = time.time()
+        if isinstance(sid, tuple):
+            # (speaker, utterance, crop start, crop length) drawn by SpeakerBatchSampler
+            sid, utt_idx, start, length = sid
+            feat_path = self.index.feat_path(utt_idx)
+            read = getattr(self.loader, 'read', None)
+            if read != None:
+                y = read(feat_path, start, start + length)
+            else:
+                y = self.loader(feat_path)[start:start + length]
+            if len(y) < length:
+                # short utterances are tiled
+                y = y[np.arange(length) % len(y)]
+
+            return self.transform(y), sid
+
         if self.return_uid or self.domain:
-            uid, label = self.utt_dataset[sid]
-            y = self.loader(self.uid2feat[uid])
+            utt_idx, label = self.utt_dataset[sid].tolist()
+            y = self.loader(self.index.feat_path(utt_idx))
             feature = self.transform(y)
 
             if self.domain:
-                label_b = self.dom_to_idx[self.utt2dom_dict[uid]]
+                label_b = int(self.utt2dom_idx[self.index.utt_dom[utt_idx]])
+                if label_b < 0:
+                    # not in utt2dom
+                    raise KeyError(self.index.uid(utt_idx))
                 return feature, label, label_b
             else:
-                return feature, label, uid
+                return feature, label, self.index.uid(utt_idx)
 
         sid %= self.num_spks
-        spk = self.idx_to_spk[sid]
-        utts = self.dataset[spk]
-
-        n_samples = 0
-        y = np.array([[]]).reshape(0, self.feat_dim)
+        utts = self.spk_utts[self.spk_ptr[sid]:self.spk_ptr[sid + 1]]
 
         frames = c.N_SAMPLES
+        # the first num_frames - 1 frames of random utterances until frames are collected, the length of
+        # each span is taken from utt2num_frames, so loaders like ArkWindowReader read only its frames
+        read = getattr(self.loader, 'read', None)
+        y = None
+        n_samples = 0
         while n_samples < frames:
-
-            uid = random.randrange(0, len(utts))
-            feature = self.loader(self.uid2feat[utts[uid]])
-
-            start = 0
-            stop = int(min(len(feature) - 1, max(1.0, frames - n_samples)))
-            y = np.concatenate((y, feature[start:stop]), axis=0)
-            n_samples = len(y)
-            # transform features if required
+            utt_idx = utts[random.randrange(0, len(utts))]
+            feat_path = self.index.feat_path(utt_idx)
+            num_frames = int(self.index.num_frames[utt_idx])
+            if read != None and num_frames >= 0:
+                length = int(min(num_frames - 1, max(1, frames - n_samples)))
+                feature = read(feat_path, 0, length)
+            else:
+                # length is not in utt2num_frames
+                feature = self.loader(feat_path)
+                length = int(min(len(feature) - 1, max(1, frames - n_samples)))
+
+            # utt2num_frames may be longer than the matrix in feats.scp, keep the frames which are read
+            feature = feature[:length]
+            length = len(feature)
+            if y is None:
+                y = np.empty((frames, feature.shape[1]), dtype=feature.dtype)
+            y[n_samples:n_samples + length] = feature
+            n_samples += length
 
         feature = self.transform(y)
         label = sid
@@ -919,50 +924,23 @@ class ScriptTestDataset(data.Dataset):
         if not os.path.exists(trials):
             raise FileExistsError(trials)
 
-        dataset = {}
-        with open(spk2utt, 'r') as u:
-            all_cls = u.readlines()
-            for line in all_cls:
-                spk_utt = line.split(' ')
-                spk_name = spk_utt[0]
-                if spk_name not in dataset.keys():
-                    spk_utt[-1] = spk_utt[-1].rstrip('\n')
-                    dataset[spk_name] = spk_utt[1:]
+        # parsed once and cached in dir/data_index.npz
+        index = UttIndex.from_dir(dir)
 
-        speakers = [spk for spk in dataset.keys()]
-        speakers.sort()
+        speakers = decode_names(index.speakers)
         print('    There are {} speakers in Test Dataset.'.format(len(speakers)))
+        print('    There are {} utterances in Test Dataset.'.format(len(index)))
 
-        uid2feat = {}
-        with open(feat_scp, 'r') as f:
-            for line in f.readlines():
-                uid, feat_offset = line.split()
-                uid2feat[uid] = feat_offset
-
-        print('    There are {} utterances in Test Dataset.'.format(len(uid2feat)))
-
-        trials_pair = []
-        positive_pairs = 0
-        with open(trials, 'r') as t:
-            all_pairs = t.readlines()
-            for line in all_pairs:
-                pair = line.split()
-                if pair[2] == 'nontarget' or pair[2] == '0':
-                    pair_true = False
-                else:
-                    pair_true = True
-                    positive_pairs += 1
-
-                trials_pair.append((pair[0], pair[1], pair_true))
-
-        trials_pair = np.array(trials_pair)
-        trials_pair = trials_pair[trials_pair[:, 2].argsort()[::-1]]
+        # (utt a, utt b, 0/1)
+        trials_pair, positive_pairs, dropped_pairs = index.trials()
+        if dropped_pairs > 0:
+            print('    Remove {} pairs whose utterances are not in feats.scp.'.format(dropped_pairs))
 
         print('==>There are {} pairs in test Dataset with {} positive pairs'.format(len(trials_pair), positive_pairs))
 
-        self.feat_dim = loader(uid2feat[dataset[speakers[0]][0]]).shape[1]
+        self.feat_dim = loader(index.feat_path(index.spk_utts[0])).shape[1]
         self.speakers = speakers
-        self.uid2feat = uid2feat
+        self.index = index
         self.trials_pair = trials_pair
         self.num_spks = len(speakers)
         self.numofpositive = positive_pairs
@@ -972,25 +950,21 @@ class ScriptTestDataset(data.Dataset):
         self.return_uid = return_uid
 
     def __getitem__(self, index):
-        uid_a, uid_b, label = self.trials_pair[index]
+        utt_a, utt_b, label = self.trials_pair[index].tolist()
 
-        feat_a = self.uid2feat[uid_a]
-        feat_b = self.uid2feat[uid_b]
+        feat_a = self.index.feat_path(utt_a)
+        feat_b = self.index.feat_path(utt_b)
         y_a = self.loader(feat_a)
         y_b = self.loader(feat_b)
 
         data_a = self.transform(y_a)
         data_b = self.transform(y_b)
-
-        if label == 'True' or label == True:
-            label = True
-        else:
-            label = False
+        label = label == 1
 
         if self.return_uid:
             # pdb.set_trace()
             # print(uid_a, uid_b)
-            return data_a, data_b, label, uid_a, uid_b
+            return data_a, data_b, label, self.index.uid(utt_a), self.index.uid(utt_b)
 
         return data_a, data_b, label
 
@@ -1023,10 +997,7 @@ class ScriptTestDataset(data.Dataset):
             self.trials_pair = np.concatenate((positive_pairs, nagative_pairs), axis=0)
 
         assert len(self.trials_pair) == num
-        num_positive = 0
-        for x, y, z in self.trials_pair:
-            if z == 'True':
-                num_positive += 1
+        num_positive = int(np.sum(self.trials_pair[:, 2]))
 
         assert len(self.trials_pair) == num, '%d != %d' % (len(self.trials_pair), num)
         assert self.numofpositive == num_positive, '%d != %d' % (self.numofpositive, num_positive)
@@ -1051,60 +1022,39 @@ class SitwTestDataset(data.Dataset):
         for p in feat_scp, spk2utt, trials:
             check_exist(p)
 
-        uid2feat = {}
-        with open(feat_scp, 'r') as t:
-            all_pairs = t.readlines()
-            for line in all_pairs:
-                # 12013 lpnns target
-                pair = line.split()
-                uid2feat[pair[0]] = pair[1]
-
-        trials_pair = []
-        numofpositive = 0
-        with open(trials, 'r') as t:
-            all_pairs = t.readlines()
-            for line in all_pairs:
-                # 12013 lpnns target
-                pair = line.split()
-                if pair[2] == 'nontarget':
-                    pair_true = False
-                else:
-                    pair_true = True
-                    numofpositive += 1
-
-                trials_pair.append((pair[0], pair[1], pair_true))
+        # parsed once and cached in data_index.npz
+        index = UttIndex.from_dir(os.path.dirname(feat_scp))
 
-        trials_pair = np.array(trials_pair)
-        trials_pair = trials_pair[trials_pair[:, 2].argsort()[::-1]]
+        # 12013 lpnns target -> (utt a, utt b, 0/1)
+        trials_pair, numofpositive, dropped_pairs = index.trials()
+        if dropped_pairs > 0:
+            print('    Remove {} pairs whose utterances are not in feats.scp.'.format(dropped_pairs))
 
         print('==>There are %d pairs in sitw %s Dataset %d of them are positive.' % (
         len(trials_pair), sitw_set, numofpositive))
         # pdb.set_trace()
-        self.feat_dim = loader(uid2feat[trials_pair[0][0]]).shape[1]
+        self.feat_dim = loader(index.feat_path(trials_pair[0][0])).shape[1]
 
         self.pairs = len(trials_pair)
         self.numofpositive = numofpositive
-        self.uid2feat = uid2feat
+        self.index = index
         self.trials_pair = trials_pair
         self.loader = loader
         self.transform = transform
         self.return_uid = return_uid
 
     def __getitem__(self, index):
-        uid_a, uid_b, label = self.trials_pair[index]
+        utt_a, utt_b, label = self.trials_pair[index].tolist()
 
-        data_a = self.loader(self.uid2feat[uid_a])
-        data_b = self.loader(self.uid2feat[uid_b])
+        data_a = self.loader(self.index.feat_path(utt_a))
+        data_b = self.loader(self.index.feat_path(utt_b))
 
         data_a = self.transform(data_a)
         data_b = self.transform(data_b)
-        if label == 'True' or label == True:
-            label = True
-        else:
-            label = False
+        label = label == 1
 
         if self.return_uid:
-            return data_a, data_b, label, uid_a, uid_b
+            return data_a, data_b, label, self.index.uid(utt_a), self.index.uid(utt_b)
 
         return data_a, data_b, label
 
@@ -1137,10 +1087,7 @@ class SitwTestDataset(data.Dataset):
             self.trials_pair = np.concatenate((positive_pairs, nagative_pairs), axis=0)
 
         assert len(self.trials_pair) == num
-        num_positive = 0
-        for x, y, z in self.trials_pair:
-            if z == 'True':
-                num_positive += 1
+        num_positive = int(np.sum(self.trials_pair[:, 2]))
 
         assert len(self.trials_pair) == num, '%d != %d' % (len(self.trials_pair), num)
         assert self.numofpositive == num_positive, '%d != %d' % (self.numofpositive, num_positive)
@@ -8,6 +8,8 @@
 @File: augment_data_dir.py
 @Time: 2019/10/16 上午10:31
 @Overview: This is modified based on 'egs/sre16/v2/steps/data/augment_data_dir.py' in kaldi.
+The noises are loaded once into a NoiseBank and mixed in-process over a process pool, instead of
+running wav-reverberate for every utterance.
 """
 #!/usr/bin/env python3
 # Copyright 2017  David Snyder
@@ -21,10 +23,14 @@
 # additive noise.
 from __future__ import print_function
 
-import pathlib
-import pdb
-import sys
 import sys, random, argparse, os, imp
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import soundfile as sf
+
+from Process_Data.audio_augment.noise_bank import NoiseBank, mix_noises, read_wav_line
 # Append system path
 # sys.path.append("steps/data/")
 # sys.path.insert(0, 'steps/')
@@ -33,7 +39,6 @@ import sys, random, argparse, os, imp
 # from reverberate_data_dir import write_dict_to_file
 # import libs.common as common_lib
 # data_lib = imp.load_source('dml', 'steps/data/data_dir_manipulation_lib.py')
-from subprocess import call
 
 
 def get_args():
@@ -82,6 +87,11 @@ def get_args():
     parser.add_argument("--output-dir", type=str, dest="output_dir",
                         default='/home/cca01/work2019/yangwenhao/mydataset/voxceleb1_noise',
                         help="Output data directory")
+    parser.add_argument("--wav-dir", type=str, dest="wav_dir", default='',
+                        help="Directory of the augmented wavs (default: output_dir/wav)")
+    parser.add_argument("--sample-rate", type=int, dest="sample_rate", default=16000,
+                        help="Sample rate of the data, noises are resampled to it when loaded")
+    parser.add_argument("--nj", type=int, default=8, help="Number of jobs")
 
     print(' '.join(sys.argv))
     args = parser.parse_args()
@@ -104,6 +114,8 @@ def check_args(args):
 
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
+    if args.wav_dir == '':
+        args.wav_dir = os.path.join(args.output_dir, 'wav')
     if not args.fg_interval >= 0:
         raise Exception("--fg-interval must be 0 or greater")
     if args.bg_noise_dir is None and args.fg_noise_dir is None:
@@ -155,76 +167,56 @@ def write_dict_to_file(dict, file_name):
     file.close()
 
 
-def augment_wav(utt, wav, dur, fg_snr_opts, bg_snr_opts, fg_noise_utts, \
-    bg_noise_utts, noise_wavs, noise2dur, interval, num_opts):
-    # This section is common to both foreground and background noises
-    new_wav = ""
-    dur_str = str(dur)
-    noise_dur = 0
-    tot_noise_dur = 0
-    snrs=[]
-    noises=[]
-    start_times=[]
+def plan_noises(dur, fg_snr_opts, bg_snr_opts, fg_noise_utts, bg_noise_utts, noise2dur, interval, num_opts):
+    """ This function draws the noises of one recording with the same random calls as the
+        wav-reverberate command of the kaldi script.
+        Returns a list of (noise utt, snr, start time, is background noise)
+    """
+    plan = []
 
     # Now handle the background noises
     if len(bg_noise_utts) > 0:
         num = random.choice(num_opts)
         for i in range(0, num):
             noise_utt = random.choice(bg_noise_utts)
-            noise = "wav-reverberate --duration=" \
-            + dur_str + " \"" + noise_wavs[noise_utt] + "\" - |"
             snr = random.choice(bg_snr_opts)
-            snrs.append(snr)
-            start_times.append(0)
-            noises.append(noise)
+            plan.append((noise_utt, snr, 0, True))
 
     # Now handle the foreground noises
     if len(fg_noise_utts) > 0:
+        tot_noise_dur = 0
         while tot_noise_dur < dur:
             noise_utt = random.choice(fg_noise_utts)
-            noise = noise_wavs[noise_utt]
             snr = random.choice(fg_snr_opts)
-            snrs.append(snr)
-            noise_dur = noise2dur[noise_utt]
-            start_times.append(tot_noise_dur)
-            tot_noise_dur += noise_dur + interval
-            noises.append(noise)
-
-    start_times_str = "--start-times='" + ",".join([str(i) for i in start_times]) + "'"
-    snrs_str = "--snrs='" + ",".join([str(i) for i in snrs]) + "'"
-    noises_str = "--additive-signals='" + ",".join(noises).strip() + "'"
-
-    # If the wav is just a file
-    if wav.strip()[-1] != "|":
-        # output to a file
-
-        wav_path = pathlib.Path(wav)
-        data_root = '/home/cca01/work2019/yangwenhao/mydataset/voxceleb1_noise'
-        data_root = os.path.join(data_root, str(wav_path.relative_to(wav_path.parents[5])))
-
-        if not os.path.exists(os.path.dirname(data_root)):
-            os.makedirs(os.path.dirname(data_root))
-
-        new_wav = "wav-reverberate --shift-output=true " + noises_str + " " \
-            + start_times_str + " " + snrs_str + " " + wav + " " + data_root
-        FNULL = open(os.devnull, 'w')
-
-        try:
-            retcode = call(new_wav, stdout=FNULL, shell=True)
-            if retcode < 0:
-                print("Child was terminated by signal", retcode)
-            else:
-                print("Child returned", retcode)
+            plan.append((noise_utt, snr, tot_noise_dur, False))
+            tot_noise_dur += noise2dur[noise_utt] + interval
 
-        except OSError as e:
-            pdb.set_trace()
-            print("Execution failed:", e)
+    return plan
 
-    # Else if the wav is in a pipe
-    else:
-        new_wav = wav + " wav-reverberate --shift-output=true " + noises_str + " " \
-            + start_times_str + " " + snrs_str + " - - |"
-    return new_wav
+
+def augment_wav(task):
+    """ Mix the noises of the plan into the recording and write the noisy wav.
+        task is (index, new utt, wav.scp value, plan), the noise bank is inherited from main.
+        Returns index, new utt, new wav path, number of clipped samples and error message
+    """
+    i, new_utt, wav, plan = task
+    new_wav = os.path.join(wav_dir, new_utt.replace('/', '_') + '.wav')
+    try:
+        samples, samplerate = read_wav_line([new_utt] + wav.split())
+        if samplerate != noise_bank.sample_rate:
+            raise Exception("Sample rate {0} is not {1}".format(samplerate, noise_bank.sample_rate))
+
+        noises = [noise_bank.get(noise_utt) for noise_utt, _, _, _ in plan]
+        snrs = [snr for _, snr, _, _ in plan]
+        start_times = [start_time for _, _, start_time, _ in plan]
+        backgrounds = [background for _, _, _, background in plan]
+        samples = mix_noises(samples, noises, snrs, start_times, samplerate, backgrounds=backgrounds)
+
+        num_clipped = int(np.sum(np.abs(samples) > 1.))
+        sf.write(new_wav, np.clip(samples, -1., 1.), samplerate, subtype='PCM_16')
+        return i, new_utt, new_wav, num_clipped, None
+    except Exception as e:
+        return i, new_utt, None, 0, str(e)
 
 def get_new_id(utt, utt_modifier_type, utt_modifier):
     """ This function generates a new id from the input id
@@ -303,6 +295,10 @@ def prepare_noise(root_dir, sampling_rate):
 def get_utt2dur(root_dir):
     return 0
 
+# noise bank and output dir of the jobs, set in main before the pool is forked
+noise_bank = None
+wav_dir = ''
+
 def main():
 
     # pdb.set_trace()
@@ -314,50 +310,73 @@ def main():
     bg_snrs = [int(i) for i in args.bg_snr_str.split(":")]
     num_bg_noises = [int(i) for i in args.num_bg_noises.split(":")]
     if not os.path.exists(input_dir + "/reco2dur"):
-        get_utt2dur()
-    reco2dur = parse_file_to_dict(input_dir + "/reco2dur", value_processor = lambda x: float(x[0]))
+        reco2dur_file = input_dir + "/utt2dur"
+    else:
+        reco2dur_file = input_dir + "/reco2dur"
+    reco2dur = parse_file_to_dict(reco2dur_file, value_processor = lambda x: float(x[0]))
     wav_scp_file = open(input_dir + "/wav.scp", 'r').readlines()
 
-    noise_wavs = {}
-    noise_reco2dur = {}
     bg_noise_utts = []
     fg_noise_utts = []
-
-    # Load background noises
+    noise_wav_scps = []
     if args.bg_noise_dir:
-        bg_noise_wav_filename = args.bg_noise_dir + "/wav.scp"
-        bg_noise_utts, bg_noise_wavs = get_noise_list(bg_noise_wav_filename)
-        bg_noise_reco2dur = parse_file_to_dict(args.bg_noise_dir + "/reco2dur", value_processor = lambda x: float(x[0]))
-        noise_wavs.update(bg_noise_wavs)
-        noise_reco2dur.update(bg_noise_reco2dur)
-
-    # Load foreground noises
+        bg_noise_utts, _ = get_noise_list(args.bg_noise_dir + "/wav.scp")
+        noise_wav_scps.append(args.bg_noise_dir + "/wav.scp")
     if args.fg_noise_dir:
-        fg_noise_wav_filename = args.fg_noise_dir + "/wav.scp"
-        fg_noise_reco2dur_filename = args.fg_noise_dir + "/reco2dur"
-        fg_noise_utts, fg_noise_wavs = get_noise_list(fg_noise_wav_filename)
-        fg_noise_reco2dur = parse_file_to_dict(args.fg_noise_dir + "/reco2dur",
-            value_processor = lambda x: float(x[0]))
-        noise_wavs.update(fg_noise_wavs)
-        noise_reco2dur.update(fg_noise_reco2dur)
+        fg_noise_utts, _ = get_noise_list(args.fg_noise_dir + "/wav.scp")
+        noise_wav_scps.append(args.fg_noise_dir + "/wav.scp")
+
+    # Load all noises once, the jobs forked below share them. Durations of the noises are taken
+    # from the loaded samples, reco2dur of the noise dirs is not needed.
+    global noise_bank, wav_dir
+    start_time = time.time()
+    noise_bank = NoiseBank(noise_wav_scps, sample_rate=args.sample_rate)
+    bg_noise_utts = [utt for utt in bg_noise_utts if utt in noise_bank]
+    fg_noise_utts = [utt for utt in fg_noise_utts if utt in noise_bank]
+    print("Loaded {0} noises with {1:.2f} hours in {2:.2f}s".format(
+        len(noise_bank), len(noise_bank.samples) / 3600. / args.sample_rate, time.time() - start_time))
+
+    wav_dir = args.wav_dir
+    if not os.path.exists(wav_dir):
+        os.makedirs(wav_dir)
 
     random.seed(args.random_seed)
     new_utt2wav = {}
     new_utt2spk = {}
 
-    # Augment each line in the wav file
+    # Draw the noises of each line in the wav file in order, then mix them in parallel
+    tasks = []
     for line in wav_scp_file:
         toks = line.rstrip().split(" ")
         utt = toks[0]
         wav = " ".join(toks[1:])
         dur = reco2dur[utt]
-        new_wav = augment_wav(utt, wav, dur, fg_snrs, bg_snrs, fg_noise_utts,
-            bg_noise_utts, noise_wavs, noise_reco2dur, args.fg_interval,
-            num_bg_noises)
+        plan = plan_noises(dur, fg_snrs, bg_snrs, fg_noise_utts, bg_noise_utts,
+            noise_bank.durations, args.fg_interval, num_bg_noises)
 
         new_utt = get_new_id(utt, args.utt_modifier_type, args.utt_modifier)
-
-        new_utt2wav[new_utt] = new_wav
+        tasks.append((len(tasks), new_utt, wav, plan))
+
+    start_time = time.time()
+    num_errors = 0
+    clipped_utts = 0
+    clipped_samples = 0
+    pool = Pool(processes=args.nj)
+    for i, new_utt, new_wav, num_clipped, error in pool.imap_unordered(augment_wav, tasks, chunksize=16):
+        if error is not None:
+            print("Failed to augment {0}: {1}".format(new_utt, error))
+            num_errors += 1
+        else:
+            new_utt2wav[new_utt] = new_wav
+            if num_clipped > 0:
+                clipped_utts += 1
+                clipped_samples += num_clipped
+    pool.close()
+    pool.join()
+    print("Augmented {0} recordings in {1:.2f}s with {2} errors".format(
+        len(new_utt2wav), time.time() - start_time, num_errors))
+    if clipped_utts > 0:
+        print("Warning: {0} samples of {1} recordings are clipped to [-1, 1]".format(clipped_samples, clipped_utts))
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
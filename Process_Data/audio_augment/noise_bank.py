@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: noise_bank.py
+@Time: 2026/10/19 7:30 PM
+@Overview: In-process additive noise as wav-reverberate of kaldi. The noise recordings of a
+wav.scp (e.g. the MUSAN lists of make_musan.py) are loaded once into one float32 array, so the
+processes forked after loading share its pages instead of reading the noises again. Noises are
+scaled to a SNR against the power of the clean signal, background noises are repeated to cover
+the whole recording and foreground noises are added from their start times.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+from Process_Data.audio_augment.common import RunCommand
+from Process_Data.audio_processing import load_wav, resample
+
+
+def read_wav_line(pair):
+    """
+    :param pair: split line of wav.scp, pipes are decoded in memory
+    :return: float32 samples of the first channel and sample rate
+    """
+    if len(pair) > 2:
+        spid, stdout, error = RunCommand(' '.join(pair[1:]))
+        samples, samplerate = load_wav(stdout, dtype='float32')
+    else:
+        samples, samplerate = load_wav(pair[1], dtype='float32')
+
+    if samples.ndim > 1:
+        samples = samples[:, 0]
+    return samples, samplerate
+
+
+class NoiseBank(object):
+    """
+    Noise waveforms of one or more wav.scp, or of split wav.scp lines in pairs, at sample_rate,
+    concatenated in one array.
+    """
+
+    def __init__(self, wav_scps, sample_rate=16000, utts=None, pairs=None):
+        self.sample_rate = sample_rate
+        self.utts = []
+        self.index = {}
+
+        pairs = [] if pairs is None else list(pairs)
+        for wav_scp in ([wav_scps] if isinstance(wav_scps, str) else wav_scps):
+            with open(wav_scp, 'r') as f:
+                pairs.extend([line.split() for line in f])
+
+        waves = []
+        offsets = [0]
+        for pair in pairs:
+            if len(pair) < 2 or pair[0] in self.index or (utts is not None and pair[0] not in utts):
+                continue
+            try:
+                samples, samplerate = read_wav_line(pair)
+            except Exception as e:
+                print('Can not load noise %s: %s' % (pair[0], str(e)))
+                continue
+
+            if samplerate != sample_rate:
+                samples = resample(samples, samplerate, sample_rate)
+            if len(samples) == 0:
+                continue
+
+            self.index[pair[0]] = len(self.utts)
+            self.utts.append(pair[0])
+            waves.append(samples.astype(np.float32, copy=False))
+            offsets.append(offsets[-1] + len(samples))
+
+        self.samples = np.concatenate(waves) if len(waves) > 0 else np.zeros(0, dtype=np.float32)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.durations = dict(zip(self.utts, np.diff(self.offsets) / float(sample_rate)))
+
+    def __len__(self):
+        return len(self.utts)
+
+    def __contains__(self, utt):
+        return utt in self.index
+
+    def get(self, utt):
+        """
+        :return: read-only view of the samples of a noise
+        """
+        i = self.index[utt]
+        noise = self.samples[self.offsets[i]:self.offsets[i + 1]]
+        noise.flags.writeable = False
+        return noise
+
+
+def signal_power(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    return float(np.dot(samples, samples)) / max(len(samples), 1)
+
+
+def extend_noise(noise, num_samples):
+    """
+    Repeat the noise to num_samples as the --duration option of wav-reverberate.
+    """
+    if len(noise) >= num_samples:
+        return noise[:num_samples]
+    return np.resize(noise, num_samples)
+
+
+def add_noise(signal, noise, snr, start, power):
+    """
+    Add noise scaled to snr dB against power from sample start on, in-place. The noise power is
+    taken over the whole noise as AddNoise of wav-reverberate, before it is cut at the end.
+    """
+    noise_power = signal_power(noise)
+    if start >= len(signal) or noise_power <= 0:
+        return signal
+    noise = noise[:len(signal) - start]
+
+    scale = np.sqrt(10 ** (-snr / 10.) * power / noise_power)
+    signal[start:start + len(noise)] += (scale * noise).astype(signal.dtype)
+    return signal
+
+
+def mix_noises(samples, noises, snrs, start_times, sample_rate, backgrounds=None, normalize_output=True):
+    """
+    :param samples: clean waveform
+    :param noises: noise waveforms
+    :param snrs: snr in dB of each noise
+    :param start_times: start time in seconds of each noise
+    :param backgrounds: bools, background noises are repeated to the length of the waveform
+    :param normalize_output: scale the noisy waveform to the power of the clean one, as the default
+        --normalize-output=true of wav-reverberate
+    :return: float32 noisy waveform
+    """
+    signal = np.array(samples, dtype=np.float32)
+    power = signal_power(signal)
+    if backgrounds is None:
+        backgrounds = [False] * len(noises)
+
+    for noise, snr, start_time, background in zip(noises, snrs, start_times, backgrounds):
+        start = int(start_time * sample_rate)
+        if background:
+            noise = extend_noise(noise, len(signal) - start)
+        add_noise(signal, noise, snr, start, power)
+
+    if normalize_output:
+        power_after = signal_power(signal)
+        if power_after > 0:
+            signal *= np.float32(np.sqrt(power / power_after))
+
+    return signal
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: online_reverb.py
+@Time: 2026/10/19 8:40 PM
+@Overview: On-the-fly reverberation and point-source noise for waveform loaders. The rooms, RIRs,
+noises and snrs are drawn with make_room_dict and pick_item_with_probability of
+reverberate_data_dir.py, and the waveform is corrupted as wav-reverberate of kaldi in numpy, so
+every epoch sees new copies without writing them to disk. The RIRs are convolved by FFT
+overlap-add with a block size fixed by the length of the RIR, and their spectra are cached in
+the memory of each DataLoader worker.
+Usage:
+    transform = transforms.Compose([OnlineReverb(['rir_list'], ['noise_list']), truncatedinput(),
+                                    toMFB(), totensor()])
+    train_dir = ClassificationDataset(..., loader=read_audio, transform=transform)
+    as --wav --rir-set-parameters rir_list of TrainAndTest/Fbank/ResNets/train_amsoftmax_res34.py.
+"""
+from __future__ import print_function
+
+import math
+import random
+from collections import OrderedDict
+
+import numpy as np
+from scipy import fft as sp_fft
+
+from Process_Data.audio_augment.noise_bank import NoiseBank, add_noise, extend_noise, read_wav_line, \
+    signal_power
+from Process_Data.audio_augment.reverberate_data_dir import list_cyclic_iterator, make_room_dict, \
+    parse_noise_list, parse_rir_list, pick_item_with_probability
+from Process_Data.audio_processing import resample
+
+
+def rir_fft_size(rir_len):
+    """
+    :return: power of 2 fft size with blocks of at least rir_len samples
+    """
+    return 1 << int(math.ceil(math.log2(2 * rir_len)))
+
+
+def overlap_add_convolve(signal, rir_spec, rir_len, nfft, length=None):
+    """
+    Convolve signal with a rir by FFT overlap-add, as FFTbasedBlockConvolveSignals of kaldi.
+    :param rir_spec: rfft of the rir with nfft points
+    :param length: number of output samples, default to len(signal), at most len(signal) + rir_len - 1
+    :return: float32 first length samples of the convolution
+    """
+    block = nfft - rir_len + 1
+    length = len(signal) if length is None else length
+    num_blocks = max(int(math.ceil(len(signal) / float(block))), 1)
+
+    x = np.zeros(num_blocks * block, dtype=np.float32)
+    x[:len(signal)] = signal
+    y = sp_fft.irfft(sp_fft.rfft(x.reshape(num_blocks, block), n=nfft, axis=1) * rir_spec, n=nfft, axis=1)
+
+    # the tail of each block is shorter than a block, and overlaps the next block only
+    out = np.zeros((num_blocks + 1) * block, dtype=np.float32)
+    out[:num_blocks * block] = y[:, :block].reshape(-1)
+    tail = np.zeros((num_blocks, block), dtype=np.float32)
+    tail[:, :nfft - block] = y[:, block:]
+    out[block:] += tail.reshape(-1)
+
+    return out[:length]
+
+
+def plan_reverberation(room_dict, pointsource_noise_list, iso_noise_dict, foreground_snrs, background_snrs,
+                       speech_rvb_probability, isotropic_noise_addition_probability,
+                       pointsource_noise_addition_probability, speech_dur, max_noises_recording):
+    """
+    Random choices of generate_reverberation_opts in reverberate_data_dir.py.
+    :return: rir of the speech or None, and list of (noise, rir or None, snr, start time, is background)
+    """
+    noises = []
+    room = pick_item_with_probability(room_dict)
+    speech_rir = pick_item_with_probability(room.rir_list)
+    rvb_rir = speech_rir if random.random() < speech_rvb_probability else None
+
+    rir_iso_noise_list = iso_noise_dict.get(speech_rir.room_id, [])
+    if len(rir_iso_noise_list) > 0 and random.random() < isotropic_noise_addition_probability:
+        isotropic_noise = pick_item_with_probability(rir_iso_noise_list)
+        noises.append((isotropic_noise, None, next(background_snrs), 0, True))
+
+    if len(pointsource_noise_list) > 0 and random.random() < pointsource_noise_addition_probability \
+            and max_noises_recording >= 1:
+        for k in range(random.randint(1, max_noises_recording)):
+            noise = pick_item_with_probability(pointsource_noise_list)
+            noise_rir = pick_item_with_probability(room.rir_list)
+            if noise.bg_fg_type == "background":
+                noises.append((noise, noise_rir, next(background_snrs), 0, True))
+            else:
+                noises.append((noise, noise_rir, next(foreground_snrs), round(random.random() * speech_dur, 2), False))
+
+    return rvb_rir, noises
+
+
+class OnlineReverb(object):
+    """
+    Transform of random reverberation and additive noises on 1-D float waveforms, with the
+    options of reverberate_data_dir.py. The RIR and noise list files are in the formats of
+    --rir-set-parameters and --noise-set-parameters.
+
+    As wav-reverberate, the additive noises are scaled against the energy of the early
+    reverberation, the output is shifted by the peak of the RIR if shift_output, and scaled back
+    to the power of the clean waveform if normalize_output. The output keeps the length of the
+    input. Noises are loaded when the transform is created and shared by the forked workers, and
+    the spectra of the last cache_size RIRs are kept in each worker. The transform holds plain
+    data only, so it is also pickled to workers started by spawn or forkserver.
+    """
+
+    def __init__(self, rir_set_para_array, noise_set_para_array=None, sample_rate=16000, rir_smoothing_weight=0.3,
+                 noise_smoothing_weight=0.3, foreground_snrs='20:10:0', background_snrs='20:10:0',
+                 speech_rvb_probability=1.0, isotropic_noise_addition_probability=1.0,
+                 pointsource_noise_addition_probability=1.0, max_noises_per_minute=2, shift_output=True,
+                 normalize_output=True, cache_size=512):
+        self.sample_rate = sample_rate
+        self.rir_list = parse_rir_list(rir_set_para_array, rir_smoothing_weight)
+        self.room_dict = make_room_dict(self.rir_list)
+
+        self.pointsource_noise_list = []
+        self.iso_noise_dict = {}
+        noise_pairs = []
+        if noise_set_para_array is not None:
+            self.pointsource_noise_list, self.iso_noise_dict = parse_noise_list(noise_set_para_array,
+                                                                                noise_smoothing_weight)
+            noise_list = self.pointsource_noise_list + [n for v in self.iso_noise_dict.values() for n in v]
+            noise_pairs = [[noise.noise_id] + noise.noise_rspecifier.split() for noise in noise_list]
+        self.noise_bank = NoiseBank([], sample_rate=sample_rate, pairs=noise_pairs)
+
+        self.foreground_snrs = list_cyclic_iterator([float(x) for x in foreground_snrs.split(':')])
+        self.background_snrs = list_cyclic_iterator([float(x) for x in background_snrs.split(':')])
+        self.speech_rvb_probability = speech_rvb_probability
+        self.isotropic_noise_addition_probability = isotropic_noise_addition_probability
+        self.pointsource_noise_addition_probability = pointsource_noise_addition_probability
+        self.max_noises_per_minute = max_noises_per_minute
+        self.shift_output = shift_output
+        self.normalize_output = normalize_output
+
+        self.cache_size = cache_size
+        self.rir_cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def rir_spectra(self, rir):
+        """
+        :return: length, fft size, peak index, spectra of the RIR and of its early reverberation
+        """
+        entry = self.rir_cache.get(rir.rir_id)
+        if entry is not None:
+            self.rir_cache.move_to_end(rir.rir_id)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        samples, samplerate = read_wav_line([rir.rir_id] + rir.rir_rspecifier.split())
+        if samplerate != self.sample_rate:
+            samples = resample(samples, samplerate, self.sample_rate)
+        samples = samples.astype(np.float32)
+
+        nfft = rir_fft_size(len(samples))
+        peak = int(np.argmax(samples))
+        # early reverberation from 1 ms before to 50 ms after the peak
+        early = samples[max(peak - int(0.001 * self.sample_rate), 0):peak + int(0.05 * self.sample_rate)]
+        entry = (len(samples), nfft, peak, sp_fft.rfft(samples, n=nfft), sp_fft.rfft(early, n=nfft))
+
+        self.rir_cache[rir.rir_id] = entry
+        if len(self.rir_cache) > self.cache_size:
+            self.rir_cache.popitem(last=False)
+        return entry
+
+    def reverberate(self, samples, rir, length=None):
+        rir_len, nfft, peak, spec, _ = self.rir_spectra(rir)
+        return overlap_add_convolve(samples, spec, rir_len, nfft, length=length)
+
+    def __call__(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if len(samples) == 0:
+            return samples
+
+        speech_dur = len(samples) / float(self.sample_rate)
+        max_noises_recording = math.floor(self.max_noises_per_minute * speech_dur / 60)
+        rvb_rir, noises = plan_reverberation(self.room_dict, self.pointsource_noise_list, self.iso_noise_dict,
+                                             self.foreground_snrs, self.background_snrs,
+                                             self.speech_rvb_probability, self.isotropic_noise_addition_probability,
+                                             self.pointsource_noise_addition_probability, speech_dur,
+                                             max_noises_recording)
+        if rvb_rir is None and len(noises) == 0:
+            return samples
+
+        power_before_reverb = signal_power(samples)
+        early_power = power_before_reverb
+        shift = 0
+        signal = samples
+        if rvb_rir is not None:
+            rir_len, nfft, peak, spec, early_spec = self.rir_spectra(rvb_rir)
+            shift = peak if self.shift_output else 0
+            early_power = signal_power(overlap_add_convolve(samples, early_spec, rir_len, nfft))
+            signal = overlap_add_convolve(samples, spec, rir_len, nfft, length=len(samples) + shift)
+        else:
+            signal = signal.copy()
+
+        for noise, noise_rir, snr, start_time, background in noises:
+            if noise.noise_id not in self.noise_bank:
+                continue
+            noise_samples = self.noise_bank.get(noise.noise_id)
+            if background:
+                noise_samples = extend_noise(noise_samples, len(signal))
+            if noise_rir is not None:
+                noise_samples = self.reverberate(noise_samples, noise_rir)
+            add_noise(signal, noise_samples, snr, int(start_time * self.sample_rate), early_power)
+
+        signal = signal[shift:shift + len(samples)]
+        if self.normalize_output:
+            power_after_reverb = signal_power(signal)
+            if power_after_reverb > 0:
+                signal = signal * np.float32(np.sqrt(power_before_reverb / power_after_reverb))
+
+        return signal
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: resample_data_dir.py
+@Time: 2026/10/19 6:40 PM
+@Overview: Resample all recordings in wav.scp of a kaldi data dir in parallel with the cached
+polyphase filters of audio_processing.resample, e.g. 16k to 8k for telephony models. The wavs
+are written as 16 bit PCM, and a new data dir with wav.scp and utt2dur is created. A random
+subset can be checked against librosa.resample.
+Usage: resample_data_dir.py --sr 8000 --nj 8 data/train data/train_8k
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import soundfile as sf
+
+from Process_Data.audio_augment.common import RunCommand
+from Process_Data.audio_processing import load_wav, resample
+
+parser = argparse.ArgumentParser(description='Resample the recordings of a kaldi data dir')
+parser.add_argument('in_dir', type=str, help='data dir with wav.scp')
+parser.add_argument('out_dir', type=str, help='new data dir')
+parser.add_argument('--sr', type=int, default=8000, help='target sample rate (default: 8000)')
+parser.add_argument('--wav-dir', type=str, default='', help='dir of the new wavs (default: out_dir/wav)')
+parser.add_argument('--nj', type=int, default=8, help='number of jobs (default: 8)')
+parser.add_argument('--check', type=int, default=0,
+                    help='number of random recordings compared with librosa.resample (default: 0)')
+parser.add_argument('--min-snr', type=float, default=30.,
+                    help='warn if the snr against librosa is lower than this in dB (default: 30)')
+args = parser.parse_args()
+
+# files of the data dir which are not changed by resampling
+COPY_FILES = ['utt2spk', 'spk2utt', 'trials', 'utt2dom', 'text', 'segments']
+
+
+def read_source(pair):
+    """
+    :return: float32 samples and sample rate of a wav.scp line, pipes are decoded in memory
+    """
+    if len(pair) > 2:
+        spid, stdout, error = RunCommand(' '.join(pair[1:]))
+        return load_wav(stdout, dtype='float32')
+    return load_wav(pair[1], dtype='float32')
+
+
+def resample_line(task):
+    """
+    :param task: (index, line of wav.scp)
+    :return: index, key, new wav path, duration and error message
+    """
+    i, line = task
+    pair = line.split()
+    key = pair[0]
+    out_wav = os.path.join(wav_dir, '%s.wav' % key.replace('/', '_'))
+    try:
+        samples, samplerate = read_source(pair)
+        samples = resample(samples, samplerate, args.sr)
+        sf.write(out_wav, np.clip(samples, -1., 1.), args.sr, subtype='PCM_16')
+        return i, key, out_wav, len(samples) / args.sr, None
+    except Exception as e:
+        return i, key, None, 0., str(e)
+
+
+def snr(ref, out):
+    num = min(len(ref), len(out))
+    noise = np.sum(np.square(ref[:num] - out[:num]))
+    return 10 * np.log10(np.sum(np.square(ref[:num])) / max(noise, 1e-20))
+
+
+def check_with_librosa(lines, num):
+    import librosa
+
+    idx = np.random.RandomState(123456).choice(len(lines), min(num, len(lines)), replace=False)
+    snrs = []
+    poly_time = 0.
+    librosa_time = 0.
+    for i in idx:
+        samples, samplerate = read_source(lines[i].split())
+
+        start = time.time()
+        out = resample(samples, samplerate, args.sr)
+        poly_time += time.time() - start
+
+        start = time.time()
+        ref = librosa.resample(np.asfortranarray(samples), orig_sr=samplerate, target_sr=args.sr)
+        librosa_time += time.time() - start
+
+        snrs.append(snr(ref, out))
+
+    snrs = np.array(snrs)
+    print('Checked %d recordings against librosa: snr mean %.2f dB, min %.2f dB. '
+          'Polyphase %.3fs, librosa %.3fs.' % (len(snrs), snrs.mean(), snrs.min(), poly_time, librosa_time))
+    if snrs.min() < args.min_snr:
+        print('Warning: snr of %d recordings is lower than %.1f dB.' % (np.sum(snrs < args.min_snr), args.min_snr))
+
+
+if __name__ == '__main__':
+    wav_scp = os.path.join(args.in_dir, 'wav.scp')
+    assert os.path.exists(wav_scp)
+    wav_dir = args.wav_dir if args.wav_dir != '' else os.path.join(args.out_dir, 'wav')
+    for d in [args.out_dir, wav_dir]:
+        if not os.path.exists(d):
+            os.makedirs(d)
+
+    with open(wav_scp, 'r') as f:
+        lines = [l for l in f.readlines() if len(l.split()) > 1]
+
+    start_time = time.time()
+    results = [None] * len(lines)
+    errors = []
+    pool = Pool(processes=args.nj)
+    for i, key, out_wav, duration, error in pool.imap_unordered(resample_line, enumerate(lines), chunksize=64):
+        if error is not None:
+            print('%s: %s' % (key, error))
+            errors.append(key)
+        else:
+            results[i] = (key, out_wav, duration)
+    pool.close()
+    pool.join()
+
+    results = [r for r in results if r is not None]
+    with open(os.path.join(args.out_dir, 'wav.scp'), 'w') as f:
+        f.write(''.join(['%s %s\n' % (key, out_wav) for key, out_wav, _ in results]))
+    with open(os.path.join(args.out_dir, 'utt2dur'), 'w') as f:
+        f.write(''.join(['%s %.6f\n' % (key, duration) for key, _, duration in results]))
+
+    for name in COPY_FILES:
+        if os.path.exists(os.path.join(args.in_dir, name)):
+            shutil.copy(os.path.join(args.in_dir, name), os.path.join(args.out_dir, name))
+
+    print('Resampled %d recordings to %d Hz in %.2fs with %d errors, new data dir is %s.' % (
+        len(results), args.sr, time.time() - start_time, len(errors), args.out_dir))
+
+    if args.check > 0:
+        check_with_librosa(lines, args.check)
@@ -18,7 +18,8 @@
 
 import argparse, shlex, glob, math, os, random, sys, warnings, copy, imp, ast
 
-data_lib = imp.load_source('dml', 'steps/data/data_dir_manipulation_lib.py')
+# loaded in __main__, the functions of this script are also used by online_reverb.py
+data_lib = None
 
 
 def get_args():
@@ -613,6 +614,15 @@ def almost_equal(value_1, value_2, accuracy=10 ** -8):
     return abs(value_1 - value_2) < accuracy
 
 
+class Room(object):
+    """ RIRs of a room and the probability of the room. Unlike a lambda it can be pickled, e.g. in
+        the OnlineReverb transform of DataLoader workers.
+    """
+    def __init__(self):
+        self.rir_list = []
+        self.probability = 0
+
+
 def make_room_dict(rir_list):
     """ This function converts a list of RIRs into a dictionary of RIRs indexed by the room-id.
         Its values are objects with two attributes: a local RIR list
@@ -623,9 +633,7 @@ def make_room_dict(rir_list):
     for rir in rir_list:
         if rir.room_id not in room_dict:
             # add new room
-            room_dict[rir.room_id] = lambda: None
-            setattr(room_dict[rir.room_id], "rir_list", [])
-            setattr(room_dict[rir.room_id], "probability", 0)
+            room_dict[rir.room_id] = Room()
         room_dict[rir.room_id].rir_list.append(rir)
 
     # the probability of the room is the sum of probabilities of its RIR
@@ -746,4 +754,5 @@ def main():
 
 
 if __name__ == "__main__":
+    data_lib = imp.load_source('dml', 'steps/data/data_dir_manipulation_lib.py')
     main()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import io
+import math
 import os
 import pathlib
 import pdb
 import traceback
+from functools import lru_cache
 
 import librosa
 import numpy as np
@@ -19,7 +22,7 @@ from speechpy.feature import mfe
 from speechpy.processing import cmvn, cmvnw
 
 from Process_Data import constants as c
-from Process_Data.Compute_Feat.compute_vad import ComputeVadEnergy
+from Process_Data.Compute_Feat.compute_vad import compute_vad_energy, drop_unvoiced
 from Process_Data.xfcc.common import local_fbank, local_mfcc
 
 
@@ -50,11 +53,46 @@ def mk_MFB(filename, sample_rate=c.SAMPLE_RATE, use_delta=c.USE_DELTA, use_scale
     return
 
 
-def resample_wav(in_wav, out_wav, sr):
+@lru_cache(maxsize=32)
+def polyphase_filter(in_sr, out_sr, beta=5.0):
+    """
+    Low-pass FIR filter of resample_poly from in_sr to out_sr, designed once for each pair.
+    :return: up, down and the read-only filter taps
+    """
+    g = math.gcd(int(in_sr), int(out_sr))
+    up = int(out_sr) // g
+    down = int(in_sr) // g
+    max_rate = max(up, down)
+    taps = signal.firwin(2 * 10 * max_rate + 1, 1. / max_rate, window=('kaiser', beta))
+    taps.setflags(write=False)
+    return up, down, taps
+
+
+def resample(samples, in_sr, out_sr):
+    """
+    Polyphase resampling with the cached filter of (in_sr, out_sr), the same as
+    scipy.signal.resample_poly(samples, up, down).
+    """
+    if in_sr == out_sr:
+        return samples
+    up, down, taps = polyphase_filter(in_sr, out_sr)
+    if samples.dtype.kind == 'f':
+        # filter in the precision of the samples as resample_poly
+        taps = taps.astype(samples.dtype)
+    return signal.resample_poly(samples, up, down, axis=0, window=taps).astype(samples.dtype)
+
+
+def resample_wav(in_wav, out_wav, sr, res_type=None):
+    """
+    :param res_type: 'polyphase' for resample, None for librosa.resample
+    """
     try:
         samples, samplerate = sf.read(in_wav, dtype='float32')
-        samples = np.asfortranarray(samples)
-        samples = librosa.resample(samples, samplerate, sr)
+        if res_type == 'polyphase':
+            samples = resample(samples, samplerate, sr)
+        else:
+            samples = np.asfortranarray(samples)
+            samples = librosa.resample(samples, samplerate, sr)
 
         sf.write(file=out_wav, data=samples, samplerate=sr, format='WAV')
     except Exception as e:
@@ -172,11 +210,8 @@ def compute_fbank_feat(filename, nfilt=c.FILTER_BANK, use_logscale=c.USE_LOGSCAL
         norm_fbank = cmvnw(vec=filter_banks, win_size=301, variance_normalization=True)
 
     if use_energy and vad:
-        voiced = []
-        ComputeVadEnergy(filter_banks, voiced)
-        voiced = np.array(voiced)
-        voiced_index = np.argwhere(voiced==1).squeeze()
-        norm_fbank = norm_fbank[voiced_index]
+        voiced = compute_vad_energy(filter_banks[:, 0])
+        norm_fbank = drop_unvoiced(norm_fbank, voiced)
 
         return norm_fbank, voiced
 
@@ -228,12 +263,36 @@ def GenerateSpect(wav_path, write_path, windowsize=25, stride=10, nfft=c.NUM_FFT
     # return spectrogram
 
 
+def load_wav(wav, dtype='int16'):
+    """
+    Read a waveform from a path, the bytes of an audio file (stdout of a wav.scp pipe), a file-like
+    object or a (samples, samplerate) tuple of an in-memory waveform.
+    :param dtype: 'int16' or 'float32' in [-1.0, 1.0], as sf.read
+    :return: samples, samplerate
+    """
+    if isinstance(wav, tuple):
+        samples, samplerate = wav
+        samples = np.asarray(samples)
+        if dtype == 'int16' and samples.dtype.kind == 'f':
+            samples = np.clip(np.round(samples * 32768), -32768, 32767).astype(np.int16)
+        elif dtype == 'float32' and samples.dtype.kind == 'i':
+            samples = (samples / 32768.).astype(np.float32)
+        return samples.astype(dtype, copy=False), samplerate
+
+    if isinstance(wav, (bytes, bytearray, memoryview)):
+        wav = io.BytesIO(wav)
+    elif not hasattr(wav, 'read') and not os.path.exists(wav):
+        raise ValueError('wav file does not exist.')
+
+    return sf.read(wav, dtype=dtype)
+
+
 def Make_Spect(wav_path, windowsize, stride, window=np.hamming,
                bandpass=False, lowfreq=0, highfreq=0,
                preemph=0.97, duration=False, nfft=None, normalize=True):
     """
     read wav as float type. [-1.0 ,1.0]
-    :param wav_path:
+    :param wav_path: path, bytes, file-like object or (samples, samplerate) as load_wav
     :param windowsize:
     :param stride:
     :param window: default to np.hamming
@@ -241,7 +300,7 @@ def Make_Spect(wav_path, windowsize, stride, window=np.hamming,
     """
 
     # samplerate, samples = wavfile.read(wav_path)
-    samples, samplerate = sf.read(wav_path, dtype='float32')
+    samples, samplerate = load_wav(wav_path, dtype='float32')
 
     if bandpass and highfreq > lowfreq:
         samples = butter_bandpass_filter(data=samples, cutoff=[lowfreq, highfreq], fs=samplerate)
@@ -286,11 +345,9 @@ def Make_Fbank(filename,
                duration=False,
                multi_weight=False):
 
-    if not os.path.exists(filename):
-        raise ValueError('wav file does not exist.')
-
+    # filename may also be bytes, file-like object or (samples, samplerate) as load_wav
     # sample_rate, audio = wavfile.read(filename)
-    audio, sample_rate = sf.read(filename, dtype='int16')
+    audio, sample_rate = load_wav(filename, dtype='int16')
     # audio, sample_rate = librosa.load(filename, sr=None)
     #audio = audio.flatten()
 
@@ -342,11 +399,9 @@ def Make_MFCC(filename,
               use_energy=c.USE_ENERGY, lowfreq=0, nfft=512,
               normalize=c.NORMALIZE,
               duration=False):
-    if not os.path.exists(filename):
-        raise ValueError('wav file does not exist.')
-
+    # filename may also be bytes, file-like object or (samples, samplerate) as load_wav
     # sample_rate, audio = wavfile.read(filename)
-    audio, sample_rate = sf.read(filename, dtype='int16')
+    audio, sample_rate = load_wav(filename, dtype='int16')
     # audio, sample_rate = librosa.load(filename, sr=None)
     # audio = audio.flatten()
     feats = local_mfcc(audio, samplerate=sample_rate,
@@ -519,20 +574,67 @@ class varLengthFeat(object):
 
         return network_inputs
 
-def pad_tensor(vec, pad, dim):
+def pad_index(length, pad):
     """
     args:
-        vec - tensor to pad
+        length - size of the sequence
+        pad - the size to pad to
+    return:
+        indices of the sequence tiled by doubling until 'pad' and cropped at a random start
+    """
+    tiled = length
+    while tiled < pad:
+        tiled *= 2
+
+    start = np.random.randint(low=0, high=tiled - pad + 1)
+    return (start + np.arange(pad)) % length
+
+
+def pad_tensor(vec, pad, dim, out=None):
+    """
+    args:
+        vec - tensor or numpy array to pad
         pad - the size to pad to
         dim - dimension to pad
+        out - tensor to write the result into, e.g. one row of a preallocated batch
     return:
-        a new tensor padded itself to 'pad' in dimension 'dim'
+        a tensor padded itself to 'pad' in dimension 'dim'
     """
-    while vec.shape[dim]<pad:
-        vec = torch.cat([vec, vec], dim=dim)
+    if isinstance(vec, np.ndarray):
+        vec = torch.from_numpy(vec)
+
+    if vec.shape[dim] >= pad:
+        start = np.random.randint(low=0, high=vec.shape[dim] - pad + 1)
+        vec = torch.Tensor.narrow(vec, dim=dim, start=start, length=pad)
+        if out is None:
+            return vec
+        return out.copy_(vec)
+
+    index = torch.from_numpy(pad_index(vec.shape[dim], pad))
+    if out is None:
+        return torch.index_select(vec, dim, index)
+    return out.copy_(torch.index_select(vec, dim, index))
 
-    start = np.random.randint(low=0, high=vec.shape[dim]-pad+1)
-    return torch.Tensor.narrow(vec, dim=dim, start=start, length=pad)
+
+def pad_batch(vecs, pad, dim):
+    """
+    args:
+        vecs - list of tensors or numpy arrays
+        pad - the size to pad to
+        dim - dimension to pad in each element
+    return:
+        batch tensor allocated once, numpy elements are converted to float32
+    """
+    first = vecs[0]
+    shape = list(first.shape)
+    shape[dim] = pad
+    dtype = first.dtype if isinstance(first, torch.Tensor) else torch.float32
+
+    xs = torch.empty([len(vecs)] + shape, dtype=dtype)
+    for i, vec in enumerate(vecs):
+        pad_tensor(vec, pad=pad, dim=dim, out=xs[i])
+
+    return xs
 
 class PadCollate:
     """
@@ -540,16 +642,21 @@ class PadCollate:
     a batch of sequences
     """
 
-    def __init__(self, dim=0, min_chunk_size=300, max_chunk_size=400, normlize=True, fix_len=False):
+    def __init__(self, dim=0, min_chunk_size=300, max_chunk_size=400, normlize=True, fix_len=False, cmvn=None,
+                 augment=None):
         """
         args:
             dim - the dimension to be padded (dimension of time in sequences)
+            cmvn - normalization of the padded batch, e.g. cmvn.SlidingCMVN(dim=dim)
+            augment - augmentation of the normalized batch, e.g. spec_augment.SpecAugment()
         """
         self.dim = dim
         self.min_chunk_size = min_chunk_size
         self.max_chunk_size = max_chunk_size
         self.fix_len = fix_len
         self.normlize = normlize
+        self.cmvn = cmvn
+        self.augment = augment
 
         if self.fix_len:
             self.frame_len = np.random.randint(low=self.min_chunk_size, high=self.max_chunk_size)
@@ -568,18 +675,13 @@ class PadCollate:
         else:
             frame_len = np.random.randint(low=self.min_chunk_size, high=self.max_chunk_size)
 
-        # pad according to max_len
-        map_batch = map(lambda x_y: (pad_tensor(x_y[0], pad=frame_len, dim=self.dim - 1), x_y[1]), batch)
-        pad_batch = list(map_batch)
-        # print(frame_len)
-        # stack all
-        # if self.normlize:
-        #     xs = torch.stack(list(map(lambda x: (x[0] - torch.mean(x[0], dim=1)) / torch.std(x[0], dim=1), pad_batch)),
-        #                      dim=0)
-        # else:
-        xs = torch.stack(list(map(lambda x: x[0], pad_batch)), dim=0)
-
-        ys = torch.LongTensor(list(map(lambda x: x[1], pad_batch)))
+        # pad into the batch tensor
+        xs = pad_batch([x[0] for x in batch], pad=frame_len, dim=self.dim - 1)
+        ys = torch.LongTensor([x[1] for x in batch])
+        if self.cmvn is not None:
+            xs = self.cmvn(xs)
+        if self.augment is not None:
+            xs = self.augment(xs)
 
         return xs, ys
 
@@ -660,21 +762,13 @@ class TripletPadCollate:
 
         # max_len = max(map(lambda x: x[0].shape[self.dim], batch))
         frame_len = self.num_chunk
-        # pad according to max_len
-        map_batch = map(lambda x_y: (pad_tensor(x_y[0], pad=frame_len, dim=self.dim),
-                                     pad_tensor(x_y[1], pad=frame_len, dim=self.dim),
-                                     pad_tensor(x_y[2], pad=frame_len, dim=self.dim),
-                                     x_y[3],
-                                     x_y[4]), batch)
-        pad_batch = list(map_batch)
-        # stack all
-
-        xs_a = torch.stack(list(map(lambda x: x[0], pad_batch)), dim=0)
-        xs_p = torch.stack(list(map(lambda x: x[1], pad_batch)), dim=0)
-        xs_n = torch.stack(list(map(lambda x: x[2], pad_batch)), dim=0)
+        # pad into the batch tensors
+        xs_a = pad_batch([x[0] for x in batch], pad=frame_len, dim=self.dim)
+        xs_p = pad_batch([x[1] for x in batch], pad=frame_len, dim=self.dim)
+        xs_n = pad_batch([x[2] for x in batch], pad=frame_len, dim=self.dim)
 
-        ys_a = torch.LongTensor(list(map(lambda x: x[3], pad_batch)))
-        ys_n = torch.LongTensor(list(map(lambda x: x[4], pad_batch)))
+        ys_a = torch.LongTensor([x[3] for x in batch])
+        ys_n = torch.LongTensor([x[4] for x in batch])
 
 
         return xs_a, xs_p, xs_n, ys_a, ys_n
@@ -712,13 +806,9 @@ class ExtractCollate:
 
         # max_len = max(map(lambda x: x[0].shape[self.dim], batch))
         frame_len = self.num_chunk
-        # pad according to max_len
-        map_batch = map(lambda x_y: (pad_tensor(x_y[0], pad=frame_len, dim=self.dim), x_y[1]), batch)
-        pad_batch = list(map_batch)
-        # stack all
-
-        xs = torch.stack(list(map(lambda x: x[0], pad_batch)), dim=0)
-        ys = torch.LongTensor(list(map(lambda x: x[1], pad_batch)))
+        # pad into the batch tensor
+        xs = pad_batch([x[0] for x in batch], pad=frame_len, dim=self.dim)
+        ys = torch.LongTensor([x[1] for x in batch])
         uid = [x[2] for x in batch]
 
         return xs, ys, uid
@@ -762,7 +852,13 @@ class truncatedinputfromSpectrogram(object):
         return np.array(network_inputs)
 
 
-def read_audio(filename, sample_rate=c.SAMPLE_RATE):
+def read_audio(filename, sample_rate=c.SAMPLE_RATE, res_type=None):
+    if res_type == 'polyphase':
+        audio, sr = sf.read(filename, dtype='float32')
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        return resample(audio, sr, sample_rate)
+
     audio, sr = librosa.load(filename, sr=sample_rate, mono=True)
     audio = audio.flatten()
     return audio
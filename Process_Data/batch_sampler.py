@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: batch_sampler.py
+@Time: 2026/10/18 10:20 PM
+@Overview: Speaker-balanced batch sampler for ScriptTrainDataset. The (speaker, utterance, crop
+start, crop length) tuples of a whole epoch are drawn at once with numpy. Every batch holds P
+speakers with K utterances each, and utterances are bucketed by utt2num_frames so the crops
+rarely need tiling.
+"""
+import numpy as np
+import torch.utils.data as data
+
+
+class SpeakerBatchSampler(data.Sampler):
+    """
+    Batches of num_spks speakers x num_utts utterances for ScriptTrainDataset. One crop length
+    in [min_chunk_size, max_chunk_size) is drawn for each batch, and utterances at least as long
+    as the crop are preferred. Speakers without such utterances fall back to all of their
+    utterances, which are tiled by the dataset.
+    """
+
+    def __init__(self, dataset, num_spks, num_utts, min_chunk_size=300, max_chunk_size=400, num_batches=None,
+                 seed=None):
+        if num_spks > dataset.num_spks:
+            raise ValueError('%d speakers per batch while there are %d speakers.' % (num_spks, dataset.num_spks))
+
+        self.num_spks = num_spks
+        self.num_utts = num_utts
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.num_batches = len(dataset) // (num_spks * num_utts) if num_batches is None else num_batches
+        self.rng = np.random.RandomState(seed)
+
+        # utterances of each speaker sorted by length, keys are ordered by (speaker, frames)
+        spk_ptr = dataset.spk_ptr
+        spk_of_utt = np.repeat(np.arange(dataset.num_spks), np.diff(spk_ptr))
+        frames = dataset.index.num_frames[dataset.spk_utts].astype(np.int64)
+        order = np.lexsort((frames, spk_of_utt))
+
+        self.spk_ptr = spk_ptr
+        self.utts = dataset.spk_utts[order]
+        self.frames = frames[order]
+        self.key_base = int(frames.max(initial=0)) + 1
+        self.keys = spk_of_utt[order] * self.key_base + np.maximum(self.frames, 0)
+        self.total_spks = dataset.num_spks
+
+    def draw_speakers(self):
+        # distinct speakers in each batch, every speaker is drawn once per permutation
+        groups = self.total_spks // self.num_spks
+        num_perms = -(-self.num_batches // groups)
+        perms = np.argsort(self.rng.random_sample((num_perms, self.total_spks)), axis=1)
+        return perms[:, :groups * self.num_spks].reshape(-1, self.num_spks)[:self.num_batches]
+
+    def draw_epoch(self):
+        """
+        :return: int64 arrays (num_batches, num_spks * num_utts) of speakers, utterances, crop starts
+        and crop lengths
+        """
+        num_samples = self.num_spks * self.num_utts
+        lengths = self.rng.randint(self.min_chunk_size, self.max_chunk_size, size=self.num_batches)
+        spks = np.repeat(self.draw_speakers(), self.num_utts, axis=1)
+        lengths = np.repeat(lengths.reshape(-1, 1), num_samples, axis=1)
+
+        # the long enough utterances of a speaker are keys[long_start:spk_ptr[s + 1]]
+        long_start = np.searchsorted(self.keys, spks * self.key_base + lengths)
+        spk_start = self.spk_ptr[spks]
+        spk_stop = self.spk_ptr[spks + 1]
+        has_long = long_start < spk_stop
+        lo = np.where(has_long, long_start, spk_start)
+        pos = lo + (self.rng.random_sample(spks.shape) * (spk_stop - lo)).astype(np.int64)
+
+        utts = self.utts[pos].astype(np.int64)
+        frames = self.frames[pos]
+        starts = (self.rng.random_sample(spks.shape) * np.maximum(frames - lengths + 1, 1)).astype(np.int64)
+
+        return spks, utts, starts, lengths
+
+    def __iter__(self):
+        spks, utts, starts, lengths = self.draw_epoch()
+        for i in range(self.num_batches):
+            yield list(zip(spks[i].tolist(), utts[i].tolist(), starts[i].tolist(), lengths[i].tolist()))
+
+    def __len__(self):
+        return self.num_batches
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: cmvn.py
+@Time: 2026/10/19 4:10 PM
+@Overview: Sliding-window and global CMVN. The sliding window follows apply-cmvn-sliding of
+kaldi, with the window statistics taken from cumulative sums in O(T) for any window size. The
+same functions normalize numpy features at extraction, tensors in transforms.Compose and padded
+batches in the collate functions. Global statistics are computed once per data dir and cached in
+data_dir/cmvn_stats.npz.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+
+import numpy as np
+import torch
+
+from Process_Data.data_index import UttIndex
+from Process_Data.kaldi_ark import ArkWindowReader
+
+STATS_NAME = 'cmvn_stats.npz'
+
+
+def window_bounds(num_frames, window=600, center=False, min_window=100):
+    """
+    Windows of apply-cmvn-sliding in kaldi.
+    :return: int64 arrays of the first frame and the frame after the last frame of each window
+    """
+    t = np.arange(num_frames)
+    if center:
+        start = t - window // 2
+        # windows at the beginning are shifted into the utterance
+        end = start + window - np.minimum(start, 0)
+    else:
+        start = t - window
+        end = np.maximum(t + 1, min_window)
+    start = np.maximum(start, 0)
+
+    over = np.maximum(end - num_frames, 0)
+    start = np.maximum(start - over, 0)
+    end = end - over
+    return start, end
+
+
+def sliding_cmvn(feats, window=600, center=False, min_window=100, norm_vars=False, dim=-2):
+    """
+    Sliding-window CMVN along the time dim of numpy features, a tensor or a batch of tensors.
+    :param feats: numpy array or tensor, frames along dim
+    :return: normalized features of the same type and dtype
+    """
+    is_numpy = isinstance(feats, np.ndarray)
+    x = torch.from_numpy(feats) if is_numpy else feats
+    dim = dim % x.dim()
+    num_frames = x.shape[dim]
+    if num_frames == 0:
+        return feats
+
+    start, end = window_bounds(num_frames, window=window, center=center, min_window=min_window)
+    start = torch.from_numpy(start)
+    end = torch.from_numpy(end)
+    count_shape = [1] * x.dim()
+    count_shape[dim] = num_frames
+    count = (end - start).to(torch.float64).reshape(count_shape)
+
+    # sums of the windows from the cumulative sums with a leading zero frame
+    x64 = x.to(torch.float64)
+    zero_shape = list(x.shape)
+    zero_shape[dim] = 1
+    zeros = torch.zeros(zero_shape, dtype=torch.float64)
+
+    cum = torch.cat([zeros, x64.cumsum(dim)], dim=dim)
+    mean = (cum.index_select(dim, end) - cum.index_select(dim, start)) / count
+    out = x64 - mean
+
+    if norm_vars:
+        cum_sq = torch.cat([zeros, x64.pow(2).cumsum(dim)], dim=dim)
+        var = (cum_sq.index_select(dim, end) - cum_sq.index_select(dim, start)) / count - mean.pow(2)
+        out = out / (var.clamp(min=0).sqrt() + 1e-12)
+
+    out = out.to(x.dtype)
+    return out.numpy() if is_numpy else out
+
+
+class SlidingCMVN(object):
+    """
+    Transform of sliding-window CMVN on features with frames along dim -2, as mvnormal.
+    """
+
+    def __init__(self, window=600, center=False, min_window=100, norm_vars=False, dim=-2):
+        self.window = window
+        self.center = center
+        self.min_window = min_window
+        self.norm_vars = norm_vars
+        self.dim = dim
+
+    def __call__(self, feats):
+        return sliding_cmvn(feats, window=self.window, center=self.center, min_window=self.min_window,
+                            norm_vars=self.norm_vars, dim=self.dim)
+
+
+def feats_scp_stat(data_dir):
+    stat = os.stat(os.path.join(data_dir, 'feats.scp'))
+    return np.array([stat.st_mtime, stat.st_size], dtype=np.float64)
+
+
+def compute_global_stats(data_dir, loader=None):
+    """
+    Accumulate the count, sum and square sum of all frames in feats.scp of data_dir.
+    :return: dict of numpy arrays
+    """
+    index = UttIndex.from_dir(data_dir)
+    reader = ArkWindowReader()
+    count = 0
+    sums = None
+    sums_sq = None
+    for i in range(len(index)):
+        feat_path = index.feat_path(i)
+        if loader is not None:
+            feat = loader(feat_path)
+        elif feat_path.endswith('.npy'):
+            feat = np.load(feat_path)
+        else:
+            feat = reader.read(feat_path)
+
+        feat = np.asarray(feat, dtype=np.float64).reshape(-1, feat.shape[-1])
+        if sums is None:
+            sums = np.zeros(feat.shape[1])
+            sums_sq = np.zeros(feat.shape[1])
+        count += len(feat)
+        sums += feat.sum(axis=0)
+        sums_sq += np.square(feat).sum(axis=0)
+
+    return {'count': np.array(count, dtype=np.int64), 'sum': sums, 'sum_sq': sums_sq,
+            'source': feats_scp_stat(data_dir)}
+
+
+def load_global_stats(data_dir, loader=None, rebuild=False):
+    """
+    Load the cached global statistics of data_dir, computing them if missing or stale.
+    :return: mean and std of all frames
+    """
+    stats_path = os.path.join(data_dir, STATS_NAME)
+    stats = None
+    if not rebuild and os.path.exists(stats_path):
+        try:
+            with np.load(stats_path, allow_pickle=False) as npz:
+                stats = {k: npz[k] for k in npz.files}
+            if not np.array_equal(stats['source'], feats_scp_stat(data_dir)):
+                stats = None
+        except (IOError, ValueError, KeyError):
+            stats = None
+
+    if stats is None:
+        stats = compute_global_stats(data_dir, loader=loader)
+        try:
+            tmp_path = stats_path + '.%d.tmp' % os.getpid()
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **stats)
+            os.replace(tmp_path, stats_path)
+        except (IOError, OSError):
+            print('Can not write cmvn stats to %s.' % stats_path)
+
+    count = max(int(stats['count']), 1)
+    mean = stats['sum'] / count
+    std = np.sqrt(np.maximum(stats['sum_sq'] / count - np.square(mean), 0))
+    return mean, std
+
+
+class GlobalCMVN(object):
+    """
+    Transform of CMVN with the statistics of all frames in a data dir, for numpy features,
+    tensors or batches with feature dim last.
+    """
+
+    def __init__(self, data_dir, norm_vars=True, loader=None, rebuild=False):
+        mean, std = load_global_stats(data_dir, loader=loader, rebuild=rebuild)
+        self.mean = mean.astype(np.float32)
+        self.scale = (1.0 / (std + 1e-12)).astype(np.float32) if norm_vars else np.ones_like(self.mean)
+        self.mean_tensor = torch.from_numpy(self.mean)
+        self.scale_tensor = torch.from_numpy(self.scale)
+
+    def __call__(self, feats):
+        if isinstance(feats, np.ndarray):
+            return ((feats - self.mean) * self.scale).astype(feats.dtype)
+        return ((feats - self.mean_tensor) * self.scale_tensor).to(feats.dtype)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute global cmvn statistics of kaldi data dirs')
+    parser.add_argument('data_dirs', type=str, nargs='+', help='data dirs with feats.scp')
+    parser.add_argument('--rebuild', action='store_true', default=False)
+    args = parser.parse_args()
+
+    for data_dir in args.data_dirs:
+        mean, std = load_global_stats(data_dir, loader=None, rebuild=args.rebuild)
+        print('%s: %d dims, mean of means %.4f, mean of stds %.4f.' % (data_dir, len(mean), mean.mean(),
+                                                                        std.mean()))
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: data_index.py
+@Time: 2026/10/18 4:30 PM
+@Overview: Binary index of kaldi data dirs. feats.scp, spk2utt, utt2spk, utt2num_frames, utt2dom
+and trials are parsed in one pass into integer arrays and cached in data_dir/data_index.npz. The
+cache is rebuilt when the mtime or size of any source file changes.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+
+import numpy as np
+
+from Process_Data.kaldi_ark import split_feat_path
+
+INDEX_VERSION = 2
+INDEX_NAME = 'data_index.npz'
+SOURCE_FILES = ['feats.scp', 'spk2utt', 'utt2spk', 'utt2num_frames', 'utt2dom', 'trials']
+
+
+def encode_names(names):
+    if len(names) == 0:
+        return np.array([], dtype='S1')
+    return np.array([n.encode('utf-8') for n in names])
+
+
+def decode_names(names):
+    return [n.decode('utf-8') for n in names.tolist()]
+
+
+def source_stats(data_dir):
+    """
+    :return: names, mtimes and sizes of the source files, -1 for missing files
+    """
+    names = []
+    mtimes = []
+    sizes = []
+    for name in SOURCE_FILES:
+        path = os.path.join(data_dir, name)
+        names.append(name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            mtimes.append(stat.st_mtime)
+            sizes.append(stat.st_size)
+        else:
+            mtimes.append(-1.)
+            sizes.append(-1)
+
+    return encode_names(names), np.array(mtimes, dtype=np.float64), np.array(sizes, dtype=np.int64)
+
+
+def build_data_index(data_dir):
+    """
+    Parse the kaldi data dir.
+    :param data_dir: dir with feats.scp and optional spk2utt, utt2spk, utt2num_frames, utt2dom, trials
+    :return: dict of numpy arrays
+    """
+    feat_scp = os.path.join(data_dir, 'feats.scp')
+    if not os.path.exists(feat_scp):
+        raise FileExistsError(feat_scp)
+
+    sources, mtimes, sizes = source_stats(data_dir)
+
+    utts = []
+    ark_to_idx = {}
+    utt_ark = []
+    utt_offset = []
+    with open(feat_scp, 'r') as f:
+        for line in f:
+            uid_path = line.split()
+            if len(uid_path) < 2:
+                continue
+            # entries without offset (npy files, pipes) are kept whole with offset -1
+            ark, offset = split_feat_path(uid_path[1]) or (uid_path[1], -1)
+            if ark not in ark_to_idx:
+                ark_to_idx[ark] = len(ark_to_idx)
+            utts.append(uid_path[0])
+            utt_ark.append(ark_to_idx[ark])
+            utt_offset.append(offset)
+
+    utt_to_idx = {utts[i]: i for i in range(len(utts))}
+    num_utts = len(utts)
+
+    def read_utt_column(name):
+        # uid -> the last column
+        path = os.path.join(data_dir, name)
+        column = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    utt_value = line.split()
+                    if len(utt_value) > 1 and utt_value[0] in utt_to_idx:
+                        column[utt_to_idx[utt_value[0]]] = utt_value[-1]
+        return column
+
+    spk2utt = os.path.join(data_dir, 'spk2utt')
+    spk_lst = {}
+    if os.path.exists(spk2utt):
+        with open(spk2utt, 'r') as f:
+            for line in f:
+                spk_utt = line.split()
+                if len(spk_utt) > 0 and spk_utt[0] not in spk_lst:
+                    spk_lst[spk_utt[0]] = [utt_to_idx[u] for u in spk_utt[1:] if u in utt_to_idx]
+
+    utt2spk = read_utt_column('utt2spk')
+    if len(spk_lst) == 0:
+        for i in sorted(utt2spk.keys()):
+            spk_lst.setdefault(utt2spk[i], []).append(i)
+
+    speakers = sorted(spk_lst.keys())
+    spk_ptr = np.zeros(len(speakers) + 1, dtype=np.int64)
+    spk_ptr[1:] = np.cumsum([len(spk_lst[s]) for s in speakers])
+    spk_utts = np.array([i for s in speakers for i in spk_lst[s]], dtype=np.int32)
+
+    # from the CSR, which holds spk2utt or else utt2spk
+    utt_spk = np.full(num_utts, -1, dtype=np.int32)
+    utt_spk[spk_utts] = np.repeat(np.arange(len(speakers), dtype=np.int32), np.diff(spk_ptr))
+
+    num_frames = np.full(num_utts, -1, dtype=np.int32)
+    for i, n in read_utt_column('utt2num_frames').items():
+        num_frames[i] = int(n)
+
+    utt2dom = read_utt_column('utt2dom')
+    domains = sorted(set(utt2dom.values()))
+    dom_to_idx = {domains[i]: i for i in range(len(domains))}
+    utt_dom = np.full(num_utts, -1, dtype=np.int32)
+    for i, dom in utt2dom.items():
+        utt_dom[i] = dom_to_idx[dom]
+
+    trial_a = []
+    trial_b = []
+    trial_label = []
+    trials = os.path.join(data_dir, 'trials')
+    if os.path.exists(trials):
+        with open(trials, 'r') as f:
+            for line in f:
+                pair = line.split()
+                if len(pair) < 3:
+                    continue
+                trial_a.append(utt_to_idx.get(pair[0], -1))
+                trial_b.append(utt_to_idx.get(pair[1], -1))
+                trial_label.append(not (pair[2] == 'nontarget' or pair[2] == '0'))
+
+    arks = [None] * len(ark_to_idx)
+    for ark, i in ark_to_idx.items():
+        arks[i] = ark
+
+    return {'version': np.array(INDEX_VERSION),
+            'sources': sources, 'mtimes': mtimes, 'sizes': sizes,
+            'utts': encode_names(utts),
+            'arks': encode_names(arks),
+            'utt_ark': np.array(utt_ark, dtype=np.int32),
+            'utt_offset': np.array(utt_offset, dtype=np.int64),
+            'num_frames': num_frames,
+            'speakers': encode_names(speakers),
+            'utt_spk': utt_spk,
+            'spk_ptr': spk_ptr,
+            'spk_utts': spk_utts,
+            'domains': encode_names(domains),
+            'utt_dom': utt_dom,
+            'trial_a': np.array(trial_a, dtype=np.int32),
+            'trial_b': np.array(trial_b, dtype=np.int32),
+            'trial_label': np.array(trial_label, dtype=bool)}
+
+
+def is_valid_index(index, data_dir):
+    if int(index['version']) != INDEX_VERSION:
+        return False
+    sources, mtimes, sizes = source_stats(data_dir)
+    return np.array_equal(index['sources'], sources) and np.array_equal(index['mtimes'], mtimes) and \
+           np.array_equal(index['sizes'], sizes)
+
+
+def load_data_index(data_dir, rebuild=False):
+    """
+    Load the cached index of data_dir, building it if it is missing or stale.
+    :return: dict of numpy arrays
+    """
+    index_path = os.path.join(data_dir, INDEX_NAME)
+    if not rebuild and os.path.exists(index_path):
+        try:
+            with np.load(index_path, allow_pickle=False) as npz:
+                index = {k: npz[k] for k in npz.files}
+            if is_valid_index(index, data_dir):
+                return index
+        except (IOError, ValueError, KeyError):
+            pass
+
+    index = build_data_index(data_dir)
+    try:
+        tmp_path = index_path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **index)
+        os.replace(tmp_path, index_path)
+    except (IOError, OSError):
+        # read-only data dir, use the index without caching
+        print('Can not write index cache to %s.' % index_path)
+
+    return index
+
+
+def filter_csr(ptr, items, keep):
+    """
+    Remove items from a CSR table (rows items[ptr[i]:ptr[i+1]]).
+    :param keep: boolean mask over the values of items
+    :return: new ptr and items
+    """
+    mask = keep[items]
+    new_ptr = np.concatenate(([0], np.cumsum(mask))).astype(np.int64)[ptr]
+    return new_ptr, items[mask]
+
+
+class UttIndex(object):
+    """
+    Array-backed utterance table of a data dir. Utterance ids are interned in one fixed-width bytes
+    array, speakers hold their utterances in a CSR layout (spk_ptr, spk_utts) and the features are
+    located by (ark id, offset) columns. Only a few numpy objects are shared by the DataLoader
+    workers, so forked workers do not copy the table by refcount updates.
+    """
+
+    def __init__(self, index):
+        self.utts = index['utts']
+        self.arks = index['arks']
+        self.utt_ark = index['utt_ark']
+        self.utt_offset = index['utt_offset']
+        self.num_frames = index['num_frames']
+
+        self.speakers = index['speakers']
+        self.utt_spk = index['utt_spk']
+        self.spk_ptr = index['spk_ptr']
+        self.spk_utts = index['spk_utts']
+
+        self.domains = index['domains']
+        self.utt_dom = index['utt_dom']
+
+        self.trial_a = index['trial_a']
+        self.trial_b = index['trial_b']
+        self.trial_label = index['trial_label']
+        self.utt_order = None
+
+    @classmethod
+    def from_dir(cls, data_dir, rebuild=False):
+        return cls(load_data_index(data_dir, rebuild=rebuild))
+
+    def __len__(self):
+        return len(self.utts)
+
+    def uid(self, i):
+        return self.utts[i].decode('utf-8')
+
+    def feat_path(self, i):
+        ark = self.arks[self.utt_ark[i]].decode('utf-8')
+        offset = self.utt_offset[i]
+        return ark if offset < 0 else '%s:%d' % (ark, offset)
+
+    def speaker_utts(self, s):
+        return self.spk_utts[self.spk_ptr[s]:self.spk_ptr[s + 1]]
+
+    def trials(self):
+        """
+        :return: int32 array of (utt a, utt b, label) with positive pairs first, number of positive
+        pairs and number of pairs dropped because their utterances are not in feats.scp
+        """
+        keep = (self.trial_a >= 0) & (self.trial_b >= 0)
+        order = np.argsort(~self.trial_label[keep], kind='stable')
+
+        trials_pair = np.stack([self.trial_a[keep][order],
+                                self.trial_b[keep][order],
+                                self.trial_label[keep][order].astype(np.int32)], axis=1)
+
+        return trials_pair, int(np.sum(trials_pair[:, 2])), int(np.sum(~keep))
+
+    def lookup(self, uid):
+        """
+        :return: index of the utterance, -1 if it is not in the table
+        """
+        if self.utt_order is None:
+            self.utt_order = np.argsort(self.utts, kind='stable')
+        key = uid.encode('utf-8')
+        if len(key) > self.utts.dtype.itemsize:
+            return -1
+        key = np.array(key, dtype=self.utts.dtype)
+        i = np.searchsorted(self.utts, key, sorter=self.utt_order)
+        if i < len(self.utts) and self.utts[self.utt_order[i]] == key:
+            return int(self.utt_order[i])
+        return -1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the cached index of kaldi data dirs!')
+    parser.add_argument('data_dirs', type=str, nargs='+', help='kaldi data dirs')
+    args = parser.parse_args()
+
+    for d in args.data_dirs:
+        idx = load_data_index(d, rebuild=True)
+        print('%s: %d utterances, %d speakers, %d trials.' % (d, len(idx['utts']), len(idx['speakers']),
+                                                              len(idx['trial_a'])))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: feat_arena.py
+@Time: 2026/10/18 8:40 PM
+@Overview: Shared memory feature arena for the datasets holding all features in RAM. The matrices
+of feats.scp are copied once in the parent process into one shared torch tensor with an offset
+table. The DataLoader workers slice read-only numpy views from it without copying.
+"""
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from Process_Data.kaldi_ark import ArkWindowReader
+
+
+class FeatArena(object):
+    """
+    All features of a feats.scp in one (num_frames, feat_dim) shared memory tensor.
+    """
+
+    def __init__(self, feat_scp, reader=None, dtype=torch.float32):
+        reader = ArkWindowReader() if reader is None else reader
+
+        uid_feats = []
+        with open(feat_scp, 'r') as f:
+            for line in f.readlines():
+                uid_feat = line.split()
+                if len(uid_feat) == 2:
+                    uid_feats.append(uid_feat)
+
+        # headers first, then the arena is filled in place
+        num_frames = np.array([reader.num_frames(p) for _, p in uid_feats], dtype=np.int64)
+        offsets = np.zeros(len(uid_feats) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(num_frames)
+        feat_dim = reader.read(uid_feats[0][1], 0, 1).shape[1] if len(uid_feats) > 0 else 0
+
+        self.data = torch.zeros(int(offsets[-1]), feat_dim, dtype=dtype).share_memory_()
+        self.offsets = offsets
+        self.uids = [uid for uid, _ in uid_feats]
+        self.feat_dim = feat_dim
+        self.array = self.data.numpy()
+
+        for i, (uid, feat_path) in enumerate(tqdm(uid_feats, ncols=50)):
+            self.array[offsets[i]:offsets[i + 1]] = reader.read(feat_path)
+
+        print('    Load {} utterances into shared memory ({:.2f} GB).'.format(
+            len(self.uids), self.data.numel() * self.data.element_size() / 1024 ** 3))
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __getitem__(self, i):
+        """
+        :return: read-only view of the features of utterance i, in-place transforms would change
+        the arena for all workers and epochs
+        """
+        feat = self.array[self.offsets[i]:self.offsets[i + 1]]
+        feat.flags.writeable = False
+        return feat
+
+    def items(self):
+        for i in range(len(self.uids)):
+            yield self.uids[i], self[i]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the tensor is sent by its shared memory handle, the numpy view is rebuilt from it
+        state['array'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.array = self.data.numpy()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: feat_shards.py
+@Time: 2026/10/18 9:30 PM
+@Overview: Sequential sharded features. A kaldi data dir is converted into fixed-size shards
+(shard-xxxxxx.npz) holding the frames, offsets, speaker labels and ids of the utterances, so
+training reads whole shards sequentially instead of seeking into ark files. ShardedTrainDataset
+streams the shards with shard-level shuffling, a shuffle buffer and per worker/rank assignment.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+
+import numpy as np
+import torch.distributed as dist
+import torch.utils.data as data
+
+import Process_Data.constants as c
+from Process_Data.data_index import UttIndex, decode_names
+from Process_Data.kaldi_ark import ArkWindowReader
+
+SHARD_INFO = 'shards.json'
+
+
+def write_shards(data_dir, out_dir, utts_per_shard=2000, dtype='float32', loader=None, min_frames=50, seed=123456):
+    """
+    Convert data_dir into shards. Utterances are shuffled before sharding, so every shard holds
+    a mixture of speakers.
+    :param data_dir: kaldi data dir with feats.scp and spk2utt or utt2spk
+    :param out_dir: dir for shards.json and shard-xxxxxx.npz
+    :param utts_per_shard: number of utterances in each shard
+    :param loader: loader for the entries in feats.scp, ArkWindowReader by default
+    :param min_frames: utterances shorter than min_frames are removed as in ScriptTrainDataset
+    :return: number of shards
+    """
+    loader = ArkWindowReader() if loader is None else loader
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    index = UttIndex.from_dir(data_dir)
+    utts = np.where(index.utt_spk >= 0)[0]
+    if len(utts) == 0:
+        raise ValueError('No utterance in %s has a speaker in spk2utt or utt2spk.' % data_dir)
+    np.random.RandomState(seed).shuffle(utts)
+
+    dtype = np.dtype(dtype)
+    shards = []
+    num_utts = 0
+    removed = 0
+    feat_dim = None
+    for s in range(0, len(utts), utts_per_shard):
+        feats = []
+        kept = []
+        for i in utts[s:s + utts_per_shard]:
+            feat = np.asarray(loader(index.feat_path(i)), dtype=dtype)
+            if len(feat) < min_frames:
+                removed += 1
+                continue
+            feat_dim = feat.shape[1] if feat_dim is None else feat_dim
+            feats.append(feat)
+            kept.append(i)
+
+        if len(kept) == 0:
+            continue
+        kept = np.array(kept)
+        offsets = np.zeros(len(feats) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(f) for f in feats])
+
+        shard = 'shard-%06d.npz' % len(shards)
+        np.savez(os.path.join(out_dir, shard), feats=np.concatenate(feats, axis=0), offsets=offsets,
+                 labels=index.utt_spk[kept].astype(np.int32), utts=index.utts[kept])
+        shards.append(shard)
+        num_utts += len(kept)
+        print('    Write %s with %d utterances.' % (shard, len(kept)))
+
+    with open(os.path.join(out_dir, SHARD_INFO), 'w') as f:
+        json.dump({'shards': shards, 'num_utts': num_utts, 'feat_dim': feat_dim, 'dtype': dtype.name,
+                   'speakers': decode_names(index.speakers)}, f)
+
+    print('Wrote %d utterances into %d shards, where %d utterances are removed.' % (num_utts, len(shards), removed))
+    return len(shards)
+
+
+class ShardedTrainDataset(data.IterableDataset):
+    """
+    Stream (feature, label) samples of ScriptTrainDataset from the shards of write_shards. Each
+    sample is c.N_SAMPLES frames from a random start of an utterance, short utterances are repeated.
+    Shards are split over ranks and DataLoader workers, call set_epoch before every epoch to
+    reshuffle them. Every rank yields num_utts // world_size samples, the ranks with more
+    utterances in their shards drop the last ones and the others repeat their first ones, so
+    all ranks run the same number of steps under DistributedDataParallel.
+    """
+
+    def __init__(self, shard_dir, transform, buffer_size=2000, shuffle=True, rank=None, world_size=None,
+                 seed=123456):
+        with open(os.path.join(shard_dir, SHARD_INFO), 'r') as f:
+            info = json.load(f)
+
+        self.shard_dir = shard_dir
+        self.shards = info['shards']
+        self.num_utts = info['num_utts']
+
+        self.feat_dim = info['feat_dim']
+        self.speakers = info['speakers']
+        self.spk_to_idx = {self.speakers[i]: i for i in range(len(self.speakers))}
+        self.num_spks = len(self.speakers)
+
+        if rank is None or world_size is None:
+            distributed = dist.is_available() and dist.is_initialized()
+            rank = dist.get_rank() if distributed else 0
+            world_size = dist.get_world_size() if distributed else 1
+        if len(self.shards) < world_size:
+            raise ValueError('%d shards can not be split over %d ranks.' % (len(self.shards), world_size))
+
+        self.rank = rank
+        self.world_size = world_size
+        self.transform = transform
+        self.buffer_size = buffer_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+        print('==> There are {} speakers and {} utterances in {} shards.'.format(self.num_spks, self.num_utts,
+                                                                               len(self.shards)))
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def assigned_shards(self):
+        """
+        :return: shards of this rank and worker, and the number of samples the worker yields
+        """
+        shards = list(self.shards)
+        if self.shuffle:
+            # the same permutation on all ranks
+            np.random.RandomState(self.seed + self.epoch).shuffle(shards)
+
+        worker_info = data.get_worker_info()
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        if num_workers * self.world_size > len(shards):
+            raise ValueError('%d shards can not be split over %d ranks with %d workers.' % (
+                len(shards), self.world_size, num_workers))
+
+        # samples of the rank are split evenly over its workers
+        num_samples = len(self)
+        num_samples = num_samples // num_workers + int(worker_id < num_samples % num_workers)
+
+        shards = shards[self.rank::self.world_size]
+        return shards[worker_id::num_workers], num_samples
+
+    def crop(self, feat, rng):
+        # same length as the samples of ScriptTrainDataset, from a random start
+        if len(feat) <= c.N_SAMPLES:
+            return feat[np.arange(c.N_SAMPLES) % len(feat)]
+        start = rng.randint(len(feat) - c.N_SAMPLES + 1)
+        return feat[start:start + c.N_SAMPLES]
+
+    def samples(self, shards, num_samples):
+        """
+        Yield num_samples (feature, label) of the shards, the shards are read again from the first
+        one if they hold fewer utterances.
+        """
+        count = 0
+        while count < num_samples:
+            for shard in shards:
+                with np.load(os.path.join(self.shard_dir, shard)) as npz:
+                    feats, offsets, labels = npz['feats'], npz['offsets'], npz['labels']
+                for i in range(len(labels)):
+                    if count >= num_samples:
+                        return
+                    count += 1
+                    yield feats[offsets[i]:offsets[i + 1]], int(labels[i])
+
+    def __iter__(self):
+        worker_info = data.get_worker_info()
+        worker_id = 0 if worker_info is None else worker_info.id
+        rng = np.random.RandomState(self.seed + self.epoch * 1000 + self.rank * 100 + worker_id)
+
+        buffer = []
+        shards, num_samples = self.assigned_shards()
+        for feat, label in self.samples(shards, num_samples):
+            if not self.shuffle:
+                yield self.transform(self.crop(feat, rng)), label
+                continue
+
+            if len(buffer) < self.buffer_size:
+                buffer.append((feat, label))
+                continue
+            # replace a random sample of the full buffer
+            j = rng.randint(len(buffer))
+            buffer[j], (feat, label) = (feat, label), buffer[j]
+            yield self.transform(self.crop(feat, rng)), label
+
+        rng.shuffle(buffer)
+        for feat, label in buffer:
+            yield self.transform(self.crop(feat, rng)), label
+
+    def __len__(self):
+        # number of samples of each rank
+        return self.num_utts // self.world_size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert kaldi data dir into sequential feature shards!')
+    parser.add_argument('--data-dir', type=str, required=True,
+                        help='kaldi data dir with feats.scp and utt2spk')
+    parser.add_argument('--out-dir', type=str, required=True,
+                        help='the dir of shards')
+    parser.add_argument('--utts-per-shard', type=int, default=2000,
+                        help='number of utterances in each shard')
+    parser.add_argument('--dtype', type=str, default='float32', choices=['float32', 'float16'],
+                        help='data type of the features in shards')
+    parser.add_argument('--feat-format', type=str, default='kaldi', choices=['kaldi', 'npy'],
+                        help='format of the features in feats.scp')
+    args = parser.parse_args()
+
+    write_shards(args.data_dir, args.out_dir, utts_per_shard=args.utts_per_shard, dtype=args.dtype,
+                 loader=ArkWindowReader() if args.feat_format == 'kaldi' else np.load)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: kaldi_ark.py
+@Time: 2026/10/18 2:05 PM
+@Overview: Partial reads of kaldi ark matrices. The matrix header is parsed once and only the
+requested frames are read from disk with os.pread, for float (FM/DM) and compressed (CM/CM2/CM3)
+matrices. Compressed matrices are also written natively as `copy-feats --compress=true`.
+Reference: https://github.com/kaldi-asr/kaldi/blob/master/src/matrix/compressed-matrix.h
+"""
+import os
+import struct
+from collections import namedtuple
+
+import kaldi_io
+import numpy as np
+
+MatHeader = namedtuple('MatHeader', ['token', 'rows', 'cols', 'data_offset', 'min_value', 'range', 'col_headers'])
+
+# token -> (bytes of the token, dtype of the data)
+MAT_TOKENS = {b'FM ': (3, np.float32),
+              b'DM ': (3, np.float64),
+              b'CM ': (3, np.uint8),
+              b'CM2': (4, np.uint16),
+              b'CM3': (4, np.uint8)}
+
+# a 'CM ' window shorter than rows / CM_SPAN_FRACTION is read column by column
+CM_SPAN_FRACTION = 2
+
+
+def split_feat_path(feat_path):
+    """
+    '/path/feats.1.ark:1234' -> ('/path/feats.1.ark', 1234). Return None for pipes, ranges and
+    files without offset.
+    """
+    if feat_path.endswith('|') or feat_path.endswith(']') or ':' not in feat_path:
+        return None
+    ark, offset = feat_path.rsplit(':', 1)
+    if not offset.isdigit():
+        return None
+    return ark, int(offset)
+
+
+# CompressionMethod of kaldi -> (token, min_value, range), None for the range of the matrix
+COMPRESSION_METHODS = {'speech_feature': (b'CM ', None, None),
+                       'two_byte_auto': (b'CM2', None, None),
+                       'two_byte_signed_integer': (b'CM2', -32768.0, 65535.0),
+                       'one_byte_auto': (b'CM3', None, None),
+                       'one_byte_unsigned_integer': (b'CM3', 0.0, 255.0),
+                       'one_byte_zero_one': (b'CM3', 0.0, 1.0)}
+
+
+def uint16_to_float(value, min_value, value_range):
+    return np.float32(min_value) + np.float32(value_range) * np.float32(1.0 / 65535.0) * value.astype(np.float32)
+
+
+def float_to_uint(mat, min_value, value_range, max_int):
+    # (value - min) / range clipped to [0, 1], then rounded as kaldi
+    f = np.clip((mat - np.float32(min_value)) / np.float32(value_range), 0., 1.).astype(np.float32)
+    return ((f * np.float32(max_int)).astype(np.float64) + 0.499).astype(np.int64)
+
+
+def col_lookup_table(col_headers, min_value, value_range):
+    """
+    Build the (cols, 256) table mapping uint8 values of 'CM ' matrices to floats.
+    :param col_headers: uint16 percentiles (cols, 4): 0, 25, 75, 100
+    :return: float32 table
+    """
+    p = uint16_to_float(col_headers, min_value, value_range)
+    p0, p25, p75, p100 = [p[:, i:i + 1] for i in range(4)]
+    v = np.arange(256, dtype=np.float32).reshape(1, -1)
+
+    table = np.where(v <= 64, p0 + (p25 - p0) * v * (1 / 64.0),
+                     np.where(v <= 192, p25 + (p75 - p25) * (v - 64) * (1 / 128.0),
+                              p75 + (p100 - p75) * (v - 192) * (1 / 63.0)))
+    return table.astype(np.float32)
+
+
+class ArkWindowReader(object):
+    """
+    Loader for 'ark:offset' entries of feats.scp, reading only the frame range [start, stop).
+    File descriptors are kept open per ark file and read with os.pread, which is safe in forked
+    DataLoader workers.
+    """
+
+    def __init__(self):
+        self.fds = {}
+
+    def get_fd(self, ark):
+        if ark not in self.fds:
+            fd = os.open(ark, os.O_RDONLY)
+            # another reader thread may have opened the ark meanwhile
+            if self.fds.setdefault(ark, fd) != fd:
+                os.close(fd)
+        return self.fds[ark]
+
+    def header(self, feat_path):
+        ark_offset = split_feat_path(feat_path)
+        if ark_offset is None:
+            return None
+
+        fd = self.get_fd(ark_offset[0])
+        offset = ark_offset[1]
+        buf = os.pread(fd, 32, offset)
+        if buf[:2] != b'\0B' or buf[2:5] not in MAT_TOKENS:
+            return None
+
+        token = buf[2:5]
+        token_len = MAT_TOKENS[token][0]
+        head = offset + 2 + token_len
+        if token in (b'FM ', b'DM '):
+            # '\4' rows '\4' cols
+            rows, cols = struct.unpack('<xixi', buf[2 + token_len:2 + token_len + 10])
+            return MatHeader(token, rows, cols, head + 10, None, None, None)
+
+        min_value, value_range, rows, cols = struct.unpack('<ffii', buf[2 + token_len:2 + token_len + 16])
+        head += 16
+        col_headers = None
+        if token == b'CM ':
+            col_headers = np.frombuffer(os.pread(fd, cols * 8, head), dtype=np.uint16).reshape(cols, 4)
+            head += cols * 8
+
+        return MatHeader(token, rows, cols, head, min_value, value_range, col_headers)
+
+    def num_frames(self, feat_path):
+        header = self.header(feat_path)
+        if header is None:
+            return len(kaldi_io.read_mat(feat_path))
+        return header.rows
+
+    def read(self, feat_path, start=0, stop=None):
+        """
+        :param feat_path: 'ark:offset' of the matrix
+        :param start: first frame
+        :param stop: frame after the last frame, None for the end of the matrix
+        :return: float matrix with shape (stop - start, cols)
+        """
+        header = self.header(feat_path)
+        if header is None:
+            return kaldi_io.read_mat(feat_path)[start:stop]
+
+        rows, cols = header.rows, header.cols
+        stop = rows if stop is None else min(stop, rows)
+        start = min(max(start, 0), stop)
+        length = stop - start
+        fd = self.get_fd(split_feat_path(feat_path)[0])
+        dtype = np.dtype(MAT_TOKENS[header.token][1])
+
+        if header.token == b'CM ':
+            # stored column by column. A short window is read by one pread per column, a window
+            # covering most of the matrix by one pread from its first to its last byte
+            if length * CM_SPAN_FRACTION < rows:
+                data = np.empty((cols, length), dtype=np.uint8)
+                for col in range(cols):
+                    data[col] = np.frombuffer(os.pread(fd, length, header.data_offset + col * rows + start),
+                                              dtype=np.uint8)
+            else:
+                span = (cols - 1) * rows + length
+                data = np.frombuffer(os.pread(fd, span, header.data_offset + start), dtype=np.uint8)
+                data = np.lib.stride_tricks.as_strided(data, shape=(cols, length), strides=(rows, 1))
+            table = col_lookup_table(header.col_headers, header.min_value, header.range)
+            return table[np.arange(cols).reshape(-1, 1), data].T
+
+        row_bytes = cols * dtype.itemsize
+        buf = os.pread(fd, length * row_bytes, header.data_offset + start * row_bytes)
+        data = np.frombuffer(buf, dtype=dtype).reshape(length, cols)
+
+        if header.token == b'CM2':
+            increment = np.float32(header.range) * np.float32(1.0 / 65535.0)
+            return np.float32(header.min_value) + increment * data.astype(np.float32)
+        elif header.token == b'CM3':
+            increment = np.float32(header.range) * np.float32(1.0 / 255.0)
+            return np.float32(header.min_value) + increment * data.astype(np.float32)
+
+        return data
+
+    def __call__(self, feat_path):
+        return self.read(feat_path)
+
+    def __getstate__(self):
+        # descriptors are reopened in the workers
+        return {'fds': {}}
+
+    def __del__(self):
+        for fd in self.fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def col_headers_of(mat, min_value, value_range):
+    """
+    Percentiles 0, 25, 75 and 100 of each column as ComputeColHeader of kaldi.
+    :return: uint16 (cols, 4)
+    """
+    rows = len(mat)
+    if rows >= 5:
+        quarter = rows // 4
+        sdata = np.partition(mat, [quarter, 3 * quarter], axis=0)
+        values = [mat.min(axis=0), sdata[quarter], sdata[3 * quarter], mat.max(axis=0)]
+    else:
+        # pathological case of short matrices
+        sdata = np.sort(mat, axis=0)
+        values = [sdata[i] if i < rows else None for i in range(4)]
+
+    p = [None] * 4
+    p[0] = np.minimum(float_to_uint(values[0], min_value, value_range, 65535), 65532)
+    for i, max_p in zip([1, 2, 3], [65533, 65534, 65535]):
+        if values[i] is None:
+            p[i] = p[i - 1] + 1
+        else:
+            p[i] = np.minimum(np.maximum(float_to_uint(values[i], min_value, value_range, 65535), p[i - 1] + 1),
+                              max_p)
+    return np.stack(p, axis=1).astype(np.uint16)
+
+
+def float_to_char(mat, p0, p25, p75, p100):
+    """
+    Map the values of each column to uint8 by the piecewise linear quantization of the percentiles.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = np.clip(((mat - p0) / (p25 - p0) * np.float32(64)).astype(np.float64) + 0.5, -1, 65).astype(np.int64)
+        mid = 64 + np.clip(((mat - p25) / (p75 - p25) * np.float32(128)).astype(np.float64) + 0.5, -1,
+                           129).astype(np.int64)
+        high = 192 + np.clip(((mat - p75) / (p100 - p75) * np.float32(63)).astype(np.float64) + 0.5, -1,
+                             64).astype(np.int64)
+
+    ans = np.where(mat < p25, np.clip(low, 0, 64), np.where(mat < p75, np.clip(mid, 64, 192),
+                                                            np.clip(high, 192, 255)))
+    return ans.astype(np.uint8)
+
+
+def compress_mat(mat, method='auto'):
+    """
+    Kaldi CompressedMatrix of a float matrix.
+    :param method: 'auto' for speech_feature with more than 8 rows and two_byte_auto otherwise,
+    or one of COMPRESSION_METHODS
+    :return: bytes of the matrix in a binary ark, from '\\0B' on
+    """
+    mat = np.asarray(mat, dtype=np.float32)
+    assert mat.ndim == 2, 'Only matrices are compressed.'
+    rows, cols = mat.shape
+    if method == 'auto':
+        method = 'speech_feature' if rows > 8 else 'two_byte_auto'
+    if method not in COMPRESSION_METHODS:
+        raise ValueError('Unknown compression method %s.' % method)
+
+    token, min_value, value_range = COMPRESSION_METHODS[method]
+    if rows * cols == 0:
+        return b'\0B' + token.strip() + b' ' + struct.pack('<ffii', 0., 0., 0, 0)
+
+    if min_value is None:
+        min_value = mat.min()
+        max_value = mat.max()
+        if max_value == min_value:
+            max_value = min_value + np.float32(1.0 + abs(min_value))
+        value_range = np.float32(max_value - min_value)
+        assert value_range > 0
+
+    head = b'\0B' + token.strip() + b' ' + struct.pack('<ffii', min_value, value_range, rows, cols)
+    if token == b'CM2':
+        return head + float_to_uint(mat, min_value, value_range, 65535).astype('<u2').tobytes()
+    elif token == b'CM3':
+        return head + float_to_uint(mat, min_value, value_range, 255).astype(np.uint8).tobytes()
+
+    col_headers = col_headers_of(mat, min_value, value_range)
+    p0, p25, p75, p100 = [uint16_to_float(col_headers[:, i], min_value, value_range) for i in range(4)]
+    # stored column by column
+    data = float_to_char(mat, p0, p25, p75, p100).T
+    return head + col_headers.astype('<u2').tobytes() + np.ascontiguousarray(data).tobytes()
+
+
+def write_compressed_mat(file_or_fd, m, key='', method='auto'):
+    """
+    Write a compressed matrix to a binary ark, as kaldi_io.write_mat for float matrices.
+    :return: offset of the matrix in the file, for 'ark:offset' of feats.scp
+    """
+    if key != '':
+        file_or_fd.write((key + ' ').encode('latin1'))
+    offset = file_or_fd.tell()
+    file_or_fd.write(compress_mat(m, method=method))
+    return offset
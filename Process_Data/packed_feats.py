@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: packed_feats.py
+@Time: 2026/10/18 10:12 AM
+@Overview: Packed feature store. All matrices of a kaldi data dir are copied into one contiguous
+file (feats.pack) with an index of (start frame, num frames) rows. The feats.scp of the packed
+data dir points to 'feats.pack:row', so the Script*Dataset classes can read it through
+PackedFeatReader as a memory-mapped, zero-copy loader.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+
+import kaldi_io
+import numpy as np
+from tqdm import tqdm
+
+PACK_NAME = 'feats.pack'
+INDEX_NAME = 'feats.pack.index.npy'
+INFO_NAME = 'feats.pack.json'
+
+# files copied from the source data dir when packing into a new dir
+DATA_DIR_FILES = ['spk2utt', 'utt2spk', 'utt2num_frames', 'utt2dom', 'trials', 'wav.scp', 'utt2dur']
+
+
+def pack_feats(data_dir, out_dir, dtype='float32', loader=kaldi_io.read_mat):
+    """
+    Copy every matrix in data_dir/feats.scp into out_dir/feats.pack.
+    :param data_dir: kaldi data dir with feats.scp
+    :param out_dir: packed data dir, should be different from data_dir
+    :param dtype: float32 or float16
+    :param loader: loader for the entries in feats.scp
+    :return: number of packed utterances
+    """
+    feat_scp = os.path.join(data_dir, 'feats.scp')
+    if not os.path.exists(feat_scp):
+        raise FileExistsError(feat_scp)
+    if os.path.abspath(data_dir) == os.path.abspath(out_dir):
+        raise ValueError('Packed data dir should be different from %s.' % data_dir)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    dtype = np.dtype(dtype)
+    pack_path = os.path.abspath(os.path.join(out_dir, PACK_NAME))
+
+    with open(feat_scp, 'r') as f:
+        uid_feats = [l.split() for l in f.readlines() if len(l.split()) == 2]
+
+    index = np.zeros((len(uid_feats), 2), dtype=np.int64)
+    feat_dim = None
+    start = 0
+    with open(pack_path, 'wb') as pack, open(os.path.join(out_dir, 'feats.scp'), 'w') as scp:
+        for row, (uid, feat_path) in enumerate(tqdm(uid_feats, ncols=50)):
+            feat = np.ascontiguousarray(loader(feat_path), dtype=dtype)
+            if feat_dim is None:
+                feat_dim = feat.shape[1]
+            elif feat.shape[1] != feat_dim:
+                raise ValueError('Dimension of %s is %d, while %d expected.' % (uid, feat.shape[1], feat_dim))
+
+            pack.write(feat.tobytes())
+            index[row] = (start, len(feat))
+            start += len(feat)
+            scp.write('%s %s:%d\n' % (uid, pack_path, row))
+
+    np.save(os.path.join(out_dir, INDEX_NAME), index)
+    with open(os.path.join(out_dir, INFO_NAME), 'w') as f:
+        json.dump({'dtype': dtype.name, 'feat_dim': feat_dim, 'num_utts': len(uid_feats),
+                   'num_frames': int(start)}, f)
+
+    for name in DATA_DIR_FILES:
+        src = os.path.join(data_dir, name)
+        if os.path.exists(src):
+            shutil.copy(src, os.path.join(out_dir, name))
+
+    print('Packed %d utterances (%d frames) into %s.' % (len(uid_feats), start, pack_path))
+    return len(uid_feats)
+
+
+class PackedFeats(object):
+    """
+    Memory-mapped view of one feats.pack file. Rows are returned as numpy views without copying.
+    """
+
+    def __init__(self, pack_path):
+        pack_dir = os.path.dirname(pack_path)
+        with open(os.path.join(pack_dir, INFO_NAME), 'r') as f:
+            info = json.load(f)
+
+        self.pack_path = pack_path
+        self.dtype = np.dtype(info['dtype'])
+        self.feat_dim = info['feat_dim']
+        self.index = np.load(os.path.join(pack_dir, INDEX_NAME))
+        num_frames = int(info['num_frames'])
+        if num_frames > 0:
+            self.data = np.memmap(pack_path, dtype=self.dtype, mode='r', shape=(num_frames, self.feat_dim))
+        else:
+            self.data = np.zeros((0, self.feat_dim), dtype=self.dtype)
+
+    def num_frames(self, row):
+        return int(self.index[row, 1])
+
+    def read(self, row, start=0, stop=None):
+        offset, length = self.index[row]
+        stop = length if stop is None else min(stop, length)
+        start = min(max(start, 0), stop)
+        return self.data[offset + start:offset + stop]
+
+    def __len__(self):
+        return len(self.index)
+
+
+class PackedFeatReader(object):
+    """
+    Loader for feats.scp entries like '/path/feats.pack:row'. The pack files are opened lazily in
+    each process, so the reader can be handed to DataLoader workers.
+    """
+
+    def __init__(self):
+        self.packs = {}
+
+    def get_pack(self, pack_path):
+        if pack_path not in self.packs:
+            self.packs[pack_path] = PackedFeats(pack_path)
+        return self.packs[pack_path]
+
+    def read(self, feat_path, start=0, stop=None):
+        pack_path, row = feat_path.rsplit(':', 1)
+        return self.get_pack(pack_path).read(int(row), start, stop)
+
+    def __call__(self, feat_path):
+        return self.read(feat_path)
+
+    def __getstate__(self):
+        # memmaps are reopened in the workers
+        return {'packs': {}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack kaldi features into one memory-mapped file!')
+    parser.add_argument('--data-dir', type=str, required=True,
+                        help='kaldi data dir with feats.scp')
+    parser.add_argument('--out-dir', type=str, required=True,
+                        help='the packed data dir')
+    parser.add_argument('--dtype', type=str, default='float32', choices=['float32', 'float16'],
+                        help='data type of the packed features')
+    parser.add_argument('--feat-format', type=str, default='kaldi', choices=['kaldi', 'npy'],
+                        help='format of the features in feats.scp')
+    args = parser.parse_args()
+
+    pack_feats(args.data_dir, args.out_dir, dtype=args.dtype,
+               loader=kaldi_io.read_mat if args.feat_format == 'kaldi' else np.load)
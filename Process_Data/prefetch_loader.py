@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: prefetch_loader.py
+@Time: 2026/10/18 11:10 PM
+@Overview: Prefetching loader with the arguments of torch.utils.data.DataLoader. Batches are read
+by a thread pool and up to `prefetch` batches are kept ready in a bounded queue, so feature reads
+(os.pread of ArkWindowReader, memmaps of PackedFeatReader, numpy copies) overlap with the model.
+Queue depth and wait time are counted for every epoch.
+"""
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.utils.data as data
+from torch.utils.data.dataloader import default_collate
+
+
+class PrefetchLoader(object):
+    """
+    Drop-in replacement for torch.utils.data.DataLoader(dataset, ...) on map-style datasets.
+    num_workers is the number of reader threads, and 0 falls back to num_threads.
+    """
+
+    def __init__(self, dataset, batch_size=1, shuffle=False, sampler=None, batch_sampler=None, num_workers=0,
+                 collate_fn=None, pin_memory=False, drop_last=False, num_threads=4, prefetch=None, **kwargs):
+        self.dataset = dataset
+        self.collate_fn = default_collate if collate_fn is None else collate_fn
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+
+        if batch_sampler is None:
+            if sampler is None:
+                sampler = data.RandomSampler(dataset) if shuffle else data.SequentialSampler(dataset)
+            batch_sampler = data.BatchSampler(sampler, batch_size, drop_last)
+        self.batch_sampler = batch_sampler
+
+        self.num_threads = num_workers if num_workers > 0 else num_threads
+        self.prefetch = 2 * self.num_threads if prefetch is None else prefetch
+
+        # counters of the last epoch
+        self.num_batches = 0
+        self.ready_batches = 0
+        self.wait_time = 0.
+        self.num_waits = 0
+
+    def load(self, indices):
+        batch = self.collate_fn([self.dataset[i] for i in indices])
+        if self.pin_memory:
+            batch = pin_batch(batch)
+        return batch
+
+    def __iter__(self):
+        self.num_batches = 0
+        self.ready_batches = 0
+        self.wait_time = 0.
+        self.num_waits = 0
+
+        batches = iter(self.batch_sampler)
+        pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        queue = collections.deque()
+        try:
+            for indices in batches:
+                queue.append(pool.submit(self.load, indices))
+                if len(queue) >= self.prefetch:
+                    break
+
+            while len(queue) > 0:
+                future = queue.popleft()
+                # batches ready when the model asks for the next one
+                self.ready_batches += int(future.done()) + sum(int(f.done()) for f in queue)
+                if not future.done():
+                    start = time.time()
+                    future.result()
+                    self.wait_time += time.time() - start
+                    self.num_waits += 1
+
+                indices = next(batches, None)
+                if indices is not None:
+                    queue.append(pool.submit(self.load, indices))
+
+                self.num_batches += 1
+                yield future.result()
+        finally:
+            for future in queue:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+    def queue_depth(self):
+        """
+        :return: average number of ready batches in the queue of the last epoch
+        """
+        return self.ready_batches / max(self.num_batches, 1)
+
+    def stats(self):
+        return 'Prefetch: {} batches, average queue depth {:.2f}/{}, waited {} times for {:.2f}s.'.format(
+            self.num_batches, self.queue_depth(), self.prefetch, self.num_waits, self.wait_time)
+
+
+def pin_batch(batch):
+    if isinstance(batch, torch.Tensor):
+        return batch.pin_memory()
+    elif isinstance(batch, (list, tuple)):
+        return type(batch)(pin_batch(b) for b in batch)
+    return batch
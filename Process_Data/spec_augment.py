@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: spec_augment.py
+@Time: 2026/10/19 9:50 PM
+@Overview: Batched feature augmentation in the collate function of the train loader. Time warping,
+random gain and time/frequency masks are drawn for every sample of a (B, 1, T, F) batch at once,
+and the masks of the whole batch are applied by one masked_fill. The augmentation is only given
+to the train loader, so valid and test loaders are not changed, and eval() turns it off.
+"""
+import math
+
+import torch
+from torch.utils.data.dataloader import default_collate
+
+
+def random_spans(batch, length, num_spans, max_width):
+    """
+    :return: (batch, length) bool tensor, True in num_spans spans of [0, max_width] frames of each sample
+    """
+    max_width = min(max_width, length)
+    width = (torch.rand(batch, num_spans) * (max_width + 1)).long()
+    start = (torch.rand(batch, num_spans) * (length - width + 1).float()).long()
+
+    pos = torch.arange(length).view(1, 1, -1)
+    spans = (pos >= start.unsqueeze(-1)) & (pos < (start + width).unsqueeze(-1))
+    return spans.any(dim=1)
+
+
+def along_dim(x, dim, ndim):
+    """
+    :param x: (batch, length) tensor
+    :return: x viewed to broadcast with a ndim tensor of the batch, length along dim
+    """
+    shape = [x.shape[0]] + [1] * (ndim - 1)
+    shape[dim] = x.shape[1]
+    return x.view(shape)
+
+
+class SpecAugment(object):
+    """
+    Augment a batch of features with frames along time_dim and bins along freq_dim.
+
+    time_warp: the frame at a random center is moved by at most time_warp frames, and the frames
+    are linearly interpolated on both sides.
+    gain: random gain in [-gain, gain] dB of the power, added as gain * ln(10) / 10 to log
+    power features.
+    time_masks, freq_masks: number of masks of [0, width] frames or bins, filled with mask_value.
+    prob: probability that a sample is augmented.
+    """
+
+    def __init__(self, time_masks=0, time_mask_width=20, freq_masks=0, freq_mask_width=8, time_warp=0, gain=0.,
+                 mask_value=0., prob=1.0, time_dim=-2, freq_dim=-1):
+        self.time_masks = time_masks
+        self.time_mask_width = time_mask_width
+        self.freq_masks = freq_masks
+        self.freq_mask_width = freq_mask_width
+        self.time_warp = time_warp
+        self.gain = gain
+        self.mask_value = mask_value
+        self.prob = prob
+        self.time_dim = time_dim
+        self.freq_dim = freq_dim
+        self.training = True
+
+    def train(self, mode=True):
+        self.training = mode
+        return self
+
+    def eval(self):
+        return self.train(False)
+
+    def warp(self, xs, apply):
+        time_dim = self.time_dim % xs.dim()
+        batch, num_frames = xs.shape[0], xs.shape[time_dim]
+        if num_frames <= 2 * self.time_warp + 1:
+            return xs
+
+        center = torch.randint(self.time_warp, num_frames - self.time_warp, (batch, 1)).float()
+        shift = torch.randint(-self.time_warp, self.time_warp + 1, (batch, 1)).float()
+        warped = center + shift * apply.view(-1, 1).float()
+
+        # source position of every output frame, center is moved to warped
+        t = torch.arange(num_frames, dtype=torch.float32).view(1, -1)
+        last = num_frames - 1
+        src = torch.where(t < warped, t * center / warped.clamp(min=1),
+                          center + (t - warped) * (last - center) / (last - warped).clamp(min=1))
+
+        low = src.floor().clamp(0, last)
+        frac = (src - low).to(xs.dtype).view(batch * num_frames, 1)
+        low = low.long()
+        high = (low + 1).clamp(max=last)
+
+        # frames of all samples as rows, selected by their index in the flat batch
+        frames = xs.movedim(time_dim, 1).reshape(batch * num_frames, -1)
+        offset = torch.arange(batch).view(-1, 1) * num_frames
+        out = frames.index_select(0, (low + offset).view(-1)) * (1 - frac) + \
+              frames.index_select(0, (high + offset).view(-1)) * frac
+
+        shape = list(xs.movedim(time_dim, 1).shape)
+        return out.view(shape).movedim(1, time_dim)
+
+    def __call__(self, xs):
+        if not self.training:
+            return xs
+
+        ndim = xs.dim()
+        time_dim = self.time_dim % ndim
+        freq_dim = self.freq_dim % ndim
+        batch = xs.shape[0]
+        apply = torch.rand(batch) < self.prob
+
+        if self.time_warp > 0:
+            xs = self.warp(xs, apply)
+
+        if self.gain > 0:
+            gain = (torch.rand(batch) * 2 - 1) * self.gain * apply.float()
+            xs = xs + along_dim((gain * math.log(10) / 10).view(-1, 1), 1, ndim).to(xs.dtype)
+
+        mask = None
+        if self.time_masks > 0 and self.time_mask_width > 0:
+            spans = random_spans(batch, xs.shape[time_dim], self.time_masks, self.time_mask_width)
+            mask = along_dim(spans & apply.view(-1, 1), time_dim, ndim)
+        if self.freq_masks > 0 and self.freq_mask_width > 0:
+            spans = random_spans(batch, xs.shape[freq_dim], self.freq_masks, self.freq_mask_width)
+            spans = along_dim(spans & apply.view(-1, 1), freq_dim, ndim)
+            mask = spans if mask is None else mask | spans
+
+        if mask is not None:
+            xs = xs.masked_fill(mask, self.mask_value)
+        return xs
+
+
+class AugmentCollate(object):
+    """
+    collate_fn of the train loader, augment the features of the collated batch.
+    """
+
+    def __init__(self, augment, collate_fn=default_collate):
+        self.augment = augment
+        self.collate_fn = collate_fn
+
+    def __call__(self, batch):
+        batch = self.collate_fn(batch)
+        if isinstance(batch, (list, tuple)):
+            return [self.augment(batch[0])] + list(batch[1:])
+        return self.augment(batch)
+
+
+def add_spec_augment_args(parser):
+    parser.add_argument('--time-masks', default=0, type=int, metavar='TM',
+                        help='time masks of each training sample, 0 for no masks (default: 0)')
+    parser.add_argument('--time-mask-width', default=20, type=int, metavar='TMW',
+                        help='max frames of a time mask (default: 20)')
+    parser.add_argument('--freq-masks', default=0, type=int, metavar='FM',
+                        help='frequency masks of each training sample, 0 for no masks (default: 0)')
+    parser.add_argument('--freq-mask-width', default=8, type=int, metavar='FMW',
+                        help='max bins of a frequency mask (default: 8)')
+    parser.add_argument('--time-warp', default=0, type=int, metavar='TW',
+                        help='max frames of time warping, 0 for no warping (default: 0)')
+    parser.add_argument('--random-gain', default=0., type=float, metavar='RG',
+                        help='max random gain in dB of log power features, 0 for no gain (default: 0)')
+    parser.add_argument('--augment-prob', default=1.0, type=float, metavar='AP',
+                        help='probability of augmenting a training sample (default: 1.0)')
+    return parser
+
+
+def spec_augment_collate(args, collate_fn=default_collate):
+    """
+    :return: collate_fn of the train loader with the augmentation of args, collate_fn if it is all off
+    """
+    if args.time_masks <= 0 and args.freq_masks <= 0 and args.time_warp <= 0 and args.random_gain <= 0:
+        return collate_fn
+
+    augment = SpecAugment(time_masks=args.time_masks, time_mask_width=args.time_mask_width,
+                          freq_masks=args.freq_masks, freq_mask_width=args.freq_mask_width,
+                          time_warp=args.time_warp, gain=args.random_gain, prob=args.augment_prob)
+    return AugmentCollate(augment, collate_fn=collate_fn)
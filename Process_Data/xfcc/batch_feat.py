@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: batch_feat.py
+@Time: 2026/10/19 10:05 AM
+@Overview: Batched torch backend of Make_Fbank, Make_Spect and Make_MFCC. A batch of waveforms is
+padded into one tensor, then preemphasis, framing, windowing, FFT, filterbank projection, log and
+CMVN run on the batched tensors with the intra-op threads of torch. Framing follows
+python_speech_features.sigproc, and the filters come from xfcc.common.get_filterbanks, so every
+filtertype of the numpy path is supported. Computation is in float64 by default, float32 loses
+precision on the log energies of near silent frames.
+"""
+import math
+
+import numpy as np
+import torch
+from python_speech_features import delta, sigproc
+
+from Process_Data.audio_processing import normalize_frames
+from Process_Data.xfcc.common import get_filterbanks
+
+
+def round_half_up(number):
+    return int(math.floor(number + 0.5))
+
+
+def num_sigframes(length, frame_len, frame_step):
+    # same as sigproc.framesig
+    if length <= frame_len:
+        return 1
+    return 1 + int(math.ceil((1.0 * length - frame_len) / frame_step))
+
+
+def batch_powspec(signals, frame_len, frame_step, nfft, preemph=0.97, winfunc=np.hamming, dtype=torch.float64):
+    """
+    :param signals: list of 1-D numpy waveforms
+    :param frame_len: samples in each frame
+    :param frame_step: samples between successive frames
+    :return: power spectrum (batch, max_frames, nfft/2+1) and number of frames of each waveform
+    """
+    frame_len = round_half_up(frame_len)
+    frame_step = round_half_up(frame_step)
+
+    lengths = [len(s) for s in signals]
+    num_frames = [num_sigframes(l, frame_len, frame_step) for l in lengths]
+    padlen = (max(num_frames) - 1) * frame_step + frame_len
+
+    # preemphasis of the unpadded signals in their own dtype, as in the numpy path
+    batch = torch.zeros(len(signals), padlen, dtype=dtype)
+    for i, s in enumerate(signals):
+        batch[i, :lengths[i]] = torch.from_numpy(np.asarray(sigproc.preemphasis(s, preemph))).to(dtype)
+
+    frames = batch.unfold(1, frame_len, frame_step)
+    frames = frames * torch.from_numpy(winfunc(frame_len)).to(dtype)
+    spec = torch.fft.rfft(frames, n=nfft, dim=-1)
+    pspec = (spec.real.pow(2) + spec.imag.pow(2)) / nfft
+
+    return pspec, np.array(num_frames)
+
+
+def frame_mask(num_frames, max_frames, dtype):
+    mask = torch.arange(max_frames).reshape(1, -1) < torch.from_numpy(num_frames).reshape(-1, 1)
+    return mask.unsqueeze(-1).to(dtype)
+
+
+def batch_normalize(feats, num_frames, use_scale=True):
+    """
+    Per utterance mean and variance normalization over the valid frames, as normalize_frames.
+    """
+    mask = frame_mask(num_frames, feats.shape[1], feats.dtype)
+    count = torch.from_numpy(num_frames).to(feats.dtype).reshape(-1, 1, 1)
+    mean = (feats * mask).sum(dim=1, keepdim=True) / count
+    feats = feats - mean
+    if use_scale:
+        std = ((feats * mask).pow(2).sum(dim=1, keepdim=True) / count).sqrt()
+        feats = feats / (std + 1e-12)
+    return feats
+
+
+def split_batch(feats, num_frames, use_delta=False, use_scale=True, normalize=False):
+    """
+    :return: list of float32 numpy features without padding frames. Deltas are appended as in
+    Make_Fbank, with the static features and deltas normalized separately.
+    """
+    feats = feats.numpy()
+    outs = []
+    for i, n in enumerate(num_frames):
+        feat = feats[i, :n]
+        if use_delta:
+            delta_1 = delta(feat, N=1)
+            delta_2 = delta(delta_1, N=1)
+            feat = np.hstack([normalize_frames(feat, Scale=use_scale), normalize_frames(delta_1, Scale=use_scale),
+                              normalize_frames(delta_2, Scale=use_scale)])
+            if normalize:
+                feat = normalize_frames(feat, Scale=use_scale)
+        outs.append(feat.astype(np.float32))
+    return outs
+
+
+def dct_matrix(num_in, num_out, dtype):
+    # DCT-II with norm='ortho' as scipy.fft.dct
+    n = np.arange(num_in).reshape(1, -1)
+    k = np.arange(num_out).reshape(-1, 1)
+    dct = np.cos(np.pi * k * (2 * n + 1) / (2. * num_in)) * np.sqrt(2. / num_in)
+    dct[0] *= np.sqrt(0.5)
+    return torch.from_numpy(dct.T).to(dtype)
+
+
+def batch_fbank(signals, samplerate=16000, winlen=0.025, winstep=0.01, nfilt=26, nfft=512, lowfreq=0,
+                highfreq=None, preemph=0.97, filtertype='mel', multi_weight=False, use_energy=False,
+                use_logscale=True, use_delta=False, use_scale=True, normalize=False, dtype=torch.float64):
+    """
+    Batched Make_Fbank on waveforms.
+    :return: list of (num_frames, nfilt [+1]) float32 features
+    """
+    pspec, num_frames = batch_powspec(signals, winlen * samplerate, winstep * samplerate, nfft, preemph=preemph,
+                                      dtype=dtype)
+    eps = float(np.finfo(float).eps)
+
+    fb = torch.tensor(np.asarray(get_filterbanks(nfilt, nfft, samplerate, lowfreq, highfreq, filtertype,
+                                                     multi_weight=multi_weight))).to(dtype)
+    feats = torch.matmul(pspec, fb.t())
+    feats = torch.where(feats == 0, torch.full_like(feats, eps), feats)
+
+    if use_energy:
+        energy = pspec.sum(dim=-1, keepdim=True)
+        energy = torch.where(energy == 0, torch.full_like(energy, eps), energy)
+        feats = torch.cat([energy, feats], dim=-1)
+
+    if use_logscale:
+        feats = torch.log(feats)
+
+    if normalize and not use_delta:
+        feats = batch_normalize(feats, num_frames, use_scale=use_scale)
+
+    return split_batch(feats, num_frames, use_delta=use_delta, use_scale=use_scale, normalize=normalize)
+
+
+def batch_spect(signals, samplerate=16000, windowsize=0.02, stride=0.01, nfft=None, preemph=0.97, normalize=True,
+                dtype=torch.float64):
+    """
+    Batched Make_Spect on waveforms.
+    :return: list of (num_frames, nfft/2+1) float32 log power spectrograms
+    """
+    if nfft == None:
+        nfft = int(windowsize * samplerate)
+
+    pspec, num_frames = batch_powspec(signals, windowsize * samplerate, stride * samplerate, nfft, preemph=preemph,
+                                      dtype=dtype)
+    eps = float(np.finfo(float).eps)
+    feats = torch.log(torch.where(pspec == 0, torch.full_like(pspec, eps), pspec))
+
+    if normalize:
+        feats = batch_normalize(feats, num_frames)
+
+    return split_batch(feats, num_frames)
+
+
+def batch_mfcc(signals, samplerate=16000, winlen=0.025, winstep=0.01, numcep=13, nfilt=26, nfft=512, lowfreq=0,
+               highfreq=None, preemph=0.97, filtertype='mel', use_energy=True, use_delta=False, use_scale=True,
+               normalize=False, dtype=torch.float64):
+    """
+    Batched Make_MFCC on waveforms, without cepstral lifter.
+    :return: list of (num_frames, numcep) float32 features
+    """
+    pspec, num_frames = batch_powspec(signals, winlen * samplerate, winstep * samplerate, nfft, preemph=preemph,
+                                      dtype=dtype)
+    eps = float(np.finfo(float).eps)
+
+    fb = torch.tensor(np.asarray(get_filterbanks(nfilt, nfft, samplerate, lowfreq, highfreq,
+                                                     filtertype))).to(dtype)
+    feats = torch.matmul(pspec, fb.t())
+    feats = torch.log(torch.where(feats == 0, torch.full_like(feats, eps), feats))
+    feats = torch.matmul(feats, dct_matrix(nfilt, numcep, dtype))
+
+    if use_energy:
+        energy = pspec.sum(dim=-1)
+        energy = torch.where(energy == 0, torch.full_like(energy, eps), energy)
+        feats[:, :, 0] = torch.log(energy)
+
+    if normalize and not use_delta:
+        feats = batch_normalize(feats, num_frames, use_scale=use_scale)
+
+    return split_batch(feats, num_frames, use_delta=use_delta, use_scale=use_scale, normalize=normalize)
@@ -9,6 +9,8 @@
 @Time: 2020/3/31 8:58 PM
 @Overview:
 """
+from functools import lru_cache
+
 import numpy as np
 # from speechpy.functions import frequency_to_mel, mel_to_frequency, triangle
 # import soundfile as sf
@@ -48,11 +50,17 @@ def get_filterbanks(nfilt=20, nfft=512, samplerate=16000, lowfreq=0,
     :param lowfreq: lowest band edge of mel filters, default 0 Hz
     :param highfreq: highest band edge of mel filters, default samplerate/2
     :returns: A numpy array of size nfilt * (nfft/2 + 1) containing filterbank. Each row holds 1 filter.
+        The array is cached for the same arguments and is read-only.
     """
 
     highfreq = highfreq or samplerate / 2
     assert highfreq <= samplerate / 2, "highfreq is greater than samplerate/2"
 
+    return cached_filterbanks(nfilt, nfft, samplerate, lowfreq, highfreq, filtertype, multi_weight)
+
+
+@lru_cache(maxsize=32)
+def cached_filterbanks(nfilt, nfft, samplerate, lowfreq, highfreq, filtertype, multi_weight):
     if filtertype == 'mel':
         # compute points evenly spaced in mels
         lowmel = hz2mel(lowfreq)
@@ -98,37 +106,31 @@ def get_filterbanks(nfilt=20, nfft=512, samplerate=16000, lowfreq=0,
 
         ynew[:int(lowfreq_idx[0])] = 0
         if highfreq_idx[-1] < len(x_new) - 1:
-            ynew[int(highfreq[-1] + 1):] = 0
+            ynew[int(highfreq_idx[-1] + 1):] = 0
 
         weight = ynew / np.sum(ynew)
 
-        bin = []
-        bin.append(lowfreq_idx[0])
-
-        for j in range(nfilt):
-            num_wei = 0.
-            for i in range(nfft // 2 + 1):
-                num_wei += weight[i]
-                if num_wei > (j + 1) / (nfilt + 1):
-                    bin.append(i - 1)
-                    break
-                else:
-                    continue
-
-        bin.append(highfreq_idx[-1])
+        # the bin before the cumulative weight first exceeds (j + 1) / (nfilt + 1)
+        edges = np.searchsorted(np.cumsum(weight), np.arange(1, nfilt + 1) / (nfilt + 1), side='right')
+        bin = np.concatenate(([lowfreq_idx[0]], edges - 1, [highfreq_idx[-1]]))
 
-    fbank = np.zeros([nfilt, nfft // 2 + 1])
-    for j in range(0, nfilt):
-        for i in range(int(bin[j]), int(bin[j + 1])):
-            fbank[j, i] = (i - bin[j]) / (bin[j + 1] - bin[j])
+    # triangle j rises on [bin[j], bin[j+1]) and falls on [bin[j+1], bin[j+2])
+    bin = np.asarray(bin, dtype=np.float64)
+    edge = bin.astype(np.int64)
+    i = np.arange(nfft // 2 + 1).reshape(1, -1)
+    left, center, right = bin[:-2].reshape(-1, 1), bin[1:-1].reshape(-1, 1), bin[2:].reshape(-1, 1)
+    rise = (i >= edge[:-2].reshape(-1, 1)) & (i < edge[1:-1].reshape(-1, 1))
+    fall = (i >= edge[1:-1].reshape(-1, 1)) & (i < edge[2:].reshape(-1, 1))
 
-        for i in range(int(bin[j + 1]), int(bin[j + 2])):
-            fbank[j, i] = (bin[j + 2] - i) / (bin[j + 2] - bin[j + 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fbank = np.where(rise, (i - left) / (center - left), 0.)
+        fbank = np.where(fall, (right - i) / (right - center), fbank)
 
     if multi_weight:
         y = np.array(c.TIMIT_FIlTER_VAR)
         fbank = fbank * (y / y.max())
 
+    fbank.setflags(write=False)
     return fbank
 
 
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: stream_feat.py
+@Time: 2026/10/19 2:30 PM
+@Overview: Online fbank and spectrogram for live verification. PCM chunks of any size are
+accepted as they arrive, the last sample for pre-emphasis and the samples of the partial frame
+are carried to the next call, and only the new frames are returned. Frames follow
+python_speech_features.sigproc as local_fbank and Make_Spect, so the power spectra of a
+finished stream are bit-identical to the offline ones. The filterbank product of BLAS rounds
+differently with the number of rows, so the new frames may differ from the offline fbank in the
+last bits, and feats() projects the power spectra of the whole stream at once to be identical.
+"""
+import numpy as np
+from python_speech_features import sigproc
+
+import Process_Data.constants as c
+from Process_Data.audio_processing import normalize_frames
+from Process_Data.xfcc.batch_feat import round_half_up
+from Process_Data.xfcc.common import get_filterbanks
+
+
+class StreamingFeat(object):
+    """
+    Stateful extractor of Make_Fbank (feat_type='fbank', int16 chunks) or Make_Spect
+    (feat_type='spectrogram', float32 chunks). Deltas are not supported.
+
+    With normalize, the frames returned by accept and finish are normalized by running mean and
+    variance of all frames so far, or of the last cmvn_window frames if cmvn_window > 0. Only the
+    statistics and the last cmvn_window frames are kept, so memory does not grow with the stream.
+
+    With keep_pspecs, the power spectra of all frames are also kept, and the features of the whole
+    stream with the utterance CMVN of the offline functions are returned by feats().
+    """
+
+    def __init__(self, feat_type='fbank', samplerate=16000, windowsize=0.025, stride=0.01, nfilt=c.FILTER_BANK,
+                 nfft=None, lowfreq=0, highfreq=None, preemph=0.97, filtertype='mel', window=np.hamming,
+                 multi_weight=False, use_energy=c.USE_ENERGY, use_logscale=c.USE_LOGSCALE, normalize=False,
+                 use_scale=c.USE_SCALE, cmvn_window=0, keep_pspecs=False):
+        if feat_type not in ['fbank', 'spectrogram']:
+            raise ValueError('feat_type should be fbank or spectrogram, but got %s.' % feat_type)
+
+        self.feat_type = feat_type
+        self.preemph = preemph
+        self.frame_len = int(round_half_up(windowsize * samplerate))
+        self.frame_step = int(round_half_up(stride * samplerate))
+        self.window = window(self.frame_len)
+
+        if nfft == None:
+            nfft = 512 if feat_type == 'fbank' else int(windowsize * samplerate)
+        self.nfft = nfft
+
+        if feat_type == 'fbank':
+            highfreq = highfreq or samplerate / 2
+            self.fb = get_filterbanks(nfilt, nfft, samplerate, lowfreq, highfreq, filtertype,
+                                      multi_weight=multi_weight)
+        self.use_energy = use_energy
+        self.use_logscale = use_logscale
+
+        self.normalize = normalize
+        self.use_scale = use_scale
+        self.cmvn_window = cmvn_window
+        self.keep_pspecs = keep_pspecs
+
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new stream.
+        """
+        self.last_sample = None
+        self.buffer = np.zeros(0)
+        self.num_samples = 0
+        self.num_frames = 0
+        self.pspecs = []
+        self.finished = False
+
+        # running cmvn statistics, the raw frames of the window are kept as history
+        self.stat_count = 0
+        self.stat_sum = 0.
+        self.stat_sum_sq = 0.
+        self.history = None
+
+    def accept(self, chunk):
+        """
+        :param chunk: 1-D PCM samples, int16 for fbank and float32 for spectrogram as read by the
+        offline functions
+        :return: (num_new_frames, dim) features of the frames completed by the chunk
+        """
+        assert not self.finished, 'Stream is finished, call reset() first.'
+        chunk = np.asarray(chunk)
+        if len(chunk) > 0:
+            # same operations as sigproc.preemphasis on the whole waveform
+            if self.last_sample is None:
+                emph = sigproc.preemphasis(chunk, self.preemph)
+            else:
+                x = np.concatenate([self.last_sample, chunk])
+                emph = x[1:] - self.preemph * x[:-1]
+
+            self.last_sample = chunk[-1:]
+            self.num_samples += len(chunk)
+            self.buffer = np.concatenate([self.buffer, emph.astype(np.float64)])
+
+        num_new = 0
+        if len(self.buffer) >= self.frame_len:
+            num_new = 1 + (len(self.buffer) - self.frame_len) // self.frame_step
+
+        return self.emit(num_new)
+
+    def finish(self):
+        """
+        End the stream, the last partial frame is padded with zeros as sigproc.framesig.
+        :return: features of the remaining frames
+        """
+        assert not self.finished, 'Stream is finished, call reset() first.'
+        self.finished = True
+        if self.num_samples == 0:
+            return self.emit(0)
+
+        if self.num_samples <= self.frame_len:
+            total = 1
+        else:
+            total = 1 + int(np.ceil((1.0 * self.num_samples - self.frame_len) / self.frame_step))
+
+        num_new = total - self.num_frames
+        padlen = (num_new - 1) * self.frame_step + self.frame_len
+        if num_new > 0 and padlen > len(self.buffer):
+            self.buffer = np.concatenate([self.buffer, np.zeros(padlen - len(self.buffer))])
+
+        return self.emit(num_new)
+
+    def emit(self, num_new):
+        if num_new > 0:
+            indices = np.arange(self.frame_len).reshape(1, -1) + \
+                      np.arange(0, num_new * self.frame_step, self.frame_step).reshape(-1, 1)
+            pspec = sigproc.powspec(self.buffer[indices] * self.window, self.nfft)
+            self.buffer = self.buffer[num_new * self.frame_step:]
+            self.num_frames += num_new
+        else:
+            pspec = np.zeros((0, self.nfft // 2 + 1))
+
+        if self.keep_pspecs:
+            self.pspecs.append(pspec)
+        feats = self.compute(pspec)
+        if self.normalize:
+            return self.running_cmvn(feats)
+        return feats
+
+    def compute(self, pspec):
+        if self.feat_type == 'spectrogram':
+            pspec = np.where(pspec == 0, np.finfo(float).eps, pspec)
+            return np.log(pspec).astype(np.float32)
+
+        # as local_fbank and Make_Fbank
+        energy = np.sum(pspec, 1)
+        energy = np.where(energy == 0, np.finfo(float).eps, energy)
+        feat = np.dot(pspec, self.fb.T)
+        feat = np.where(feat == 0, np.finfo(float).eps, feat)
+
+        if self.use_energy:
+            feat = np.concatenate((energy.reshape(-1, 1), feat), axis=1)
+        if self.use_logscale:
+            feat = np.log(feat)
+
+        return feat
+
+    def running_cmvn(self, feats):
+        x = feats.astype(np.float64)
+        if self.cmvn_window > 0:
+            if self.history is not None:
+                x = np.concatenate([self.history, x])
+            cum = np.zeros((len(x) + 1, x.shape[1]))
+            cum_sq = np.zeros((len(x) + 1, x.shape[1]))
+            np.cumsum(x, axis=0, out=cum[1:])
+            np.cumsum(x ** 2, axis=0, out=cum_sq[1:])
+
+            # window of the new frame at p is x[lo:p + 1]
+            p = np.arange(len(x) - len(feats), len(x))
+            lo = np.maximum(p - self.cmvn_window + 1, 0)
+            count = (p + 1 - lo).reshape(-1, 1)
+            sums = cum[p + 1] - cum[lo]
+            sums_sq = cum_sq[p + 1] - cum_sq[lo]
+            self.history = x[-(self.cmvn_window - 1):] if self.cmvn_window > 1 else x[:0]
+            x = x[len(x) - len(feats):]
+        else:
+            count = (self.stat_count + np.arange(1, len(x) + 1)).reshape(-1, 1)
+            sums = self.stat_sum + np.cumsum(x, axis=0)
+            sums_sq = self.stat_sum_sq + np.cumsum(x ** 2, axis=0)
+            if len(x) > 0:
+                self.stat_count = int(count[-1, 0])
+                self.stat_sum = sums[-1]
+                self.stat_sum_sq = sums_sq[-1]
+
+        mean = sums / count
+        x = x - mean
+        if self.use_scale:
+            std = np.sqrt(np.maximum(sums_sq / count - mean ** 2, 0.))
+            x = x / (std + 1e-12)
+
+        return x.astype(feats.dtype)
+
+    def feats(self):
+        """
+        :return: features of all frames so far, with the utterance CMVN of Make_Fbank and Make_Spect
+        if normalize. Equal to the offline features once the stream is finished.
+        """
+        assert self.keep_pspecs, 'Power spectra of the stream are not kept, set keep_pspecs=True.'
+        if len(self.pspecs) > 0:
+            feats = self.compute(np.concatenate(self.pspecs))
+        else:
+            feats = self.compute(np.zeros((0, self.nfft // 2 + 1)))
+        if self.normalize:
+            feats = normalize_frames(feats, Scale=self.use_scale)
+        return feats
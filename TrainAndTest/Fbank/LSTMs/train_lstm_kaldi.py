@@ -33,6 +33,8 @@ from Process_Data.KaldiDataset import KaldiValidDataset, KaldiTrainDataset, Kald
 from Define_Model.model import PairwiseDistance, LSTM_End
 from Process_Data.audio_processing import toMFB, totensor, truncatedinput, read_MFB, read_audio, \
     mk_MFB, concateinputfromMFB, PadCollate, varLengthFeat, to2tensor, RNNPadCollate
+from Process_Data.prefetch_loader import PrefetchLoader
+from Process_Data.spec_augment import add_spec_augment_args, spec_augment_collate
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -64,6 +66,8 @@ parser.add_argument('--test-dir', type=str,
                     default='/home/yangwenhao/local/project/lstm_speaker_verification/data/Vox1/test_no_sli',
                     help='path to test dataset')
 
+parser.add_argument('--prefetch', default=0, type=int, metavar='PF',
+                    help='training batches read ahead by threads, 0 for DataLoader workers (default: 0)')
 parser.add_argument('--feat-dim', default=40, type=int, metavar='N',
                     help='acoustic feature dimension')
 parser.add_argument('--embedding-dim', default=512, type=int, metavar='N',
@@ -128,6 +132,7 @@ parser.add_argument('--mfb', action='store_true', default=True,
 parser.add_argument('--makemfb', action='store_true', default=False,
                     help='need to make mfb file')
 
+add_spec_augment_args(parser)
 args = parser.parse_args()
 
 # Set the device to use by setting CUDA_VISIBLE_DEVICES env variable in
@@ -225,7 +230,13 @@ def main():
     print('Start epoch is : ' + str(start))
     end = start + args.epochs
 
-    train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True, **kwargs)
+    train_collate = spec_augment_collate(args)
+    if args.prefetch > 0:
+        train_loader = PrefetchLoader(train_dir, batch_size=args.batch_size, shuffle=True,
+                                      prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+    else:
+        train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True,
+                                                   collate_fn=train_collate, **kwargs)
     valid_loader = torch.utils.data.DataLoader(valid_dir, batch_size=args.batch_size, shuffle=False, **kwargs)
     test_loader = torch.utils.data.DataLoader(test_part, batch_size=args.test_batch_size, shuffle=False, **kwargs)
     criterion = nn.CrossEntropyLoss().cuda()
@@ -312,6 +323,8 @@ def train(train_loader, model, optimizer, criterion, epoch):
                                                                                      total_loss / len(train_loader)))
     writer.add_scalar('Train/Accuracy', 100. * correct / total_datasize, epoch)
     writer.add_scalar('Train/Loss', total_loss / len(train_loader), epoch)
+    if isinstance(train_loader, PrefetchLoader):
+        print(train_loader.stats())
 
 
 def test(valid_loader, test_loader, model, epoch):
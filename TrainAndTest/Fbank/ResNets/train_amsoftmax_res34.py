@@ -36,6 +36,8 @@ from Process_Data.voxceleb_wav_reader import wav_list_reader
 from Define_Model import PairwiseDistance
 from Process_Data.audio_processing import toMFB, totensor, truncatedinput, truncatedinputfromMFB, read_MFB, read_audio, \
     mk_MFB
+from Process_Data.audio_augment.online_reverb import OnlineReverb
+from Process_Data import constants as c
 # Version conflict
 
 import torch._utils
@@ -120,6 +122,16 @@ parser.add_argument('--log-interval', type=int, default=1, metavar='LI',
 
 parser.add_argument('--mfb', action='store_true', default=True,
                     help='start from MFB file')
+parser.add_argument('--wav', action='store_false', dest='mfb',
+                    help='start from wav files and compute MFB on the fly')
+parser.add_argument('--rir-set-parameters', type=str, action='append', default=None, dest='rir_set_para_array',
+                    help='rir list of reverberate_data_dir.py for on-the-fly reverberation of the training wavs, '
+                         'e.g. --rir-set-parameters "0.5, RIRS_NOISES/simulated_rirs/smallroom/rir_list"')
+parser.add_argument('--noise-set-parameters', type=str, action='append', default=None,
+                    dest='noise_set_para_array',
+                    help='noise list of reverberate_data_dir.py for point-source and isotropic noises')
+parser.add_argument('--speech-rvb-probability', type=float, default=1.0,
+                    help='probability of reverberating a training wav')
 parser.add_argument('--makemfb', action='store_true', default=False,
                     help='need to make mfb file')
 
@@ -177,6 +189,14 @@ else:
         totensor(),
         # tonormal()
     ])
+    transform_T = transform
+    if args.rir_set_para_array is not None:
+        # reverberate the training wavs only, every epoch sees new copies
+        transform = transforms.Compose([
+            OnlineReverb(args.rir_set_para_array, args.noise_set_para_array, sample_rate=c.SAMPLE_RATE,
+                         speech_rvb_probability=args.speech_rvb_probability),
+            transform
+        ])
     file_loader = read_audio
 
 train_dir = ClassificationDataset(voxceleb=voxceleb_dev, dir=args.dataroot, loader=file_loader, transform=transform)
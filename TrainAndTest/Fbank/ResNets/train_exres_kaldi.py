@@ -34,6 +34,9 @@ from Define_Model.model import PairwiseDistance
 from Process_Data.KaldiDataset import ScriptTrainDataset, ScriptTestDataset, ScriptValidDataset, KaldiExtractDataset, \
     ScriptVerifyDataset
 from Process_Data.audio_processing import toMFB, totensor, truncatedinput, concateinputfromMFB, to2tensor, mvnormal
+from Process_Data.cmvn import SlidingCMVN, GlobalCMVN
+from Process_Data.prefetch_loader import PrefetchLoader
+from Process_Data.spec_augment import add_spec_augment_args, spec_augment_collate
 from TrainAndTest.common_func import create_optimizer, create_model, verification_extract, verification_test
 from eval_metrics import evaluate_kaldi_eer, evaluate_kaldi_mindcf
 from logger import NewLogger
@@ -63,6 +66,12 @@ parser.add_argument('--train-dir', type=str,
 parser.add_argument('--test-dir', type=str,
                     help='path to voxceleb1 test dataset')
 parser.add_argument('--nj', default=14, type=int, metavar='NJOB', help='num of job')
+parser.add_argument('--prefetch', default=0, type=int, metavar='PF',
+                    help='training batches read ahead by threads, 0 for DataLoader workers (default: 0)')
+parser.add_argument('--cmvn', type=str, default='mvn', choices=['mvn', 'sliding', 'global'],
+                    help='utterance, sliding-window or global cmvn of the train dir (default: mvn)')
+parser.add_argument('--cmvn-window', default=300, type=int, metavar='CW',
+                    help='frames in the window of sliding cmvn (default: 300)')
 
 # Model options
 parser.add_argument('--model', type=str,
@@ -165,6 +174,7 @@ parser.add_argument('--mfb', action='store_true', default=True,
 parser.add_argument('--makemfb', action='store_true', default=False,
                     help='need to make mfb file')
 
+add_spec_augment_args(parser)
 args = parser.parse_args()
 
 # Set the device to use by setting CUDA_VISIBLE_DEVICES env variable in
@@ -198,16 +208,23 @@ opt_kwargs = {'lr': args.lr,
 
 l2_dist = nn.CosineSimilarity(dim=1, eps=1e-6) if args.cos_sim else PairwiseDistance(2)
 
+if args.cmvn == 'sliding':
+    cmvn = SlidingCMVN(window=args.cmvn_window, center=True, norm_vars=True)
+elif args.cmvn == 'global':
+    cmvn = GlobalCMVN(args.train_dir)
+else:
+    cmvn = mvnormal()
+
 if args.acoustic_feature == 'fbank':
     transform = transforms.Compose([
         concateinputfromMFB(remove_vad=args.remove_vad),  # num_frames=np.random.randint(low=300, high=500)),
         to2tensor(),
-        mvnormal()
+        cmvn
     ])
     transform_T = transforms.Compose([
         concateinputfromMFB(input_per_file=args.test_input_per_file, remove_vad=args.remove_vad),
         to2tensor(),
-        mvnormal()
+        cmvn
     ])
     file_loader = read_mat
 
@@ -319,10 +336,15 @@ def main():
     print('Start epoch is : ' + str(start))
     end = args.epochs + 1
 
+    train_collate = spec_augment_collate(args)
     # pdb.set_trace()
-    train_loader = torch.utils.data.DataLoader(train_dir,
-                                               batch_size=args.batch_size,
-                                               shuffle=True, **kwargs)
+    if args.prefetch > 0:
+        train_loader = PrefetchLoader(train_dir, batch_size=args.batch_size, shuffle=True, num_threads=args.nj,
+                                      prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+    else:
+        train_loader = torch.utils.data.DataLoader(train_dir,
+                                                   batch_size=args.batch_size,
+                                                   shuffle=True, collate_fn=train_collate, **kwargs)
     valid_loader = torch.utils.data.DataLoader(valid_dir,
                                                batch_size=int(args.batch_size / 2),
                                                shuffle=False, **kwargs)
@@ -443,6 +465,8 @@ def train(train_loader, model, optimizer, ce, scheduler, epoch):
 
     writer.add_scalar('Train/Accuracy', 100. * correct / total_datasize, epoch)
     writer.add_scalar('Train/Loss', total_loss / len(train_loader), epoch)
+    if isinstance(train_loader, PrefetchLoader):
+        print(train_loader.stats())
 
     torch.cuda.empty_cache()
 
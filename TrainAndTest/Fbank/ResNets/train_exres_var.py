@@ -216,10 +216,11 @@ opt_kwargs = {'lr': args.lr,
 l2_dist = nn.CosineSimilarity(dim=1, eps=1e-6) if args.cos_sim else PairwiseDistance(2)
 
 if args.acoustic_feature == 'fbank':
+    # numpy features of the train and valid sets are padded into the batch tensor by PadCollate, without
+    # copying every whole utterance to a tensor first
     transform = transforms.Compose([
         # concateinputfromMFB(num_frames=c.NUM_FRAMES_SPECT, remove_vad=False),
         varLengthFeat(remove_vad=True),
-        to2tensor()
     ])
     transform_T = transforms.Compose([
         # concateinputfromMFB(num_frames=c.NUM_FRAMES_SPECT, input_per_file=args.test_input_per_file, remove_vad=False),
@@ -32,6 +32,8 @@ from Define_Model.model import PairwiseDistance
 from Process_Data.KaldiDataset import ScriptTrainDataset, \
     ScriptTestDataset, ScriptValidDataset
 from Process_Data.audio_processing import toMFB, truncatedinput, concateinputfromMFB, to2tensor
+from Process_Data.prefetch_loader import PrefetchLoader
+from Process_Data.spec_augment import add_spec_augment_args, spec_augment_collate
 from TrainAndTest.common_func import create_optimizer
 from eval_metrics import evaluate_kaldi_eer, evaluate_kaldi_mindcf
 from logger import NewLogger
@@ -64,6 +66,7 @@ parser.add_argument('--train-dir', type=str,
 parser.add_argument('--test-dir', type=str,
                     default='/home/yangwenhao/local/project/lstm_speaker_verification/data/Vox1_fb64/test_no_sil',
                     help='path to voxceleb1 test dataset')
+parser.add_argument('--nj', default=12, type=int, metavar='NJOB', help='num of job')
 parser.add_argument('--feat-dim', default=64, type=int, metavar='N',
                     help='acoustic feature dimension')
 parser.add_argument('--test-pairs-path', type=str, default='Data/dataset/voxceleb1/test_trials/ver_list.txt',
@@ -94,6 +97,8 @@ parser.add_argument('--embedding-size', type=int, default=128, metavar='ES',
                     help='Dimensionality of the embedding')
 parser.add_argument('--batch-size', type=int, default=64, metavar='BS',
                     help='input batch size for training (default: 128)')
+parser.add_argument('--prefetch', default=0, type=int, metavar='PF',
+                    help='training batches read ahead by threads, 0 for DataLoader workers (default: 0)')
 parser.add_argument('--test-batch-size', type=int, default=64, metavar='BST',
                     help='input batch size for testing (default: 64)')
 parser.add_argument('--test-input-per-file', type=int, default=4, metavar='IPFT',
@@ -135,6 +140,7 @@ parser.add_argument('--mfb', action='store_true', default=True,
 parser.add_argument('--makemfb', action='store_true', default=False,
                     help='need to make mfb file')
 
+add_spec_augment_args(parser)
 args = parser.parse_args()
 
 # Set the device to use by setting CUDA_VISIBLE_DEVICES env variable in
@@ -155,7 +161,7 @@ writer = SummaryWriter(args.check_path, filename_suffix='kaldi_192')
 sys.stdout = NewLogger(os.path.join(args.check_path, 'log.txt'))
 
 
-kwargs = {'num_workers': 12, 'pin_memory': True} if args.cuda else {}
+kwargs = {'num_workers': args.nj, 'pin_memory': True} if args.cuda else {}
 if not os.path.exists(args.check_path):
     os.makedirs(args.check_path)
 opt_kwargs = {'lr': args.lr,
@@ -239,10 +245,15 @@ def main():
     print('Start epoch is : ' + str(start))
     end = start + args.epochs
 
+    train_collate = spec_augment_collate(args)
     # pdb.set_trace()
-    train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size,
-                                               # collate_fn=PadCollate(dim=2, fix_len=True),
-                                               shuffle=True, **kwargs)
+    if args.prefetch > 0:
+        train_loader = PrefetchLoader(train_dir, batch_size=args.batch_size, shuffle=True, num_threads=args.nj,
+                                      prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+    else:
+        train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size,
+                                                   # collate_fn=PadCollate(dim=2, fix_len=True),
+                                                   shuffle=True, collate_fn=train_collate, **kwargs)
     valid_loader = torch.utils.data.DataLoader(valid_dir, batch_size=int(args.batch_size / 2),
                                                # collate_fn=PadCollate(dim=2, fix_len=True),
                                                shuffle=False, **kwargs)
@@ -329,6 +340,8 @@ def train(train_loader, model, optimizer, criterion, scheduler, epoch):
         100 * float(correct) / total_datasize, total_loss / len(train_loader)))
     writer.add_scalar('Train/Accuracy', correct / total_datasize, epoch)
     writer.add_scalar('Train/Loss', total_loss / len(train_loader), epoch)
+    if isinstance(train_loader, PrefetchLoader):
+        print(train_loader.stats())
 
 
 def test(test_loader, valid_loader, model, epoch):
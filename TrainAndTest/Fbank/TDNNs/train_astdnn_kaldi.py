@@ -39,6 +39,8 @@ from Process_Data import constants as c
 from Process_Data.KaldiDataset import ScriptTrainDataset, ScriptTestDataset, ScriptValidDataset
 from Process_Data.audio_processing import concateinputfromMFB, to2tensor
 from Process_Data.audio_processing import toMFB, totensor, truncatedinput, read_audio
+from Process_Data.prefetch_loader import PrefetchLoader
+from Process_Data.spec_augment import add_spec_augment_args, spec_augment_collate
 from TrainAndTest.common_func import create_optimizer
 from eval_metrics import evaluate_kaldi_eer, evaluate_kaldi_mindcf
 from logger import NewLogger
@@ -70,6 +72,8 @@ parser.add_argument('--sitw-dir', type=str,
                     default='/home/yangwenhao/local/project/lstm_speaker_verification/data/sitw',
                     help='path to voxceleb1 test dataset')
 parser.add_argument('--nj', default=12, type=int, metavar='NJOB', help='num of job')
+parser.add_argument('--prefetch', default=0, type=int, metavar='PF',
+                    help='training batches read ahead by threads, 0 for DataLoader workers (default: 0)')
 
 parser.add_argument('--check-path',
                     help='folder to output model checkpoints')
@@ -163,6 +167,7 @@ parser.add_argument('--makemfb', action='store_true', default=False,
 parser.add_argument('--makespec', action='store_true', default=False,
                     help='need to make spectrograms file')
 
+add_spec_augment_args(parser)
 args = parser.parse_args()
 
 # Set the device to use by setting CUDA_VISIBLE_DEVICES env variable in
@@ -312,7 +317,13 @@ def main():
     # start = 0
     end = start + args.epochs
 
-    train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True, **kwargs)
+    train_collate = spec_augment_collate(args)
+    if args.prefetch > 0:
+        train_loader = PrefetchLoader(train_dir, batch_size=args.batch_size, shuffle=True, num_threads=args.nj,
+                                      prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+    else:
+        train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True,
+                                                   collate_fn=train_collate, **kwargs)
     valid_loader = torch.utils.data.DataLoader(valid_dir, batch_size=int(args.batch_size / 2), shuffle=False, **kwargs)
     test_loader = torch.utils.data.DataLoader(test_dir, batch_size=args.test_batch_size, shuffle=False, **kwargs)
     # sitw_test_loader = torch.utils.data.DataLoader(sitw_test_dir, batch_size=args.test_batch_size,
@@ -417,6 +428,8 @@ def train(train_loader, model, ce, optimizer, scheduler, epoch):
         correct) / total_datasize, total_loss / len(train_loader)))
     writer.add_scalar('Train/Accuracy', correct / total_datasize, epoch)
     writer.add_scalar('Train/Loss', total_loss / len(train_loader), epoch)
+    if isinstance(train_loader, PrefetchLoader):
+        print(train_loader.stats())
 
     torch.cuda.empty_cache()
 
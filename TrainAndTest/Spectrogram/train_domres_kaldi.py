@@ -38,6 +38,10 @@ from Process_Data.KaldiDataset import ScriptTrainDataset, ScriptTestDataset, Scr
     ScriptVerifyDataset
 from Process_Data.audio_processing import concateinputfromMFB, to2tensor, varLengthFeat
 from Process_Data.audio_processing import toMFB, totensor, truncatedinput, read_audio
+from Process_Data.kaldi_ark import ArkWindowReader
+from Process_Data.packed_feats import PackedFeatReader
+from Process_Data.prefetch_loader import PrefetchLoader
+from Process_Data.spec_augment import add_spec_augment_args, spec_augment_collate
 from TrainAndTest.common_func import create_optimizer, create_model, verification_test, verification_extract
 from eval_metrics import evaluate_kaldi_eer, evaluate_kaldi_mindcf
 from logger import NewLogger
@@ -67,8 +71,10 @@ parser.add_argument('--trials', type=str, default='trials', help='trials filenam
 parser.add_argument('--domain', action='store_true', default=False, help='set domain in dataset')
 
 parser.add_argument('--nj', default=12, type=int, metavar='NJOB', help='num of job')
+parser.add_argument('--prefetch', default=0, type=int, metavar='PF',
+                    help='training batches read ahead by threads, 0 for DataLoader workers (default: 0)')
 parser.add_argument('--feat-format', type=str,
-                    default='kaldi', choices=['kaldi', 'npy'],
+                    default='kaldi', choices=['kaldi', 'kaldi_window', 'npy', 'pack'],
                     help='number of jobs to make feats (default: 10)')
 
 parser.add_argument('--check-path', default='Data/checkpoint/LoResNet10/spect/soft',
@@ -190,6 +196,7 @@ parser.add_argument('--makemfb', action='store_true', default=False,
 parser.add_argument('--makespec', action='store_true', default=False,
                     help='need to make spectrograms file')
 
+add_spec_augment_args(parser)
 args = parser.parse_args()
 
 # Set the device to use by setting CUDA_VISIBLE_DEVICES env variable in
@@ -253,8 +260,14 @@ torch.multiprocessing.set_sharing_strategy('file_system')
 
 if args.feat_format == 'kaldi':
     file_loader = read_mat
+elif args.feat_format == 'kaldi_window':
+    # read only the frames used by ScriptTrainDataset
+    file_loader = ArkWindowReader()
 elif args.feat_format == 'npy':
     file_loader = np.load
+elif args.feat_format == 'pack':
+    # data dirs packed by Process_Data/packed_feats.py
+    file_loader = PackedFeatReader()
 
 train_dir = ScriptTrainDataset(dir=args.train_dir, samples_per_speaker=args.input_per_spks, loader=file_loader,
                                transform=transform, num_valid=args.num_valid, domain=args.domain)
@@ -372,7 +385,13 @@ def main():
     # start = 0
     end = start + args.epochs
 
-    train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True, **kwargs)
+    train_collate = spec_augment_collate(args)
+    if args.prefetch > 0:
+        train_loader = PrefetchLoader(train_dir, batch_size=args.batch_size, shuffle=True, num_threads=args.nj,
+                                      prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+    else:
+        train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True,
+                                                   collate_fn=train_collate, **kwargs)
     valid_loader = torch.utils.data.DataLoader(valid_dir, batch_size=int(args.batch_size / 2), shuffle=False, **kwargs)
     test_loader = torch.utils.data.DataLoader(test_dir, batch_size=args.test_batch_size, shuffle=False, **kwargs)
     # sitw_test_loader = torch.utils.data.DataLoader(sitw_test_dir, batch_size=args.test_batch_size,
@@ -532,6 +551,8 @@ def train(train_loader, model, ce, optimizer, epoch):
     writer.add_scalar('Train/Spk_Accuracy', correct_a / total_datasize, epoch)
     writer.add_scalar('Train/Dom_Accuracy', correct_b / total_datasize, epoch)
     writer.add_scalar('Train/Loss', total_loss / len(train_loader), epoch)
+    if isinstance(train_loader, PrefetchLoader):
+        print(train_loader.stats())
 
     torch.cuda.empty_cache()
 
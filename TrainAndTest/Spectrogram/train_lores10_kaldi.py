@@ -38,6 +38,11 @@ from Process_Data.KaldiDataset import ScriptTrainDataset, ScriptTestDataset, Scr
     ScriptVerifyDataset
 from Process_Data.audio_processing import concateinputfromMFB, to2tensor, varLengthFeat
 from Process_Data.audio_processing import toMFB, totensor, truncatedinput, read_audio
+from Process_Data.batch_sampler import SpeakerBatchSampler
+from Process_Data.kaldi_ark import ArkWindowReader
+from Process_Data.packed_feats import PackedFeatReader
+from Process_Data.prefetch_loader import PrefetchLoader
+from Process_Data.spec_augment import add_spec_augment_args, spec_augment_collate
 from TrainAndTest.common_func import create_optimizer, create_model, verification_test, verification_extract
 from eval_metrics import evaluate_kaldi_eer, evaluate_kaldi_mindcf
 from logger import NewLogger
@@ -73,8 +78,10 @@ parser.add_argument('--sitw-dir', type=str,
                     default='/home/yangwenhao/local/project/lstm_speaker_verification/data/sitw',
                     help='path to voxceleb1 test dataset')
 parser.add_argument('--nj', default=12, type=int, metavar='NJOB', help='num of job')
+parser.add_argument('--prefetch', default=0, type=int, metavar='PF',
+                    help='training batches read ahead by threads, 0 for DataLoader workers (default: 0)')
 parser.add_argument('--feat-format', type=str,
-                    default='kaldi', choices=['kaldi', 'npy'],
+                    default='kaldi', choices=['kaldi', 'kaldi_window', 'npy', 'pack'],
                     help='number of jobs to make feats (default: 10)')
 
 parser.add_argument('--check-path', default='Data/checkpoint/LoResNet10/spect/soft',
@@ -131,6 +138,8 @@ parser.add_argument('--input-per-spks', type=int, default=224, metavar='IPFT',
                     help='input sample per file for testing (default: 8)')
 parser.add_argument('--num-valid', type=int, default=5, metavar='IPFT',
                     help='input sample per file for testing (default: 8)')
+parser.add_argument('--spks-per-batch', type=int, default=0, metavar='P',
+                    help='speakers in each training batch with speaker-balanced sampling, 0 to disable (default: 0)')
 parser.add_argument('--test-input-per-file', type=int, default=4, metavar='IPFT',
                     help='input sample per file for testing (default: 8)')
 parser.add_argument('--test-batch-size', type=int, default=4, metavar='BST',
@@ -189,6 +198,7 @@ parser.add_argument('--makemfb', action='store_true', default=False,
 parser.add_argument('--makespec', action='store_true', default=False,
                     help='need to make spectrograms file')
 
+add_spec_augment_args(parser)
 args = parser.parse_args()
 
 # Set the device to use by setting CUDA_VISIBLE_DEVICES env variable in
@@ -251,8 +261,14 @@ else:
 # pdb.set_trace()
 if args.feat_format == 'kaldi':
     file_loader = read_mat
+elif args.feat_format == 'kaldi_window':
+    # read only the frames used by ScriptTrainDataset
+    file_loader = ArkWindowReader()
 elif args.feat_format == 'npy':
     file_loader = np.load
+elif args.feat_format == 'pack':
+    # data dirs packed by Process_Data/packed_feats.py
+    file_loader = PackedFeatReader()
 torch.multiprocessing.set_sharing_strategy('file_system')
 
 train_dir = ScriptTrainDataset(dir=args.train_dir, samples_per_speaker=args.input_per_spks, loader=file_loader,
@@ -379,7 +395,24 @@ def main():
     # start = 0
     end = start + args.epochs
 
-    train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True, **kwargs)
+    train_collate = spec_augment_collate(args)
+    if args.spks_per_batch > 0:
+        # crops of NUM_FRAMES_SPECT frames, kept as they are by concateinputfromMFB
+        train_sampler = SpeakerBatchSampler(train_dir, num_spks=args.spks_per_batch,
+                                            num_utts=args.batch_size // args.spks_per_batch,
+                                            min_chunk_size=c.NUM_FRAMES_SPECT, max_chunk_size=c.NUM_FRAMES_SPECT + 1)
+        if args.prefetch > 0:
+            train_loader = PrefetchLoader(train_dir, batch_sampler=train_sampler, num_threads=args.nj,
+                                          prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+        else:
+            train_loader = torch.utils.data.DataLoader(train_dir, batch_sampler=train_sampler,
+                                                       collate_fn=train_collate, **kwargs)
+    elif args.prefetch > 0:
+        train_loader = PrefetchLoader(train_dir, batch_size=args.batch_size, shuffle=True, num_threads=args.nj,
+                                      prefetch=args.prefetch, collate_fn=train_collate, pin_memory=args.cuda)
+    else:
+        train_loader = torch.utils.data.DataLoader(train_dir, batch_size=args.batch_size, shuffle=True,
+                                                   collate_fn=train_collate, **kwargs)
     valid_loader = torch.utils.data.DataLoader(valid_dir, batch_size=int(args.batch_size / 2), shuffle=False, **kwargs)
     test_loader = torch.utils.data.DataLoader(test_dir, batch_size=args.test_batch_size, shuffle=False, **kwargs)
     # sitw_test_loader = torch.utils.data.DataLoader(sitw_test_dir, batch_size=args.test_batch_size,
@@ -508,6 +541,8 @@ def train(train_loader, model, ce, optimizer, epoch):
         correct) / total_datasize, total_loss / len(train_loader)))
     writer.add_scalar('Train/Accuracy', correct / total_datasize, epoch)
     writer.add_scalar('Train/Loss', total_loss / len(train_loader), epoch)
+    if isinstance(train_loader, PrefetchLoader):
+        print(train_loader.stats())
 
     torch.cuda.empty_cache()
 
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: batch_feat_parity.py
+@Time: 2026/10/19 11:20 AM
+@Overview: Parity test of the batched torch backend (xfcc.batch_feat) against Make_Fbank,
+Make_Spect and Make_MFCC on random wav files, with timing of both paths.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from Process_Data.audio_processing import Make_Fbank, Make_Spect, Make_MFCC
+from Process_Data.xfcc.batch_feat import batch_fbank, batch_spect, batch_mfcc
+
+parser = argparse.ArgumentParser(description='Parity test of batched feature extraction')
+parser.add_argument('--num-wavs', type=int, default=16)
+parser.add_argument('--min-seconds', type=float, default=1.)
+parser.add_argument('--max-seconds', type=float, default=8.)
+parser.add_argument('--samplerate', type=int, default=16000)
+parser.add_argument('--atol', type=float, default=2e-3, help='tolerance of normalized features')
+parser.add_argument('--rtol', type=float, default=1e-3, help='relative tolerance of log features')
+args = parser.parse_args()
+
+
+def random_wav(num_samples):
+    # tones in noise with a silent gap
+    t = np.arange(num_samples) / args.samplerate
+    wav = 3000 * np.sin(2 * np.pi * np.random.uniform(100, 3000) * t) + np.random.randn(num_samples) * 500
+    gap = np.random.randint(0, num_samples // 2)
+    wav[gap:gap + args.samplerate // 10] *= 0.01
+    return np.clip(wav, -32768, 32767).astype(np.int16)
+
+
+def check(name, refs, outs, atol=0., rtol=0.):
+    max_err = 0.
+    for ref, out in zip(refs, outs):
+        assert ref.shape == out.shape, '%s: shape %s != %s' % (name, str(ref.shape), str(out.shape))
+        assert np.allclose(out, ref, atol=atol, rtol=rtol), name
+        max_err = max(max_err, float(np.max(np.abs(out - ref))))
+    print('%-32s ok, max abs error %.2e' % (name, max_err))
+
+
+if __name__ == '__main__':
+    np.random.seed(1234)
+    tmp_dir = tempfile.mkdtemp()
+    wav_paths = []
+    wavs = []
+    for i in range(args.num_wavs):
+        num_samples = int(np.random.uniform(args.min_seconds, args.max_seconds) * args.samplerate)
+        wav = random_wav(num_samples)
+        path = os.path.join(tmp_dir, '%d.wav' % i)
+        sf.write(path, wav, args.samplerate, subtype='PCM_16')
+        wav_paths.append(path)
+        wavs.append(wav)
+
+    for filtertype in ['mel', 'amel', 'linear', 'dnn.timit.var']:
+        for normalize in [False, True]:
+            start = time.time()
+            refs = [Make_Fbank(p, filtertype=filtertype, nfft=320, windowsize=0.02, nfilt=40, use_energy=True,
+                               normalize=normalize) for p in wav_paths]
+            numpy_time = time.time() - start
+            start = time.time()
+            outs = batch_fbank(wavs, samplerate=args.samplerate, winlen=0.02, nfilt=40, nfft=320,
+                               filtertype=filtertype, use_energy=True, normalize=normalize)
+            torch_time = time.time() - start
+            check('fbank %s normalize=%s' % (filtertype, normalize), refs, outs, atol=args.atol,
+                  rtol=0 if normalize else args.rtol)
+            print('    numpy %.3fs, torch %.3fs' % (numpy_time, torch_time))
+
+    refs = [Make_Spect(p, windowsize=0.02, stride=0.01, nfft=320, normalize=True) for p in wav_paths]
+    float_wavs = [sf.read(p, dtype='float32')[0] for p in wav_paths]
+    outs = batch_spect(float_wavs, samplerate=args.samplerate, windowsize=0.02, stride=0.01, nfft=320,
+                       normalize=True)
+    check('spectrogram normalize=True', refs, outs, atol=args.atol)
+
+    refs = [Make_MFCC(p, numcep=24, nfilt=40, normalize=True, use_energy=True) for p in wav_paths]
+    outs = batch_mfcc(wavs, samplerate=args.samplerate, numcep=24, nfilt=40, normalize=True, use_energy=True)
+    check('mfcc normalize=True', refs, outs, atol=args.atol)
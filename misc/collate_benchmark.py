@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: collate_benchmark.py
+@Time: 2026/10/18 10:50 PM
+@Overview: Benchmark PadCollate against the former collate with pad_tensor doubling by torch.cat
+and torch.stack of mapped lists. The last two columns are the cost per batch of the train
+pipeline of train_exres_var.py, with to2tensor converting every utterance in the dataset before
+PadCollate, and with the numpy features of varLengthFeat padded by PadCollate directly.
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from Process_Data.audio_processing import PadCollate, to2tensor
+
+parser = argparse.ArgumentParser(description='Benchmark of collate functions')
+parser.add_argument('--batch-sizes', type=int, nargs='+', default=[64, 128, 256])
+parser.add_argument('--feat-dim', type=int, default=40)
+parser.add_argument('--min-frames', type=int, default=100, help='shortest utterance in the batches')
+parser.add_argument('--max-frames', type=int, default=800, help='longest utterance in the batches')
+parser.add_argument('--repeats', type=int, default=20)
+args = parser.parse_args()
+
+
+def legacy_pad_tensor(vec, pad, dim):
+    while vec.shape[dim] < pad:
+        vec = torch.cat([vec, vec], dim=dim)
+
+    start = np.random.randint(low=0, high=vec.shape[dim] - pad + 1)
+    return torch.Tensor.narrow(vec, dim=dim, start=start, length=pad)
+
+
+def legacy_pad_collate(batch, dim=2, min_chunk_size=300, max_chunk_size=400):
+    frame_len = np.random.randint(low=min_chunk_size, high=max_chunk_size)
+    map_batch = map(lambda x_y: (legacy_pad_tensor(x_y[0], pad=frame_len, dim=dim - 1), x_y[1]), batch)
+    pad_batch = list(map_batch)
+    xs = torch.stack(list(map(lambda x: x[0], pad_batch)), dim=0)
+    ys = torch.LongTensor(list(map(lambda x: x[1], pad_batch)))
+    return xs, ys
+
+
+def timeit(collate, batch):
+    start = time.time()
+    for _ in range(args.repeats):
+        collate(batch)
+    return (time.time() - start) / args.repeats * 1000
+
+
+if __name__ == '__main__':
+    totensor = to2tensor()
+    pad_collate = PadCollate(dim=2)
+
+    # same outputs for the same random state
+    batch = [(totensor(np.random.randn(1, np.random.randint(args.min_frames, args.max_frames), args.feat_dim)), i)
+             for i in range(8)]
+    np.random.seed(1)
+    xs_a, _ = legacy_pad_collate(batch)
+    np.random.seed(1)
+    xs_b, _ = pad_collate(batch)
+    assert torch.equal(xs_a, xs_b)
+
+    print('batch    legacy(ms)    tensor(ms)    to2tensor+collate(ms)    numpy collate(ms)')
+    for batch_size in args.batch_sizes:
+        # float32 features as read by read_mat
+        np_batch = [(np.random.randn(1, np.random.randint(args.min_frames, args.max_frames),
+                                     args.feat_dim).astype(np.float32), i) for i in range(batch_size)]
+        tensor_batch = [(totensor(x), y) for x, y in np_batch]
+
+        legacy = timeit(legacy_pad_collate, tensor_batch)
+        tensor = timeit(pad_collate, tensor_batch)
+        # to2tensor copies every whole utterance in the dataset, the numpy path copies only the padded chunks
+        with_totensor = timeit(lambda b: pad_collate([(totensor(x), y) for x, y in b]), np_batch)
+        numpy = timeit(pad_collate, np_batch)
+
+        print('%5d    %10.2f    %10.2f    %21.2f    %17.2f' % (batch_size, legacy, tensor, with_totensor, numpy))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+@Author: yangwenhao
+@Contact: 874681044@qq.com
+@Software: PyCharm
+@File: tdnn_benchmark.py
+@Time: 2026/10/19 11:30 PM
+@Overview: Compare the frame layers of TDNN_v2 or ETDNN with the unfolded Linear layers of
+TimeDelayLayer_v2 and the dilated Conv1d layers of TimeDelayLayer_v3. The Conv1d layers get the
+converted weights of the Linear layers, and the outputs are checked against each other. For each
+number of frames the latency of forward and backward passes is measured, with the memory of
+tensors saved for backward, and the peak memory of the device on cuda.
+Usage: python misc/tdnn_benchmark.py --model ETDNN --frames 200 500 1000 2000
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+
+from Define_Model.TDNN import TimeDelayLayer_v2, TimeDelayLayer_v3, convert_tdnn_v2_state_dict
+
+parser = argparse.ArgumentParser(description='Benchmark of Linear and Conv1d time delay layers')
+parser.add_argument('--model', type=str, default='TDNN_v2', choices=['TDNN_v2', 'ETDNN'],
+                    help='frame layers of the model (default: TDNN_v2)')
+parser.add_argument('--input-dim', type=int, default=30, help='feature dim (default: 30)')
+parser.add_argument('--batch-size', type=int, default=32, help='batch size (default: 32)')
+parser.add_argument('--frames', type=int, nargs='+', default=[200, 500, 1000, 2000],
+                    help='numbers of frames (default: 200 500 1000 2000)')
+parser.add_argument('--repeats', type=int, default=5, help='timed passes of each setting (default: 5)')
+parser.add_argument('--cuda', action='store_true', default=False, help='run on cuda')
+args = parser.parse_args()
+
+# (output_dim, context_size, dilation) of the frame layers
+LAYERS = {
+    'TDNN_v2': [(512, 5, 1), (512, 3, 2), (512, 3, 3), (512, 1, 1), (1500, 1, 1)],
+    'ETDNN': [(512, 5, 1), (512, 1, 1), (512, 3, 2), (512, 1, 1), (512, 3, 3), (512, 1, 1), (512, 3, 4),
+              (512, 1, 1), (1500, 1, 1)],
+}
+
+
+def frame_layers(layer, input_dim, config):
+    layers = []
+    for output_dim, context_size, dilation in config:
+        layers.append(layer(input_dim=input_dim, output_dim=output_dim, context_size=context_size,
+                            dilation=dilation))
+        input_dim = output_dim
+    return nn.Sequential(*layers)
+
+
+def saved_bytes(model, x):
+    """
+    :return: bytes of the tensors saved for backward in a forward pass of model
+    """
+    saved = {}
+
+    def pack(t):
+        saved[(t.data_ptr(), t.dtype, tuple(t.shape))] = t.numel() * t.element_size()
+        return t
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+        model(x).sum()
+    return sum(saved.values())
+
+
+def synchronize():
+    if args.cuda:
+        torch.cuda.synchronize()
+
+
+def measure(model, x):
+    """
+    :return: ms of forward without grad, ms of forward and backward, MB saved for backward, peak MB on cuda
+    """
+    with torch.no_grad():
+        model(x)
+    synchronize()
+    start = time.time()
+    with torch.no_grad():
+        for _ in range(args.repeats):
+            model(x)
+    synchronize()
+    forward_time = (time.time() - start) / args.repeats * 1000
+
+    model(x).sum().backward()
+    synchronize()
+    start = time.time()
+    for _ in range(args.repeats):
+        model.zero_grad()
+        model(x).sum().backward()
+    synchronize()
+    train_time = (time.time() - start) / args.repeats * 1000
+
+    peak = None
+    if args.cuda:
+        model.zero_grad()
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats()
+        model(x).sum().backward()
+        peak = torch.cuda.max_memory_allocated() / 1024. ** 2
+
+    return forward_time, train_time, saved_bytes(model, x) / 1024. ** 2, peak
+
+
+if __name__ == '__main__':
+    device = torch.device('cuda' if args.cuda else 'cpu')
+    torch.manual_seed(123456)
+
+    linear = frame_layers(TimeDelayLayer_v2, args.input_dim, LAYERS[args.model]).to(device)
+    conv = frame_layers(TimeDelayLayer_v3, args.input_dim, LAYERS[args.model]).to(device)
+    conv.load_state_dict(convert_tdnn_v2_state_dict(linear.state_dict(), conv))
+    linear.eval()
+    conv.eval()
+
+    print('%s frame layers, batch %d, feat dim %d, %s:' % (args.model, args.batch_size, args.input_dim, device))
+    print('%6s %8s | %10s %10s | %10s %10s | %10s %10s | %9s %9s' % (
+        'frames', 'max_diff', 'linear_fw', 'conv_fw', 'linear_bw', 'conv_bw', 'linear_MB', 'conv_MB',
+        'lin_peak', 'conv_peak'))
+    for num_frames in args.frames:
+        x = torch.randn(args.batch_size, num_frames, args.input_dim, device=device)
+        x_cf = x.transpose(1, 2).contiguous()
+        with torch.no_grad():
+            diff = (linear(x).transpose(1, 2) - conv(x_cf)).abs().max().item()
+
+        linear_fw, linear_bw, linear_mb, linear_peak = measure(linear, x)
+        conv_fw, conv_bw, conv_mb, conv_peak = measure(conv, x_cf)
+        peaks = tuple(('%9.1f' % p) if p is not None else '%9s' % '-' for p in (linear_peak, conv_peak))
+        print('%6d %8.1e | %8.1fms %8.1fms | %8.1fms %8.1fms | %10.1f %10.1f | %s %s' % (
+            (num_frames, diff, linear_fw, conv_fw, linear_bw, conv_bw, linear_mb, conv_mb) + peaks))